@@ -0,0 +1,17 @@
+#!/bin/bash
+
+
+# Start the Celery worker for bulk re-syncs
+
+echo Activating Environment
+source activate hs_data_services
+cd /home/dsuser/hs_data_services
+
+echo Preparing Metrics Directory
+export prometheus_multiproc_dir=/tmp/hs_data_services_bulk_metrics
+export METRICS_PORT=${BULK_METRICS_PORT:-9541}
+rm -rf $prometheus_multiproc_dir
+mkdir -p $prometheus_multiproc_dir
+
+echo Starting Bulk Celery.
+exec celery -A hs_data_services worker -l info -Q bulk -n bulk@%h --concurrency ${BULK_CONCURRENCY:-2}
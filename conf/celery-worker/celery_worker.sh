@@ -10,5 +10,10 @@ cd /home/dsuser/hs_data_services
 echo Making Migrations
 python manage.py migrate --noinput
 
+echo Preparing Metrics Directory
+export prometheus_multiproc_dir=/tmp/hs_data_services_metrics
+rm -rf $prometheus_multiproc_dir
+mkdir -p $prometheus_multiproc_dir
+
 echo Starting Celery.
-exec celery -A hs_data_services worker -l info
+exec celery -A hs_data_services worker -l info -Q interactive -n interactive@%h
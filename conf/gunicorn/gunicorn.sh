@@ -18,6 +18,11 @@ python manage.py migrate --noinput
 echo Checking Admin User
 python manage.py ensure_admin --username admin --password default
 
+echo Preparing Metrics Directory
+export prometheus_multiproc_dir=/tmp/hs_data_services_metrics
+rm -rf $prometheus_multiproc_dir
+mkdir -p $prometheus_multiproc_dir
+
 echo Starting Gunicorn.
 exec gunicorn hs_data_services.wsgi:application \
     --bind 0.0.0.0:8060 \
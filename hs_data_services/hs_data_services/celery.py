@@ -1,10 +1,73 @@
 import os
 from celery import Celery 
+from celery.signals import worker_init, worker_process_shutdown
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hs_data_services.settings')
 
+INTERACTIVE_QUEUE = 'interactive'
+BULK_QUEUE = 'bulk'
+DEFAULT_RECONCILE_INTERVAL = 900
+DEFAULT_SWEEP_INTERVAL = 86400
+
 app = Celery('hs_data_services') 
 
 app.config_from_object('django.conf:settings', namespace='CELERY')
+app.conf.update(
+    # Syncs triggered by HydroShare edits go to the interactive queue; backfills and other bulk
+    # work go to the bulk queue, which is served by its own worker so it never delays them.
+    task_default_queue=INTERACTIVE_QUEUE,
+    task_routes={
+        'update_data_services_task': {'queue': INTERACTIVE_QUEUE},
+        'bulk_update_data_services_task': {'queue': BULK_QUEUE},
+        'reconcile_modified_resources_task': {'queue': BULK_QUEUE},
+        'sweep_orphaned_workspaces_task': {'queue': BULK_QUEUE},
+        'delete_geoserver_workspace_task': {'queue': BULK_QUEUE},
+        'seed_tile_cache_task': {'queue': BULK_QUEUE},
+    },
+    # Syncs are long and I/O bound: reserve one task per pool process at a time, and acknowledge
+    # it only once it has finished so a task lost with its worker is redelivered.
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    # Unacknowledged tasks are redelivered after the visibility timeout, so it must outlast the
+    # longest sync (the per-resource lock expires after 6 hours by default).
+    broker_transport_options={'visibility_timeout': 12 * 3600},
+)
 app.autodiscover_tasks()
+
+
+@app.on_after_configure.connect
+def add_periodic_tasks(sender, **kwargs):
+    """
+    Schedules reconciliation of recently modified resources and the orphaned workspace sweep.
+
+    celery-beat's DatabaseScheduler stores these alongside tasks added in the admin.
+    """
+
+    from django.conf import settings
+
+    sync_settings = settings.DATA_SERVICES.get("sync", {})
+    reconcile_interval = sync_settings.get('RECONCILE_INTERVAL', DEFAULT_RECONCILE_INTERVAL)
+    sweep_interval = sync_settings.get('SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL)
+    if reconcile_interval:
+        sender.add_periodic_task(
+            reconcile_interval, sender.signature('reconcile_modified_resources_task'),
+            name='reconcile modified resources'
+        )
+    if sweep_interval:
+        sender.add_periodic_task(
+            sweep_interval, sender.signature('sweep_orphaned_workspaces_task'),
+            name='sweep orphaned workspaces'
+        )
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    from hs_data_services_sync import metrics
+    metrics.start_worker_server()
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    from hs_data_services_sync import metrics
+    metrics.mark_process_dead(pid)
@@ -4,6 +4,7 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from hs_data_services import settings
+from hs_data_services_sync.views import get_metrics
 
 
 schema_view = get_schema_view(
@@ -22,4 +23,5 @@ urlpatterns = [
     path('his/admin/', admin.site.urls),
     path('his/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('his/services/', include('hs_data_services_sync.urls')),
+    path('metrics', get_metrics, name='metrics'),
 ]
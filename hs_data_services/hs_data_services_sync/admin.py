@@ -1,3 +1,34 @@
 from django.contrib import admin
+from hs_data_services_sync.models import CopiedFile, Layer, Store, SyncCursor, Workspace
 
-# Register your models here.
+
+@admin.register(Workspace)
+class WorkspaceAdmin(admin.ModelAdmin):
+    list_display = ("name", "resource_id", "active", "updated")
+    list_filter = ("active",)
+    search_fields = ("resource_id", "name")
+
+
+@admin.register(Store)
+class StoreAdmin(admin.ModelAdmin):
+    list_display = ("name", "workspace", "store_type", "file_type", "updated")
+    list_filter = ("store_type",)
+    search_fields = ("name", "workspace__resource_id", "hs_path")
+
+
+@admin.register(Layer)
+class LayerAdmin(admin.ModelAdmin):
+    list_display = ("name", "workspace", "layer_type", "updated")
+    list_filter = ("layer_type",)
+    search_fields = ("name", "workspace__resource_id")
+
+
+@admin.register(CopiedFile)
+class CopiedFileAdmin(admin.ModelAdmin):
+    list_display = ("hs_path", "workspace", "size", "checksum", "copied")
+    search_fields = ("hs_path", "workspace__resource_id")
+
+
+@admin.register(SyncCursor)
+class SyncCursorAdmin(admin.ModelAdmin):
+    list_display = ("name", "position", "updated")
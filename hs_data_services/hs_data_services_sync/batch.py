@@ -0,0 +1,138 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree
+from hs_data_services import settings
+from hs_data_services_sync import features, metrics, utilities
+from hs_data_services_sync.clients import get_geoserver_client
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return settings.DATA_SERVICES.get("geoserver", {}).get('BATCH_REGISTRATION', True)
+
+
+def configure_geoserver_db(res_id, db):
+    """
+    Creates a layer's store and layer with configure-on-upload calls.
+
+    Rasters are named through the coverageName parameter, and shapefiles
+    whose layer name differs from the file name get a feature type posted
+    with the layer name, so no read-modify-write rename is needed. Returns
+    True if GeoServer accepted every call.
+    """
+
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(res_id)
+    layer_id = db["layer_name"].replace("/", " ")
+
+    if any(i in db['layer_name'] for i in [".", ","]):
+        logging.error(f"Invalid layer name: {db['layer_name']}")
+        return False
+
+    headers = {
+        "content-type": "application/json"
+    }
+    store_url = f"/workspaces/{workspace_id}/{db['store_type']}/{layer_id}"
+    store_path, file_type = features.get_store_file(db, utilities.get_geoserver_data_dir())
+    data = f"file://{utilities.get_geoserver_data_dir()}/{store_path}"
+    if db["layer_type"] == "GeographicRaster":
+        params = {"configure": "first", "coverageName": layer_id}
+    elif layer_id == db["file_name"]:
+        params = {"configure": "first"}
+    else:
+        params = {"configure": "none"}
+
+    response = geoserver_client.put(f"{store_url}/external.{file_type}", data=data, params=params, headers=headers)
+    if response.status_code != 201:
+        logging.error(f"Error configuring GeoServer store at {store_url}: {response}")
+        return False
+
+    if params["configure"] == "none":
+        body = {"featureType": {"name": layer_id, "nativeName": db["file_name"]}}
+        response = geoserver_client.post(f"{store_url}/featuretypes", data=json.dumps(body), headers=headers)
+        if response.status_code != 201:
+            logging.error(f"Error configuring GeoServer feature type for layer {db['layer_name']}: {response}")
+            return False
+
+    return True
+
+
+def get_layer_bounding_boxes(res_id):
+    """
+    Gets the native bounding box of every enabled layer in a resource's workspace.
+
+    All layers are read from a single WMS GetCapabilities request. Returns
+    None if the capabilities document cannot be fetched or parsed.
+    """
+
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(res_id)
+    params = {"service": "WMS", "version": "1.1.1", "request": "GetCapabilities"}
+    try:
+        response = geoserver_client.session.get(
+            geoserver_client.service_url(workspace_id, "wms"), params=params, timeout=geoserver_client.timeout
+        )
+        if response.status_code != 200:
+            logging.error(f"Error getting capabilities for workspace {workspace_id}: {response}")
+            return None
+        capabilities = etree.fromstring(response.content)
+    except Exception as e:
+        logging.error(f"Error reading capabilities for workspace {workspace_id}: {e}")
+        return None
+
+    bboxes = {}
+    for layer in capabilities.iterfind(".//Layer"):
+        name = layer.findtext("Name")
+        bbox = layer.find("BoundingBox")
+        if not name or bbox is None:
+            continue
+        if name.startswith(f"{workspace_id}:"):
+            name = name[len(workspace_id) + 1:]
+        try:
+            bboxes[name] = {
+                "minx": float(bbox.get("minx")),
+                "miny": float(bbox.get("miny")),
+                "maxx": float(bbox.get("maxx")),
+                "maxy": float(bbox.get("maxy")),
+                "crs": bbox.get("SRS") or bbox.get("CRS"),
+            }
+        except (TypeError, ValueError):
+            continue
+    return bboxes
+
+
+@metrics.timed("batch_register")
+def register_geoserver_dbs(res_id, dbs, workers=1):
+    """
+    Registers a resource's layers with as few GeoServer calls as possible.
+
+    Stores and layers are created with one or two calls each, then all new
+    layers are verified at once from the workspace's WMS capabilities. Any
+    layer that fails either step is removed and retried with the per-layer
+    register_geoserver_db. Returns one registration result per layer, in
+    the order given.
+    """
+
+    if not dbs:
+        return []
+
+    logger.info(f"Batch registering {len(dbs)} GeoServer layers for resource: {res_id}")
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="sync-configure") as executor:
+        configured = list(executor.map(lambda db: configure_geoserver_db(res_id, db), dbs))
+
+    bboxes = get_layer_bounding_boxes(res_id) if any(configured) else {}
+
+    results = []
+    for db, is_configured in zip(dbs, configured):
+        bbox = (bboxes or {}).get(db["layer_name"].replace("/", " ")) if is_configured else None
+        if bbox is not None:
+            results.append(utilities.finish_geoserver_db(res_id, db, bbox))
+            continue
+
+        logger.info(f"Falling back to per-layer registration for layer: {db['layer_name']}")
+        utilities.remove_geoserver_store(res_id, db)
+        results.append(utilities.register_geoserver_db(res_id, db))
+
+    return results
@@ -0,0 +1,353 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+DISCOVER_PAGE_SIZE = 100
+FILE_LIST_PAGE_SIZE = 1000
+DOWNLOAD_CHUNK_SIZE = 65536
+VRT_TEMPLATE = (
+    '<VRTDataset><Metadata>'
+    '<MDI key="STATISTICS_MINIMUM">0</MDI><MDI key="STATISTICS_MAXIMUM">255</MDI>'
+    '</Metadata><VRTRasterBand><NoDataValue>-9999</NoDataValue></VRTRasterBand></VRTDataset>'
+)
+
+
+class BenchmarkState:
+    """
+    Shared state of the fake HydroShare and GeoServer servers.
+
+    resources maps resource ids to HydroShare file_list entries; workspaces
+    maps GeoServer workspace names to their stores and styles. calls counts
+    requests by (server, method).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resources = {}
+        self.workspaces = {}
+        self.calls = Counter()
+
+    def add_resource(self, res_id, file_list):
+        with self.lock:
+            self.resources[res_id] = file_list
+
+    def reset_geoserver(self):
+        with self.lock:
+            self.workspaces.clear()
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls.clear()
+
+    def count_call(self, server, method):
+        with self.lock:
+            self.calls[(server, method)] += 1
+
+    def get_file(self, hs_path):
+        res_id = hs_path.split("/")[0]
+        for file_info in self.resources.get(res_id, []):
+            if "/".join(file_info["url"].split("/")[4:]) == hs_path:
+                return file_info
+        return None
+
+
+class BenchmarkServer(ThreadingHTTPServer):
+    """
+    Threaded local HTTP server that delays every response by latency seconds.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, handler_class, state, latency=0.0):
+        super().__init__(("127.0.0.1", 0), handler_class)
+        self.state = state
+        self.latency = latency
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class BenchmarkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_name = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup_request(self):
+        self.server.state.count_call(self.server_name, self.command)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        return unquote(url.path), parse_qs(url.query)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length).decode("utf-8") if length else ""
+
+    def send(self, status, body=b"", content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class FakeHydroShareHandler(BenchmarkHandler):
+    """
+    Serves file_list, discoverapi, resource file downloads and .vrt files.
+    """
+
+    server_name = "hydroshare"
+
+    def do_GET(self):
+        path, query = self.setup_request()
+        state = self.server.state
+
+        match = re.match(r"^/hsapi/resource/([^/]+)/file_list/$", path)
+        if match:
+            file_list = state.resources.get(match.group(1))
+            if file_list is None:
+                return self.send(404, {"detail": "Not found."})
+            page_number = int(query.get("page", ["1"])[0])
+            has_next = page_number * FILE_LIST_PAGE_SIZE < len(file_list)
+            page_url = f"http://{self.headers.get('Host')}{path}?page={{}}"
+            body = json.dumps({
+                "count": len(file_list),
+                "next": page_url.format(page_number + 1) if has_next else None,
+                "previous": page_url.format(page_number - 1) if page_number > 1 else None,
+                "results": file_list[(page_number - 1) * FILE_LIST_PAGE_SIZE:page_number * FILE_LIST_PAGE_SIZE],
+            }).encode("utf-8")
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self.send(304, headers={"ETag": etag})
+            return self.send(200, body, headers={"ETag": etag})
+
+        if path.rstrip("/") == "/discoverapi":
+            res_ids = sorted(state.resources)
+            page_number = int(query.get("pnum", ["1"])[0])
+            page = res_ids[(page_number - 1) * DISCOVER_PAGE_SIZE:page_number * DISCOVER_PAGE_SIZE]
+            return self.send(200, {
+                "resources": json.dumps([{"short_id": res_id} for res_id in page]),
+                "rescount": len(res_ids),
+                "pagecount": -(-len(res_ids) // DISCOVER_PAGE_SIZE),
+                "perpage": DISCOVER_PAGE_SIZE,
+            })
+
+        if path.startswith("/resource/"):
+            hs_path = path[len("/resource/"):]
+            if hs_path.endswith(".vrt"):
+                return self.send(200, VRT_TEMPLATE.encode("utf-8"), "text/xml")
+            file_info = state.get_file(hs_path)
+            if file_info is None:
+                return self.send(404)
+            etag = f'"{file_info.get("checksum", "")}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self.send(304, headers={"ETag": etag})
+            return self.send_file(file_info["size"], etag)
+
+        self.send(404)
+
+    def send_file(self, size, etag):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        chunk = b"\0" * DOWNLOAD_CHUNK_SIZE
+        remaining = size
+        while remaining > 0:
+            self.wfile.write(chunk[:min(remaining, DOWNLOAD_CHUNK_SIZE)])
+            remaining -= DOWNLOAD_CHUNK_SIZE
+
+
+class FakeGeoServerHandler(BenchmarkHandler):
+    """
+    Implements the GeoServer REST calls made by the sync pipeline against in-memory workspaces.
+    """
+
+    server_name = "geoserver"
+    rest_prefix = "/geoserver/rest/"
+
+    def get_parts(self):
+        """
+        Gets the REST path segments and query of a request, or (None, path) outside the REST API.
+        """
+
+        path, query = self.setup_request()
+        if path.startswith(self.rest_prefix):
+            return path[len(self.rest_prefix):].strip("/").split("/"), query
+        return None, path
+
+    def get_workspace(self, name, create=False):
+        workspaces = self.server.state.workspaces
+        if create:
+            return workspaces.setdefault(name, {"stores": {}, "styles": set()})
+        return workspaces.get(name)
+
+    def do_GET(self):
+        parts, query = self.get_parts()
+        if parts is None:
+            # OGC service requests, e.g. /geoserver/{workspace}/wms
+            return self.send_capabilities(query)
+
+        if parts == ["workspaces.json"]:
+            names = sorted(self.server.state.workspaces)
+            return self.send(200, {"workspaces": {"workspace": [{"name": name} for name in names]} if names else ""})
+
+        if len(parts) == 2 and parts[1].endswith(".json"):
+            name = parts[1][:-len(".json")]
+            return self.send(200 if self.get_workspace(name) is not None else 404, {"workspace": {"name": name}})
+
+        workspace = self.get_workspace(parts[1]) if len(parts) > 1 else None
+        if workspace is None:
+            return self.send(404)
+
+        if len(parts) == 3 and parts[2] in ("datastores.json", "coverages.json"):
+            store_type, key, item = (
+                ("datastores", "dataStores", "dataStore") if parts[2] == "datastores.json"
+                else ("coveragestores", "coverages", "coverage")
+            )
+            names = [name for name, store in workspace["stores"].items() if store["type"] == store_type]
+            return self.send(200, {key: {item: [{"name": name} for name in names]} if names else ""})
+
+        if len(parts) == 4 and parts[2] == "styles":
+            return self.send(200 if parts[3].rsplit(".", 1)[0] in workspace["styles"] else 404, {})
+
+        if len(parts) == 6:
+            store = workspace["stores"].get(parts[3])
+            if store is None:
+                return self.send(404)
+            key = "coverage" if store["type"] == "coveragestores" else "featureType"
+            bbox = {"minx": 0.0, "miny": 0.0, "maxx": 1.0, "maxy": 1.0, "crs": "EPSG:4326"}
+            return self.send(200, {key: {
+                "name": store["layer"] or store["native"], "nativeName": store["native"],
+                "enabled": True, "nativeBoundingBox": bbox,
+            }})
+
+        self.send(404)
+
+    def send_capabilities(self, path):
+        workspace = self.get_workspace(path.strip("/").split("/")[1])
+        if workspace is None:
+            return self.send(404)
+        layers = "".join(
+            f'<Layer><Name>{store["layer"]}</Name>'
+            f'<BoundingBox SRS="EPSG:4326" minx="0" miny="0" maxx="1" maxy="1"/></Layer>'
+            for store in workspace["stores"].values() if store["layer"]
+        )
+        body = f'<WMT_MS_Capabilities version="1.1.1"><Capability><Layer>{layers}</Layer></Capability></WMT_MS_Capabilities>'
+        self.send(200, body.encode("utf-8"), "application/vnd.ogc.wms_xml")
+
+    def do_POST(self):
+        parts, _ = self.get_parts()
+        body = self.read_body()
+        if parts == ["workspaces"]:
+            name = json.loads(body)["workspace"]["name"]
+            if self.get_workspace(name) is not None:
+                return self.send(409)
+            self.get_workspace(name, create=True)
+            return self.send(201)
+
+        workspace = self.get_workspace(parts[1]) if parts and len(parts) > 1 else None
+        if workspace is None:
+            return self.send(404)
+
+        if len(parts) == 3 and parts[2] == "styles":
+            match = re.search(r"<UserStyle>\s*<Name>(.*?)</Name>", body)
+            if match is None or match.group(1) in workspace["styles"]:
+                return self.send(403)
+            workspace["styles"].add(match.group(1))
+            return self.send(201)
+
+        if len(parts) == 5 and parts[4] == "featuretypes":
+            store = workspace["stores"].get(parts[3])
+            if store is None:
+                return self.send(404)
+            store["layer"] = json.loads(body)["featureType"]["name"]
+            return self.send(201)
+
+        self.send(404)
+
+    def do_PUT(self):
+        parts, query = self.get_parts()
+        body = self.read_body()
+        if parts and parts[0] == "layers":
+            return self.send(200)
+
+        if parts and len(parts) == 2:
+            workspaces = self.server.state.workspaces
+            name = json.loads(body)["workspace"]["name"]
+            if parts[1] not in workspaces or (name != parts[1] and name in workspaces):
+                return self.send(404 if parts[1] not in workspaces else 409)
+            workspaces[name] = workspaces.pop(parts[1])
+            return self.send(200)
+
+        workspace = self.get_workspace(parts[1]) if parts and len(parts) > 1 else None
+        if workspace is None:
+            return self.send(404)
+
+        if len(parts) == 5 and parts[4].startswith("external."):
+            native = body.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+            configure = query.get("configure", ["first"])[0]
+            existing = workspace["stores"].get(parts[3])
+            if configure == "none":
+                layer = existing["layer"] if existing else None
+            else:
+                layer = query.get("coverageName", [native])[0]
+            workspace["stores"][parts[3]] = {"type": parts[2], "layer": layer, "native": native}
+            return self.send(201)
+
+        if len(parts) == 4 and parts[2] == "styles":
+            return self.send(200 if parts[3] in workspace["styles"] else 404)
+
+        if len(parts) == 6:
+            store = workspace["stores"].get(parts[3])
+            if store is None:
+                return self.send(404)
+            content = json.loads(body)
+            store["layer"] = content[next(iter(content))]["name"]
+            return self.send(200)
+
+        self.send(404)
+
+    def do_DELETE(self):
+        parts, _ = self.get_parts()
+        workspaces = self.server.state.workspaces
+        if parts and len(parts) == 2:
+            return self.send(200 if workspaces.pop(parts[1], None) is not None else 404)
+        if parts and len(parts) == 4 and parts[1] in workspaces:
+            return self.send(200 if workspaces[parts[1]]["stores"].pop(parts[3], None) is not None else 404)
+        self.send(404)
+
+
+def start_servers(state, hydroshare_latency=0.0, geoserver_latency=0.0):
+    """
+    Starts fake HydroShare and GeoServer servers on free local ports.
+    """
+
+    hydroshare = BenchmarkServer(FakeHydroShareHandler, state, hydroshare_latency).start()
+    geoserver = BenchmarkServer(FakeGeoServerHandler, state, geoserver_latency).start()
+    return hydroshare, geoserver
@@ -0,0 +1,190 @@
+import copy
+import math
+import os
+import resource
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from prometheus_client import REGISTRY
+from hs_data_services import settings
+from hs_data_services_sync import benchmark_servers, file_lists, styles
+from hs_data_services_sync.clients import reset_clients
+from hs_data_services_sync.models import Workspace
+
+
+SYNTHETIC_HOST = "https://www.hydroshare.org"
+SHAPEFILE_EXTENSIONS = (".shp", ".shx", ".dbf", ".prj")
+
+
+def get_synthetic_file_list(res_id, num_files, registered_fraction=0.5,
+                            raster_size=1024 * 1024, feature_size=64 * 1024):
+    """
+    Builds a HydroShare file_list for a resource with roughly num_files files.
+
+    Half of the files belong to GeoTIFF layers and half to shapefile layers
+    (four files each). Returns (file_list, geoserver_list), where
+    geoserver_list marks registered_fraction of the layers as already
+    registered and adds one stale layer.
+    """
+
+    file_list = []
+    geoserver_list = []
+    num_rasters = max(num_files // 2, 1)
+    num_shapefiles = max((num_files - num_rasters) // len(SHAPEFILE_EXTENSIONS), 1)
+    registered_every = int(1 / registered_fraction) if registered_fraction else None
+
+    def add_file(path, logical_file_type, content_type, size):
+        file_list.append({
+            "file_name": path.split("/")[-1],
+            "url": f"{SYNTHETIC_HOST}/resource/{res_id}/data/contents/{path}",
+            "size": size,
+            "content_type": content_type,
+            "logical_file_type": logical_file_type,
+            "modified_time": "2024-01-01T00:00:00Z",
+            "checksum": f"{abs(hash(path)):032x}",
+        })
+
+    for i in range(num_rasters):
+        add_file(f"rasters/{i // 100}/raster_{i}.tif", "GeoRasterLogicalFile", "image/tiff", raster_size)
+        if registered_every and i % registered_every == 0:
+            geoserver_list.append((f"rasters {i // 100} raster_{i}", "coveragestores"))
+
+    for i in range(num_shapefiles):
+        for ext in SHAPEFILE_EXTENSIONS:
+            content_type = "application/x-qgis" if ext == ".shp" else "application/octet-stream"
+            add_file(f"features/{i // 100}/feature_{i}{ext}", "GeoFeatureLogicalFile", content_type, feature_size)
+        if registered_every and i % registered_every == 0:
+            geoserver_list.append((f"features {i // 100} feature_{i}", "datastores"))
+
+    geoserver_list.append(("stale layer", "datastores"))
+
+    return file_list, geoserver_list
+
+
+def time_call(func, *args, repeat=1, **kwargs):
+    """
+    Calls func repeat times and returns (last result, list of durations in seconds).
+    """
+
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        durations.append(time.perf_counter() - start)
+    return result, durations
+
+
+def get_percentile(values, percentile):
+    """
+    Gets the nearest-rank percentile of a list of values, or None if it is empty.
+    """
+
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(math.ceil(percentile / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def get_copied_bytes():
+    """
+    Gets the bytes this process has written into GeoServer data directories, from the sync metrics.
+    """
+
+    return REGISTRY.get_sample_value("hs_data_services_sync_copied_bytes_total") or 0
+
+
+def get_peak_rss_mb():
+    """
+    Gets the peak resident set size of this process in megabytes.
+    """
+
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class BenchmarkEnvironment:
+    """
+    Fake HydroShare and GeoServer servers with the sync settings pointed at them.
+
+    Resources are synthetic and their GeoServer files are written to a
+    temporary data directory. Registry rows for the benchmark resources are
+    removed on reset and on exit.
+    """
+
+    def __init__(self, num_resources, files_per_resource, raster_size, feature_size,
+                 hydroshare_latency=0.0, geoserver_latency=0.0, res_id_prefix="benchmark"):
+        self.state = benchmark_servers.BenchmarkState()
+        self.res_ids = [f"{res_id_prefix}{i:05d}" for i in range(num_resources)]
+        for res_id in self.res_ids:
+            file_list, _ = get_synthetic_file_list(
+                res_id, files_per_resource, raster_size=raster_size, feature_size=feature_size
+            )
+            self.state.add_resource(res_id, file_list)
+        self.hydroshare_latency = hydroshare_latency
+        self.geoserver_latency = geoserver_latency
+        self.servers = []
+        self.data_dir = None
+
+    @contextmanager
+    def running(self):
+        hydroshare, geoserver = benchmark_servers.start_servers(
+            self.state, self.hydroshare_latency, self.geoserver_latency
+        )
+        self.servers = [hydroshare, geoserver]
+        self.data_dir = tempfile.mkdtemp(prefix="hs_data_services_benchmark_")
+        original_hydroshare_url = settings.HYDROSHARE_URL
+        original_data_services = settings.DATA_SERVICES
+
+        data_services = copy.deepcopy(original_data_services)
+        geoserver_settings = data_services.setdefault("geoserver", {})
+        geoserver_settings.update({
+            "URL": f"{geoserver.url}/geoserver/rest",
+            "GEOSERVER_DATA_DIR": self.data_dir,
+            "TRANSFER_BACKEND": "http",
+        })
+        # keeps benchmark statistics out of the shared style cache
+        geoserver_settings["STYLE_CACHE_KEY"] = f"{styles.DEFAULT_STYLE_CACHE_KEY}:benchmark"
+        geoserver_settings.setdefault("NAMESPACE", "HS")
+        settings.HYDROSHARE_URL = f"{hydroshare.url}/hsapi"
+        settings.DATA_SERVICES = data_services
+        self.reset_settings()
+        try:
+            self.reset()
+            yield self
+        finally:
+            self.forget_resources()
+            settings.HYDROSHARE_URL = original_hydroshare_url
+            settings.DATA_SERVICES = original_data_services
+            self.reset_settings()
+            for server in self.servers:
+                server.stop()
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    @staticmethod
+    def reset_settings():
+        reset_clients()
+        styles.reset_style_cache()
+
+    def forget_resources(self):
+        Workspace.objects.filter(resource_id__in=self.res_ids).delete()
+        for res_id in self.res_ids:
+            file_lists.forget(res_id)
+
+    def reset(self):
+        """
+        Empties GeoServer, the data directory and the registry for a cold run.
+        """
+
+        self.state.reset_geoserver()
+        self.state.reset_calls()
+        self.forget_resources()
+        styles.get_style_cache().clear()
+        styles.reset_style_cache()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+        os.makedirs(self.data_dir)
+
+    def get_calls(self, server):
+        return sum(count for (name, _), count in self.state.calls.items() if name == server)
@@ -0,0 +1,322 @@
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections
+from hs_data_services_sync import metrics, pipeline, registry, transfer, utilities
+from hs_data_services_sync.clients import get_geoserver_client
+
+logger = logging.getLogger(__name__)
+
+
+HEADERS = {
+    "content-type": "application/json"
+}
+STAGING_DIRECTORY = ".staging"
+SWITCH_RETRIES = 3
+SWITCH_RETRY_DELAY = 2
+
+
+def get_staging_workspace_id(res_id):
+    """
+    Gets the name of the workspace a resource is rebuilt in.
+
+    Staging and retired workspaces are named outside the "{namespace}-"
+    prefix, so the orphaned workspace sweep never mistakes them for resources.
+    """
+
+    return f"{get_geoserver_client().namespace}_staging-{res_id}"
+
+
+def get_retired_workspace_id(res_id):
+    return f"{get_geoserver_client().namespace}_retired-{res_id}"
+
+
+def workspace_exists(workspace_id):
+    return get_geoserver_client().get(f"/workspaces/{workspace_id}.json", headers=HEADERS).status_code == 200
+
+
+def delete_workspace(workspace_id):
+    """
+    Removes a workspace and everything in it; the copied files it points at are kept.
+    """
+
+    logger.info(f"Deleting GeoServer workspace: {workspace_id}")
+    return get_geoserver_client().delete(f"/workspaces/{workspace_id}", params={"recurse": True}, headers=HEADERS)
+
+
+def create_workspace(workspace_id):
+    """
+    Creates an empty workspace, replacing any left over from an earlier attempt.
+    """
+
+    if workspace_exists(workspace_id):
+        delete_workspace(workspace_id)
+    data = json.dumps({"workspace": {"name": workspace_id}})
+    return get_geoserver_client().post("/workspaces", headers=HEADERS, data=data).status_code == 201
+
+
+def rename_workspace(workspace_id, new_workspace_id):
+    """
+    Renames a workspace, along with its namespace, stores, layers and styles.
+    """
+
+    logger.info(f"Renaming GeoServer workspace {workspace_id} to {new_workspace_id}")
+    data = json.dumps({"workspace": {"name": new_workspace_id}})
+    response = get_geoserver_client().put(f"/workspaces/{workspace_id}", headers=HEADERS, data=data)
+    return response.status_code == 200
+
+
+def get_invalid_layers(workspace_id, dbs):
+    """
+    Gets the names of layers that are missing or not enabled in a workspace.
+    """
+
+    geoserver_client = get_geoserver_client()
+    invalid = []
+    for db in dbs:
+        layer_id = db["layer_name"].replace("/", " ")
+        rest_url = f"/workspaces/{workspace_id}/{db['store_type']}/{layer_id}/{db['layer_group']}/{layer_id}.json"
+        response = geoserver_client.get(rest_url, headers=HEADERS)
+        try:
+            if json.loads(response.content.decode('utf-8'))[db["verification"]]["enabled"] is False:
+                invalid.append(db["layer_name"])
+        except Exception:
+            invalid.append(db["layer_name"])
+    return invalid
+
+
+def remove_staged_store(staging_id, db):
+    """
+    Removes a layer's store from a staging workspace, leaving its copied files in place.
+    """
+
+    rest_url = f"/workspaces/{staging_id}/{db['store_type']}/{db['layer_name'].replace('/', ' ')}"
+    return get_geoserver_client().delete(rest_url, params={"recurse": True}, headers=HEADERS)
+
+
+def switch_workspaces(res_id, staging_id):
+    """
+    Replaces a resource's workspace with its staging workspace.
+
+    GeoServer cannot swap two workspaces in one call, so the live workspace
+    is renamed out of the way and the staging workspace renamed into its
+    place. Between the two renames, typically well under a second, the live
+    workspace name does not exist and requests for it fail. The second
+    rename is retried; if it still fails the live workspace is restored.
+    Returns the retired workspace's name, or False if the switch failed.
+    """
+
+    workspace_id = get_geoserver_client().workspace_id(res_id)
+    retired_id = None
+    if workspace_exists(workspace_id):
+        retired_id = get_retired_workspace_id(res_id)
+        if workspace_exists(retired_id):
+            delete_workspace(retired_id)
+        if not rename_workspace(workspace_id, retired_id):
+            return False
+
+    for attempt in range(SWITCH_RETRIES):
+        if attempt:
+            time.sleep(SWITCH_RETRY_DELAY)
+        if rename_workspace(staging_id, workspace_id):
+            return retired_id
+
+    if retired_id is not None and not rename_workspace(retired_id, workspace_id):
+        logger.error(f"Unable to restore GeoServer workspace {workspace_id} from {retired_id}")
+    return False
+
+
+def get_staging_directory(res_id):
+    """
+    Gets the directory changed layers' files are copied into while a resource is rebuilt.
+
+    It lies inside the resource's directory, so it is removed along with it.
+    """
+
+    return os.path.join(utilities.get_geoserver_data_dir(), res_id, STAGING_DIRECTORY)
+
+
+def link_file(source_path, file_path):
+    with transfer.atomic_path(file_path) as temp_path:
+        os.remove(temp_path)
+        try:
+            os.link(source_path, temp_path)
+        except OSError:
+            shutil.copyfile(source_path, temp_path)
+
+
+def promote_staged_files(res_id, staging_directory):
+    """
+    Places the files staged for a rebuild at their paths in the GeoServer data directory.
+
+    Files are linked rather than moved, so stores still reading the staging
+    directory keep working until they are pointed at the new paths.
+    """
+
+    geoserver_directory = utilities.get_geoserver_data_dir()
+    for dir_path, _, file_names in os.walk(os.path.join(staging_directory, res_id)):
+        for file_name in file_names:
+            if file_name == transfer.MANIFEST_NAME:
+                continue
+            source_path = os.path.join(dir_path, file_name)
+            link_file(source_path, os.path.join(geoserver_directory, os.path.relpath(source_path, staging_directory)))
+    transfer.Manifest(geoserver_directory, res_id).update(transfer.Manifest(staging_directory, res_id).load())
+
+
+def run_layers(func, dbs, concurrency):
+    """
+    Runs func(db) for every layer on a bounded thread pool, returning the results in order.
+    """
+
+    def call(db):
+        try:
+            return func(db)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="sync-rebuild") as executor:
+        return list(executor.map(call, dbs))
+
+
+@metrics.timed("rebuild")
+def rebuild_data_services(resource_id, concurrency=None, cleanup=None):
+    """
+    Re-registers all of a resource's layers in a staging workspace, then switches it live.
+
+    Every layer is copied and registered in the staging workspace and checked
+    for the enabled flag before the switch, so readers of the live workspace
+    never see a half-built layer set; the switch itself leaves a short window
+    in which the live workspace name does not exist (see switch_workspaces).
+    Files of changed layers are copied into a staging directory rather than
+    over the files the live workspace serves, and put in place once the
+    switch is done. If a live layer fails before the switch the staging
+    workspace is dropped and the live workspace is left untouched; new
+    layers that fail are left out and reported, as in a normal sync. The
+    retired workspace is passed to cleanup(workspace_id) for removal, or
+    deleted here if no cleanup is given. Resources that are private or have
+    no layers that can be staged are synced normally.
+    """
+
+    if concurrency is None:
+        concurrency = pipeline.get_layer_concurrency()
+
+    logger.info(f"Rebuilding data services for resource: {resource_id}")
+    response = {
+        'success': False,
+        'message': None,
+        'content': None
+    }
+
+    database_list = utilities.get_database_list(resource_id)
+    geoserver = database_list['geoserver']
+    dbs = geoserver['register'] + geoserver['update'] + geoserver['unchanged']
+    if database_list['access'] != 'public' or not dbs:
+        return pipeline.run_update_data_services(resource_id, concurrency)
+
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(resource_id)
+    staging_id = get_staging_workspace_id(resource_id)
+    staging_directory = get_staging_directory(resource_id)
+    shutil.rmtree(staging_directory, ignore_errors=True)
+    # new and unchanged layers' files are not served by a live layer that could change under it
+    directories = [staging_directory if db in geoserver['update'] else None for db in dbs]
+    # registering the staged layers records their new fingerprints before the files are in place
+    copied_fingerprints = registry.get_copied_fingerprints(resource_id)
+    staged_paths = [hs_path for db in geoserver['update'] for hs_path in db['fingerprints']]
+
+    def is_live(db):
+        return db not in geoserver['register']
+
+    def abort(message):
+        logger.error(f"Rebuild of resource {resource_id} failed, keeping workspace {workspace_id}: {message}")
+        delete_workspace(staging_id)
+        shutil.rmtree(staging_directory, ignore_errors=True)
+        # layers recorded while staging refer to the workspace that was kept
+        registry.record_geoserver_list(resource_id, workspace_id, utilities.get_geoserver_list(resource_id))
+        registry.restore_copied_fingerprints(resource_id, staged_paths, copied_fingerprints)
+        response['message'] = message
+        return response
+
+    if not create_workspace(staging_id):
+        response['message'] = f"Unable to create staging workspace: {staging_id}"
+        return response
+
+    copy_results = run_layers(
+        lambda item: utilities.copy_files_to_geoserver(resource_id, *item), list(zip(dbs, directories)), concurrency
+    )
+    copy_failures = [result for result in copy_results if result['success'] is False]
+    live_failures = [result for db, result in zip(dbs, copy_results) if result['success'] is False and is_live(db)]
+    if live_failures:
+        return abort(live_failures[0]['message'])
+    staged = [(db, directory) for db, directory, result in zip(dbs, directories, copy_results) if result['success'] is not False]
+
+    db_results = run_layers(
+        lambda item: utilities.register_geoserver_db(resource_id, item[0], workspace_id=staging_id, geoserver_directory=item[1]),
+        staged, concurrency
+    )
+    failed = [db for (db, _), result in zip(staged, db_results) if result['success'] is False]
+    invalid = get_invalid_layers(staging_id, [db for db, _ in staged if db not in failed])
+    failed += [db for db, _ in staged if db['layer_name'] in invalid]
+    if any(is_live(db) for db in failed):
+        return abort(f"Unable to register layers: {', '.join(db['layer_name'] for db in failed if is_live(db))}")
+
+    # new layers that fail are skipped, as in a normal sync
+    for db in failed:
+        remove_staged_store(staging_id, db)
+    registered = [db for db, _ in staged if db not in failed]
+    skipped = [db['layer_name'] for db in dbs if db not in registered]
+    if not registered:
+        logger.info(f"No layers of resource {resource_id} could be staged; syncing it normally")
+        delete_workspace(staging_id)
+        return pipeline.run_update_data_services(resource_id, concurrency)
+
+    retired_id = switch_workspaces(resource_id, staging_id)
+    if retired_id is False:
+        if not workspace_exists(workspace_id):
+            # neither switching nor restoring worked: keep both workspaces and their files for repair
+            message = (
+                f"Unable to switch {staging_id} to {workspace_id} or restore it; "
+                f"layers remain in {staging_id} and {get_retired_workspace_id(resource_id)}"
+            )
+            logger.error(message)
+            registry.restore_copied_fingerprints(resource_id, staged_paths, copied_fingerprints)
+            registry.expire_resource(resource_id)
+            response['message'] = message
+            return response
+        return abort(f"Unable to switch {staging_id} to {workspace_id}")
+
+    if geoserver['update']:
+        promote_staged_files(resource_id, staging_directory)
+        # points the changed layers' stores at the files just put in place
+        results = run_layers(lambda db: utilities.update_geoserver_db(resource_id, db), geoserver['update'], concurrency)
+        repointed = all(result['success'] is not False for result in results)
+        if repointed:
+            shutil.rmtree(staging_directory, ignore_errors=True)
+        else:
+            logger.error(f"Unable to point all layers of resource {resource_id} at their files; keeping {staging_directory}")
+
+    for db in geoserver['unregister'] + failed:
+        # removes the stale or skipped layer's files and registry record; GeoServer no longer has it
+        utilities.unregister_geoserver_db(resource_id, db)
+
+    if retired_id is not None:
+        if cleanup is not None:
+            cleanup(retired_id)
+        else:
+            delete_workspace(retired_id)
+
+    # every layer is new to the tile cache after a rebuild
+    response['content'] = {'changed_layers': [db['layer_name'] for db in registered], 'skipped_layers': skipped}
+    if copy_failures:
+        response['message'] = copy_failures[0]['message']
+        logger.error(f"Rebuilt resource {resource_id} without layers whose files could not be copied: {response['message']}")
+        return response
+    response['success'] = True
+    response['message'] = f'Successfully rebuilt GeoServer data services for resource: {resource_id}'
+    if skipped:
+        response['message'] += f"; skipped layers that could not be registered: {', '.join(skipped)}"
+    logger.info(response['message'])
+    return response
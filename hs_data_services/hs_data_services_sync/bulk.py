@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PARALLEL_WORKERS = 8
+
+
+class Checkpoint:
+    """
+    Append-only record of finished resources, one JSON line per resource.
+
+    A resource is only skipped on resume if its latest record succeeded, so
+    failed resources are retried when an interrupted run is restarted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self):
+        records = {}
+        if not self.path or not os.path.exists(self.path):
+            return records
+        with open(self.path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping unreadable checkpoint line: {line}")
+                    continue
+                records[record["resource_id"]] = record
+        return records
+
+    def completed(self):
+        return {res_id for res_id, record in self.load().items() if record.get("success")}
+
+    def record(self, result):
+        if not self.path:
+            return
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+
+
+def run_bulk(resource_ids, action, workers=1, checkpoint=None, total=None, label="Processing", out=print):
+    """
+    Runs action(resource_id) for every resource on a bounded thread pool.
+
+    resource_ids may be any iterable, including a generator that is still
+    fetching ids; at most workers * 2 resources are queued at a time. action
+    should return a dict with 'success' and 'message' keys. Returns a summary
+    dict with per-resource results.
+    """
+
+    checkpoint = checkpoint or Checkpoint(None)
+    skip = checkpoint.completed()
+    if skip:
+        out(f"Resuming from checkpoint {checkpoint.path}: skipping {len(skip)} completed resources")
+
+    summary = {
+        "succeeded": [],
+        "failed": [],
+        "skipped": [],
+        "elapsed": None,
+    }
+    progress = {"count": 0}
+    start_time = time.monotonic()
+
+    def run_one(res_id):
+        resource_start = time.monotonic()
+        try:
+            response = action(res_id)
+            success = bool(response and response.get("success"))
+            message = response.get("message") if response else None
+        except Exception as e:
+            logger.exception(f"Error while {label.lower()} resource: {res_id}")
+            success = False
+            message = f"{type(e).__name__}: {e}"
+        finally:
+            # worker threads open their own database connections
+            connections.close_all()
+        return {
+            "resource_id": res_id,
+            "success": success,
+            "message": message,
+            "elapsed": round(time.monotonic() - resource_start, 3),
+        }
+
+    def finish(result):
+        progress["count"] += 1
+        checkpoint.record(result)
+        if result["success"]:
+            summary["succeeded"].append(result)
+        else:
+            summary["failed"].append(result)
+        status = "ok" if result["success"] else "FAILED"
+        out(
+            f"{progress['count']}/{total if total is not None else '?'} - {label} {result['resource_id']}: "
+            f"{status} in {result['elapsed']:.2f}s"
+            f"{'' if result['success'] else ' - ' + str(result['message'])}"
+        )
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        pending = set()
+        for res_id in resource_ids:
+            if res_id in skip:
+                summary["skipped"].append(res_id)
+                continue
+            if len(pending) >= max(workers, 1) * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future.result())
+            pending.add(executor.submit(run_one, res_id))
+        for future in wait(pending).done:
+            finish(future.result())
+
+    summary["elapsed"] = round(time.monotonic() - start_time, 3)
+    return summary
+
+
+def print_summary(summary, out=print):
+    """
+    Prints a final success/failure summary for a bulk run.
+    """
+
+    succeeded = summary["succeeded"]
+    failed = summary["failed"]
+    processed = len(succeeded) + len(failed)
+    out(
+        f"Processed {processed} resources in {summary['elapsed']:.1f}s: "
+        f"{len(succeeded)} succeeded, {len(failed)} failed, {len(summary['skipped'])} skipped"
+    )
+    if processed:
+        timings = sorted(result["elapsed"] for result in succeeded + failed)
+        out(
+            f"Per-resource time: mean {sum(timings) / processed:.2f}s, "
+            f"median {timings[processed // 2]:.2f}s, max {timings[-1]:.2f}s"
+        )
+    for result in failed:
+        out(f"Failed: {result['resource_id']} - {result['message']}")
@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from hs_data_services import settings
+from hs_data_services_sync import metrics
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 300
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (502, 503, 504)
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def build_session(pool_size, retries, backoff_factor, auth=None):
+    """
+    Builds a requests session with a keep-alive connection pool and retry/backoff.
+    """
+
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.auth = auth
+
+    return session
+
+
+class RestClient:
+    """
+    REST client backed by a pooled, retrying requests session.
+
+    Request paths are appended to the client's base URL. Responses are
+    recorded in the HTTP metrics under the client's service name.
+    """
+
+    service = None
+
+    def __init__(self, url, auth=None, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = build_session(
+            pool_size=pool_size,
+            retries=retries,
+            backoff_factor=backoff_factor,
+            auth=auth
+        )
+        if self.service:
+            self.session.hooks["response"].append(metrics.response_hook(self.service))
+
+    @staticmethod
+    def session_options(client_settings):
+        return {
+            "pool_size": client_settings.get('POOL_SIZE', DEFAULT_POOL_SIZE),
+            "connect_timeout": client_settings.get('CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+            "read_timeout": client_settings.get('READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+            "retries": client_settings.get('RETRIES', DEFAULT_RETRIES),
+            "backoff_factor": client_settings.get('BACKOFF_FACTOR', DEFAULT_BACKOFF_FACTOR),
+        }
+
+    def request(self, method, path, base_url=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, f"{base_url or self.url}{path}", **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class GeoServerClient(RestClient):
+    """
+    GeoServer REST client, e.g. client.get(f"/workspaces/{workspace_id}/datastores.json").
+
+    Requests other than reads wait for a slot from write_limiter, if set.
+    """
+
+    service = "geoserver"
+
+    def __init__(self, url, user, password, namespace, write_limiter=None, **kwargs):
+        super().__init__(url, auth=requests.auth.HTTPBasicAuth(user, password), **kwargs)
+        self.namespace = namespace
+        self.write_limiter = write_limiter
+
+    @classmethod
+    def from_settings(cls):
+        # throttle depends on coordination, which uses ProcessLocal from this module
+        from hs_data_services_sync.throttle import WriteLimiter
+
+        geoserver_settings = settings.DATA_SERVICES.get("geoserver", {})
+        write_limiter = WriteLimiter.from_settings()
+        return cls(
+            url=geoserver_settings.get('URL'),
+            user=geoserver_settings.get('USER'),
+            password=geoserver_settings.get('PASSWORD'),
+            namespace=geoserver_settings.get('NAMESPACE'),
+            write_limiter=write_limiter if write_limiter.enabled else None,
+            **cls.session_options(geoserver_settings)
+        )
+
+    def request(self, method, path, **kwargs):
+        if self.write_limiter is None or method.upper() in READ_METHODS:
+            return super().request(method, path, **kwargs)
+        with self.write_limiter.slot():
+            return super().request(method, path, **kwargs)
+
+    def workspace_id(self, res_id):
+        return f"{self.namespace}-{res_id}"
+
+    @property
+    def gwc_url(self):
+        """
+        GeoWebCache REST API base URL, e.g. client.post("/masstruncate", base_url=client.gwc_url).
+        """
+
+        return f"{'/'.join(self.url.split('/')[:-1])}/gwc/rest"
+
+    def service_url(self, workspace_id, service):
+        """
+        Gets the URL of a workspace's OGC service, e.g. service_url(workspace_id, "wms").
+        """
+
+        return f"{'/'.join(self.url.split('/')[:-1])}/{workspace_id}/{service}"
+
+
+class HydroShareClient(RestClient):
+    """
+    HydroShare client rooted at the site URL, e.g. client.get(f"/resource/{hs_path}").
+
+    REST API paths are prefixed with api_prefix, which is derived from
+    HYDROSHARE_URL (e.g. "/hsapi").
+    """
+
+    service = "hydroshare"
+
+    def __init__(self, url, api_prefix, **kwargs):
+        super().__init__(url, **kwargs)
+        self.api_prefix = api_prefix
+
+    @classmethod
+    def from_settings(cls):
+        hydroshare_settings = settings.DATA_SERVICES.get("hydroshare", {})
+        return cls(
+            url="/".join(settings.HYDROSHARE_URL.split("/")[:-1]),
+            api_prefix="/" + settings.HYDROSHARE_URL.split("/")[-1],
+            **cls.session_options(hydroshare_settings)
+        )
+
+
+class ProcessLocal:
+    """
+    Lazily builds one object per process.
+
+    The object is rebuilt after a fork so that prefork Celery workers and
+    Gunicorn workers never share pooled sockets with their parent process.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.value = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        pid = os.getpid()
+        if self.value is None or self.pid != pid:
+            with self.lock:
+                if self.value is None or self.pid != pid:
+                    logger.info(f"Creating {self.factory.__qualname__} for process: {pid}")
+                    self.value = self.factory()
+                    self.pid = pid
+        return self.value
+
+    def reset(self):
+        with self.lock:
+            if self.value is not None and self.pid == os.getpid():
+                self.value.close()
+            self.value = None
+            self.pid = None
+
+
+_geoserver_client = ProcessLocal(GeoServerClient.from_settings)
+_hydroshare_client = ProcessLocal(HydroShareClient.from_settings)
+
+
+def get_geoserver_client():
+    """
+    Returns the GeoServer client shared by this worker process.
+    """
+
+    return _geoserver_client.get()
+
+
+def get_hydroshare_client():
+    """
+    Returns the HydroShare client shared by this worker process.
+    """
+
+    return _hydroshare_client.get()
+
+
+def reset_clients():
+    """
+    Drops the shared clients so the next call picks up current settings.
+    """
+
+    _geoserver_client.reset()
+    _hydroshare_client.reset()
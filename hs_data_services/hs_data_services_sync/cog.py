@@ -0,0 +1,113 @@
+import logging
+from hs_data_services import settings
+from hs_data_services_sync import metrics, transfer
+
+try:
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.shutil import copy as copy_raster
+except ImportError:
+    rasterio = None
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_COG_BLOCKSIZE = 512
+DEFAULT_COG_COMPRESSION = "DEFLATE"
+DEFAULT_COG_RESAMPLING = "NEAREST"
+
+
+def get_geoserver_settings():
+    return settings.DATA_SERVICES.get("geoserver", {})
+
+
+def is_enabled():
+    return bool(get_geoserver_settings().get('COG_CONVERSION', False))
+
+
+def is_available():
+    return rasterio is not None
+
+
+def is_optimized(file_path, blocksize=DEFAULT_COG_BLOCKSIZE):
+    """
+    Checks whether a GeoTIFF is already tiled with overviews; rasters within one tile always are.
+    """
+
+    with rasterio.open(file_path) as src:
+        if max(src.width, src.height) <= blocksize:
+            return True
+        return bool(src.profile.get("tiled")) and bool(src.overviews(1))
+
+
+def get_overview_factors(width, height, blocksize):
+    factors = []
+    factor = 2
+    while max(width, height) / (factor // 2) > blocksize:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def has_driver(name):
+    with rasterio.Env() as env:
+        return name in env.drivers()
+
+
+def convert_to_cog(file_path, blocksize, compression, resampling):
+    """
+    Rewrites a GeoTIFF in place as a tiled, compressed GeoTIFF with internal overviews.
+
+    Uses GDAL's COG driver where available, otherwise writes a tiled GeoTIFF
+    and builds its overviews. The file is replaced atomically, so GeoServer
+    never reads a partial file.
+    """
+
+    with transfer.atomic_path(file_path) as temp_path:
+        with rasterio.Env(GDAL_NUM_THREADS="ALL_CPUS"):
+            if has_driver("COG"):
+                copy_raster(
+                    file_path, temp_path, driver="COG", BLOCKSIZE=blocksize, COMPRESS=compression,
+                    OVERVIEWS="AUTO", RESAMPLING=resampling, BIGTIFF="IF_SAFER"
+                )
+                return
+            copy_raster(
+                file_path, temp_path, driver="GTiff", TILED="YES", BLOCKXSIZE=blocksize, BLOCKYSIZE=blocksize,
+                COMPRESS=compression, BIGTIFF="IF_SAFER"
+            )
+            with rasterio.open(temp_path, "r+") as dst:
+                factors = get_overview_factors(dst.width, dst.height, blocksize)
+                if factors:
+                    dst.build_overviews(factors, Resampling[resampling.lower()])
+
+
+@metrics.timed("cog")
+def optimize_raster(file_path):
+    """
+    Converts a copied GeoTIFF to a Cloud-Optimized GeoTIFF unless it is already optimized.
+
+    Returns True if the file was converted. Conversion failures are logged
+    and leave the copied file as it was.
+    """
+
+    if not is_available():
+        logger.warning(f"Not optimizing {file_path}: rasterio is not installed")
+        return False
+
+    geoserver_settings = get_geoserver_settings()
+    blocksize = geoserver_settings.get('COG_BLOCKSIZE', DEFAULT_COG_BLOCKSIZE)
+    try:
+        if is_optimized(file_path, blocksize):
+            logger.info(f"Raster already optimized: {file_path}")
+            return False
+        logger.info(f"Converting raster to COG: {file_path}")
+        convert_to_cog(
+            file_path,
+            blocksize,
+            geoserver_settings.get('COG_COMPRESSION', DEFAULT_COG_COMPRESSION),
+            geoserver_settings.get('COG_RESAMPLING', DEFAULT_COG_RESAMPLING),
+        )
+    except Exception as e:
+        logger.warning(f"Unable to convert raster to COG, keeping it as copied: {file_path}: {e}")
+        return False
+    return True
@@ -0,0 +1,139 @@
+import logging
+import time
+from contextlib import contextmanager
+import redis
+from hs_data_services import settings
+from hs_data_services_sync.clients import ProcessLocal
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_QUIET_WINDOW = 30
+DEFAULT_MAX_DELAY = 600
+DEFAULT_PENDING_TIMEOUT = 3600
+DEFAULT_LOCK_TIMEOUT = 6 * 3600
+DEFAULT_LOCK_RETRY_DELAY = 60
+KEY_PREFIX = "hs_data_services:sync"
+
+
+def get_sync_settings():
+    return settings.DATA_SERVICES.get("sync", {})
+
+
+class RedisConnection(redis.Redis):
+    """
+    Redis client for sync coordination; uses the Celery broker unless REDIS_URL is set.
+    """
+
+    @classmethod
+    def from_settings(cls):
+        return cls.from_url(get_sync_settings().get('REDIS_URL', settings.CELERY_BROKER_URL))
+
+
+_redis = ProcessLocal(RedisConnection.from_settings)
+
+
+def get_redis():
+    return _redis.get()
+
+
+def pending_key(res_id):
+    return f"{KEY_PREFIX}:pending:{res_id}"
+
+
+def deadline_key(res_id):
+    return f"{KEY_PREFIX}:deadline:{res_id}"
+
+
+def lock_key(res_id):
+    return f"{KEY_PREFIX}:lock:{res_id}"
+
+
+def request_sync(res_id, quiet_window=None):
+    """
+    Records a sync request and pushes the resource's quiet-window deadline back.
+
+    Returns True if no sync is pending yet, in which case the caller should
+    enqueue one; requests made while a sync is pending are coalesced into it.
+    If Redis is unreachable every request is treated as new.
+    """
+
+    sync_settings = get_sync_settings()
+    if quiet_window is None:
+        quiet_window = sync_settings.get('QUIET_WINDOW', DEFAULT_QUIET_WINDOW)
+    pending_timeout = sync_settings.get('PENDING_TIMEOUT', DEFAULT_PENDING_TIMEOUT)
+    now = time.time()
+
+    try:
+        pipeline = get_redis().pipeline()
+        pipeline.set(pending_key(res_id), now, nx=True, ex=pending_timeout)
+        pipeline.set(deadline_key(res_id), now + quiet_window, ex=pending_timeout)
+        is_new, _ = pipeline.execute()
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Unable to coalesce sync request for resource {res_id}: {e}")
+        return True
+
+    if not is_new:
+        logger.info(f"Sync already pending for resource {res_id}; coalescing request")
+    return bool(is_new)
+
+
+def get_remaining_quiet_time(res_id):
+    """
+    Gets the seconds until a pending resource's quiet window ends.
+
+    The window is capped at MAX_DELAY after the first request, so a steady
+    stream of edits cannot postpone a sync forever.
+    """
+
+    max_delay = get_sync_settings().get('MAX_DELAY', DEFAULT_MAX_DELAY)
+    try:
+        first_request, deadline = get_redis().mget(pending_key(res_id), deadline_key(res_id))
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Unable to read sync deadline for resource {res_id}: {e}")
+        return 0
+    if first_request is None or deadline is None:
+        return 0
+    deadline = min(float(deadline), float(first_request) + max_delay)
+    return max(deadline - time.time(), 0)
+
+
+def clear_pending(res_id):
+    """
+    Clears the pending marker so requests arriving during the sync schedule a follow-up sync.
+    """
+
+    try:
+        get_redis().delete(pending_key(res_id), deadline_key(res_id))
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Unable to clear pending sync for resource {res_id}: {e}")
+
+
+@contextmanager
+def resource_lock(res_id):
+    """
+    Holds a non-blocking per-resource lock; yields whether it was acquired.
+
+    If Redis is unreachable the sync proceeds without a lock.
+    """
+
+    lock = None
+    try:
+        lock = get_redis().lock(
+            lock_key(res_id),
+            timeout=get_sync_settings().get('LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+        )
+        acquired = lock.acquire(blocking=False)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Unable to lock resource {res_id}, syncing without a lock: {e}")
+        lock = None
+        acquired = True
+
+    try:
+        yield acquired
+    finally:
+        if lock is not None and acquired:
+            try:
+                lock.release()
+            except (redis.exceptions.LockError, redis.exceptions.RedisError) as e:
+                logger.warning(f"Unable to release lock for resource {res_id}: {e}")
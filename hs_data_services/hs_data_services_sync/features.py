@@ -0,0 +1,157 @@
+import logging
+import os
+import shutil
+import tempfile
+from hs_data_services import settings
+from hs_data_services_sync import metrics, transfer
+
+try:
+    from osgeo import gdal
+    gdal.UseExceptions()
+except ImportError:
+    gdal = None
+
+logger = logging.getLogger(__name__)
+
+
+INDEX = "index"
+GEOPACKAGE = "geopackage"
+SHAPEFILE_EXTENSIONS = (".shp", ".shx", ".dbf", ".prj")
+
+
+def get_optimization():
+    """
+    Gets the FEATURE_OPTIMIZATION setting: None, "index" or "geopackage".
+    """
+
+    return settings.DATA_SERVICES.get("geoserver", {}).get('FEATURE_OPTIMIZATION')
+
+
+def is_available():
+    return gdal is not None
+
+
+def get_index_path(hs_path):
+    return f"{os.path.splitext(hs_path)[0]}.qix"
+
+
+def get_geopackage_path(hs_path):
+    return f"{os.path.splitext(hs_path)[0]}.gpkg"
+
+
+def get_derived_paths(hs_path):
+    """
+    Gets the paths of files that may have been built from a shapefile.
+    """
+
+    return [get_index_path(hs_path), get_geopackage_path(hs_path)]
+
+
+def get_store_file(db, geoserver_directory):
+    """
+    Gets the path, relative to the GeoServer data directory, and upload type of the file a layer's store reads.
+
+    Shapefile layers read their GeoPackage when one has been built for them.
+    """
+
+    if db.get("layer_type") == "GeographicFeature" and get_optimization() == GEOPACKAGE:
+        geopackage_path = get_geopackage_path(db["hs_path"])
+        if os.path.exists(os.path.join(geoserver_directory, geopackage_path)):
+            return geopackage_path, "gpkg"
+    return db["hs_path"], db["file_type"]
+
+
+def is_stale(derived_path, shp_path):
+    """
+    Checks whether a file built from a shapefile is missing or older than any of the shapefile's parts.
+    """
+
+    if not os.path.exists(derived_path):
+        return True
+    built = os.path.getmtime(derived_path)
+    base = os.path.splitext(shp_path)[0]
+    return any(
+        os.path.exists(base + extension) and os.path.getmtime(base + extension) > built
+        for extension in SHAPEFILE_EXTENSIONS
+    )
+
+
+def build_spatial_index(shp_path):
+    """
+    Builds a shapefile's .qix quadtree index, which GeoServer uses for bounding box queries.
+
+    GDAL opens the shapefile for update to write the index, so it works on
+    a copy in a temporary directory; the copied layer, and with the
+    hardlink transfer backend the HydroShare source, share inodes and
+    must not be opened for writing. The index is then renamed into place,
+    so GeoServer never reads a partial index.
+    """
+
+    dir_path = os.path.dirname(shp_path)
+    base_name = os.path.splitext(os.path.basename(shp_path))[0]
+    temp_dir = tempfile.mkdtemp(dir=dir_path, prefix=f".{base_name}.", suffix=".index")
+    try:
+        for extension in SHAPEFILE_EXTENSIONS:
+            source_path = os.path.join(dir_path, base_name + extension)
+            if not os.path.exists(source_path):
+                continue
+            shutil.copyfile(source_path, os.path.join(temp_dir, base_name + extension))
+        dataset = gdal.OpenEx(os.path.join(temp_dir, base_name + ".shp"), gdal.OF_VECTOR | gdal.OF_UPDATE)
+        layer_name = dataset.GetLayer(0).GetName()
+        dataset.ExecuteSQL(f'CREATE SPATIAL INDEX ON "{layer_name}"')
+        dataset = None
+        os.replace(os.path.join(temp_dir, base_name + ".qix"), os.path.join(dir_path, base_name + ".qix"))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def convert_to_geopackage(shp_path, layer_name):
+    """
+    Converts a shapefile to a GeoPackage with an R-tree spatial index.
+
+    The GeoPackage table is named layer_name, the shapefile's file name, so
+    the layer is configured and verified under the same native name.
+    """
+
+    geopackage_path = get_geopackage_path(shp_path)
+    with transfer.atomic_path(geopackage_path) as temp_path:
+        # the GeoPackage driver creates the file itself
+        os.remove(temp_path)
+        gdal.VectorTranslate(
+            temp_path, shp_path, format="GPKG", layerName=layer_name,
+            layerCreationOptions=["SPATIAL_INDEX=YES"]
+        )
+
+
+@metrics.timed("prepare_features")
+def prepare_shapefile(shp_path, layer_name):
+    """
+    Builds the spatial index or GeoPackage selected by FEATURE_OPTIMIZATION for a copied shapefile.
+
+    Nothing is rebuilt while the derived file is newer than the shapefile.
+    Returns True if a file was built. Failures are logged and the layer is
+    registered from the shapefile as it was copied.
+    """
+
+    optimization = get_optimization()
+    if optimization not in (INDEX, GEOPACKAGE):
+        return False
+    if not is_available():
+        logger.warning(f"Not preparing {shp_path}: GDAL is not installed")
+        return False
+
+    derived_path = get_index_path(shp_path) if optimization == INDEX else get_geopackage_path(shp_path)
+    if not is_stale(derived_path, shp_path):
+        logger.info(f"Shapefile already prepared: {derived_path}")
+        return False
+    try:
+        if optimization == INDEX:
+            logger.info(f"Building spatial index for shapefile: {shp_path}")
+            build_spatial_index(shp_path)
+        else:
+            logger.info(f"Converting shapefile to GeoPackage: {shp_path}")
+            convert_to_geopackage(shp_path, layer_name)
+    except Exception as e:
+        logger.warning(f"Unable to prepare shapefile, registering it as copied: {shp_path}: {e}")
+        return False
+    return True
@@ -0,0 +1,140 @@
+import json
+import logging
+import zlib
+import redis
+from hs_data_services import settings
+from hs_data_services_sync import coordination, metrics
+from hs_data_services_sync.clients import get_hydroshare_client
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_FILE_LIST_CACHE_TTL = 7 * 86400
+
+
+def get_hydroshare_settings():
+    return settings.DATA_SERVICES.get("hydroshare", {})
+
+
+def is_enabled():
+    return get_hydroshare_settings().get('FILE_LIST_CACHE', True)
+
+
+def cache_key(res_id):
+    return f"{coordination.KEY_PREFIX}:file_list:{res_id}"
+
+
+def load(res_id):
+    """
+    Gets a resource's cached file_list pages, or an empty list.
+    """
+
+    if not is_enabled():
+        return []
+    try:
+        content = coordination.get_redis().get(cache_key(res_id))
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Unable to read cached file_list for resource {res_id}: {e}")
+        return []
+    if content is None:
+        return []
+    try:
+        return json.loads(zlib.decompress(content).decode("utf-8"))
+    except (zlib.error, ValueError):
+        logger.warning(f"Ignoring unreadable cached file_list for resource {res_id}")
+        return []
+
+
+def save(res_id, pages):
+    """
+    Caches a resource's file_list pages if every page can be revalidated.
+    """
+
+    if not is_enabled():
+        return
+    if not all(page.get("etag") or page.get("last_modified") for page in pages):
+        forget(res_id)
+        return
+    content = zlib.compress(json.dumps(pages).encode("utf-8"))
+    ttl = get_hydroshare_settings().get('FILE_LIST_CACHE_TTL', DEFAULT_FILE_LIST_CACHE_TTL)
+    try:
+        coordination.get_redis().set(cache_key(res_id), content, ex=ttl)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Unable to cache file_list for resource {res_id}: {e}")
+
+
+def touch(res_id):
+    """
+    Renews the expiry of a resource's cached file_list after it was revalidated.
+    """
+
+    if not is_enabled():
+        return
+    ttl = get_hydroshare_settings().get('FILE_LIST_CACHE_TTL', DEFAULT_FILE_LIST_CACHE_TTL)
+    try:
+        coordination.get_redis().expire(cache_key(res_id), ttl)
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Unable to renew cached file_list for resource {res_id}: {e}")
+
+
+def forget(res_id):
+    if not is_enabled():
+        return
+    try:
+        coordination.get_redis().delete(cache_key(res_id))
+    except redis.exceptions.RedisError as e:
+        logger.warning(f"Unable to forget cached file_list for resource {res_id}: {e}")
+
+
+@metrics.timed("file_list")
+def get_file_list(res_id):
+    """
+    Gets all file_list results for a resource, following pagination.
+
+    Each page is requested with the ETag and Last-Modified validators of its
+    cached copy, so an unchanged page costs a 304 and no download. Returns
+    (status code, results); results is None unless every page returned 200
+    or 304, in which case the status is that of the failing page.
+    """
+
+    hydroshare_client = get_hydroshare_client()
+    cached_pages = {page["url"]: page for page in load(res_id)}
+    url = f"{hydroshare_client.url}{hydroshare_client.api_prefix}/resource/{res_id}/file_list/"
+    pages = []
+    revalidated = 0
+
+    while url:
+        cached_page = cached_pages.get(url)
+        headers = {}
+        if cached_page is not None:
+            if cached_page.get("etag"):
+                headers["If-None-Match"] = cached_page["etag"]
+            if cached_page.get("last_modified"):
+                headers["If-Modified-Since"] = cached_page["last_modified"]
+        response = hydroshare_client.session.get(url, headers=headers, timeout=hydroshare_client.timeout)
+
+        if response.status_code == 304 and cached_page is not None:
+            page = cached_page
+            revalidated += 1
+        elif response.status_code == 200:
+            content = response.json()
+            page = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "next": content.get("next"),
+                "results": content["results"],
+            }
+        else:
+            forget(res_id)
+            return response.status_code, None
+
+        pages.append(page)
+        url = page["next"]
+
+    if revalidated < len(pages):
+        save(res_id, pages)
+    else:
+        touch(res_id)
+    logger.info(f"Got file_list for resource {res_id}: {len(pages)} pages, {revalidated} unchanged")
+    return 200, [result for page in pages for result in page["results"]]
@@ -0,0 +1,278 @@
+import json
+import logging
+import math
+from lxml import etree
+from hs_data_services import settings
+from hs_data_services_sync import metrics
+from hs_data_services_sync.clients import get_geoserver_client
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_GWC_GRIDSET = "EPSG:900913"
+DEFAULT_GWC_FORMAT = "image/png"
+DEFAULT_GWC_METATILES = 4
+DEFAULT_GWC_SEED_ZOOM_STOP = 8
+DEFAULT_GWC_SEED_MAX_TILES = 20000
+DEFAULT_GWC_SEED_THREADS = 1
+MAX_MERCATOR_LATITUDE = 85.0511287798
+
+LAYER_GROUPS = {
+    "datastores": ("featuretypes", "featureType"),
+    "coveragestores": ("coverages", "coverage"),
+}
+
+
+def get_geoserver_settings():
+    return settings.DATA_SERVICES.get("geoserver", {})
+
+
+def is_enabled():
+    return bool(get_geoserver_settings().get('GWC_TILE_LAYERS', False))
+
+
+def get_tile_layer_name(workspace_id, layer_id):
+    return f"{workspace_id}:{layer_id}"
+
+
+def build_tile_layer(tile_layer_name):
+    """
+    Builds the GeoWebCache configuration of a tile layer in the GWC_GRIDSET and GWC_FORMAT.
+    """
+
+    geoserver_settings = get_geoserver_settings()
+    metatiles = str(geoserver_settings.get('GWC_METATILES', DEFAULT_GWC_METATILES))
+
+    layer = etree.Element("GeoServerLayer")
+    etree.SubElement(layer, "name").text = tile_layer_name
+    etree.SubElement(layer, "enabled").text = "true"
+    mime_formats = etree.SubElement(layer, "mimeFormats")
+    etree.SubElement(mime_formats, "string").text = geoserver_settings.get('GWC_FORMAT', DEFAULT_GWC_FORMAT)
+    grid_subset = etree.SubElement(etree.SubElement(layer, "gridSubsets"), "gridSubset")
+    etree.SubElement(grid_subset, "gridSetName").text = geoserver_settings.get('GWC_GRIDSET', DEFAULT_GWC_GRIDSET)
+    meta_width_height = etree.SubElement(layer, "metaWidthHeight")
+    etree.SubElement(meta_width_height, "int").text = metatiles
+    etree.SubElement(meta_width_height, "int").text = metatiles
+    return etree.tostring(layer)
+
+
+def truncate_tile_layer(tile_layer_name):
+    """
+    Removes every cached tile of a tile layer.
+    """
+
+    geoserver_client = get_geoserver_client()
+    data = etree.Element("truncateLayer")
+    etree.SubElement(data, "layerName").text = tile_layer_name
+    response = geoserver_client.post(
+        "/masstruncate", base_url=geoserver_client.gwc_url, data=etree.tostring(data),
+        headers={"content-type": "text/xml"}
+    )
+    if response.status_code != 200:
+        logger.warning(f"Unable to truncate tile cache of layer {tile_layer_name}: {response}")
+        return False
+    logger.info(f"Truncated tile cache of layer: {tile_layer_name}")
+    return True
+
+
+def add_missing_settings(tile_layer):
+    """
+    Adds GWC_FORMAT and GWC_GRIDSET to an existing tile layer configuration that lacks them.
+
+    Returns the updated configuration, or None if nothing was missing.
+    """
+
+    geoserver_settings = get_geoserver_settings()
+    tile_format = geoserver_settings.get('GWC_FORMAT', DEFAULT_GWC_FORMAT)
+    gridset = geoserver_settings.get('GWC_GRIDSET', DEFAULT_GWC_GRIDSET)
+    changed = False
+
+    if tile_format not in tile_layer.xpath("mimeFormats/string/text()"):
+        mime_formats = tile_layer.find("mimeFormats")
+        if mime_formats is None:
+            mime_formats = etree.SubElement(tile_layer, "mimeFormats")
+        etree.SubElement(mime_formats, "string").text = tile_format
+        changed = True
+    if gridset not in tile_layer.xpath("gridSubsets/gridSubset/gridSetName/text()"):
+        grid_subsets = tile_layer.find("gridSubsets")
+        if grid_subsets is None:
+            grid_subsets = etree.SubElement(tile_layer, "gridSubsets")
+        etree.SubElement(etree.SubElement(grid_subsets, "gridSubset"), "gridSetName").text = gridset
+        changed = True
+    return etree.tostring(tile_layer) if changed else None
+
+
+@metrics.timed("tile_layer")
+def configure_tile_layer(workspace_id, layer_id):
+    """
+    Makes sure a registered layer has a GeoWebCache tile layer with an empty cache.
+
+    GeoServer usually creates a tile layer for every new layer with its own
+    default gridsets and formats, so an existing tile layer is given
+    GWC_GRIDSET and GWC_FORMAT if it lacks them, or seeds would fail. Its
+    tiles belong to the layer as it was before registration or update, so
+    they are truncated. A missing tile layer is created. Failures are
+    logged and leave the layer served untiled.
+    """
+
+    geoserver_client = get_geoserver_client()
+    tile_layer_name = get_tile_layer_name(workspace_id, layer_id)
+    rest_url = f"/layers/{tile_layer_name}.xml"
+    headers = {"content-type": "text/xml"}
+    try:
+        response = geoserver_client.get(rest_url, base_url=geoserver_client.gwc_url)
+        if response.status_code == 200:
+            data = add_missing_settings(etree.fromstring(response.content))
+            if data is not None:
+                response = geoserver_client.put(rest_url, base_url=geoserver_client.gwc_url, data=data, headers=headers)
+                if response.status_code != 200:
+                    logger.warning(f"Unable to update tile layer {tile_layer_name}: {response}")
+                    return False
+                logger.info(f"Updated tile layer: {tile_layer_name}")
+            return truncate_tile_layer(tile_layer_name)
+
+        response = geoserver_client.put(
+            rest_url, base_url=geoserver_client.gwc_url, data=build_tile_layer(tile_layer_name), headers=headers
+        )
+        if response.status_code != 200:
+            logger.warning(f"Unable to configure tile layer {tile_layer_name}: {response}")
+            return False
+    except Exception as e:
+        logger.warning(f"Unable to configure tile layer {tile_layer_name}: {e}")
+        return False
+    logger.info(f"Configured tile layer: {tile_layer_name}")
+    return True
+
+
+def get_tile_range(bbox, zoom, gridset):
+    """
+    Gets the number of tile columns and rows covering a lon/lat bounding box at a zoom level.
+
+    EPSG:4326 gridsets have two 180 degree tiles at zoom 0; other gridsets
+    are treated as web mercator with one tile at zoom 0.
+    """
+
+    minx, maxx = max(bbox["minx"], -180.0), min(bbox["maxx"], 180.0)
+    if "4326" in gridset:
+        size = 180.0 / 2 ** zoom
+        columns = math.floor((maxx + 180.0) / size) - math.floor((minx + 180.0) / size) + 1
+        rows = math.floor((90.0 - max(bbox["miny"], -90.0)) / size) - math.floor((90.0 - min(bbox["maxy"], 90.0)) / size) + 1
+        return min(columns, 2 ** (zoom + 1)), min(rows, 2 ** zoom)
+
+    def row(lat):
+        lat = math.radians(max(min(lat, MAX_MERCATOR_LATITUDE), -MAX_MERCATOR_LATITUDE))
+        return math.floor((1.0 - math.log(math.tan(lat) + 1.0 / math.cos(lat)) / math.pi) / 2.0 * 2 ** zoom)
+
+    tiles = 2 ** zoom
+    columns = math.floor((maxx + 180.0) / 360.0 * tiles) - math.floor((minx + 180.0) / 360.0 * tiles) + 1
+    rows = row(bbox["miny"]) - row(bbox["maxy"]) + 1
+    return min(columns, tiles), min(rows, tiles)
+
+
+def count_tiles(bbox, zoom_stop, gridset):
+    """
+    Counts the tiles covering a lon/lat bounding box from zoom 0 to zoom_stop.
+    """
+
+    total = 0
+    for zoom in range(zoom_stop + 1):
+        columns, rows = get_tile_range(bbox, zoom, gridset)
+        total += max(columns, 0) * max(rows, 0)
+    return total
+
+
+def get_seed_zoom_stop(bbox, max_zoom_stop, max_tiles, gridset):
+    """
+    Gets the deepest zoom level, up to max_zoom_stop, whose seed stays within max_tiles, or None.
+    """
+
+    zoom_stop = None
+    for zoom in range(max_zoom_stop + 1):
+        if count_tiles(bbox, zoom, gridset) > max_tiles:
+            break
+        zoom_stop = zoom
+    return zoom_stop
+
+
+def get_layer_bbox(workspace_id, layer_id, store_type):
+    """
+    Gets a layer's lon/lat bounding box from GeoServer, or None.
+    """
+
+    layer_group, verification = LAYER_GROUPS[store_type]
+    rest_url = f"/workspaces/{workspace_id}/{store_type}/{layer_id}/{layer_group}/{layer_id}.json"
+    response = get_geoserver_client().get(rest_url, headers={"content-type": "application/json"})
+    if response.status_code != 200:
+        return None
+    try:
+        return json.loads(response.content.decode('utf-8'))[verification]["latLonBoundingBox"]
+    except (KeyError, ValueError):
+        return None
+
+
+def seed_tile_layer(tile_layer_name, zoom_stop):
+    """
+    Asks GeoWebCache to render a tile layer's missing tiles from zoom 0 to zoom_stop.
+
+    The seed runs inside GeoServer; tiles already cached are not rendered again.
+    """
+
+    geoserver_client = get_geoserver_client()
+    geoserver_settings = get_geoserver_settings()
+    data = json.dumps({
+        "seedRequest": {
+            "name": tile_layer_name,
+            "gridSetId": geoserver_settings.get('GWC_GRIDSET', DEFAULT_GWC_GRIDSET),
+            "zoomStart": 0,
+            "zoomStop": zoom_stop,
+            "format": geoserver_settings.get('GWC_FORMAT', DEFAULT_GWC_FORMAT),
+            "type": "seed",
+            "threadCount": geoserver_settings.get('GWC_SEED_THREADS', DEFAULT_GWC_SEED_THREADS)
+        }
+    })
+    response = geoserver_client.post(
+        f"/seed/{tile_layer_name}.json", base_url=geoserver_client.gwc_url, data=data,
+        headers={"content-type": "application/json"}
+    )
+    return response.status_code == 200
+
+
+@metrics.timed("seed")
+def seed_resource_tiles(res_id, layer_list):
+    """
+    Queues GeoWebCache seeds of the low zoom levels of a resource's layers, given as (name, store type) pairs.
+
+    Each layer is seeded to the deepest zoom level, up to GWC_SEED_ZOOM_STOP,
+    that keeps the resource's total within GWC_SEED_MAX_TILES; layers are
+    taken in order until the budget is spent.
+    """
+
+    geoserver_settings = get_geoserver_settings()
+    gridset = geoserver_settings.get('GWC_GRIDSET', DEFAULT_GWC_GRIDSET)
+    max_zoom_stop = geoserver_settings.get('GWC_SEED_ZOOM_STOP', DEFAULT_GWC_SEED_ZOOM_STOP)
+    remaining = geoserver_settings.get('GWC_SEED_MAX_TILES', DEFAULT_GWC_SEED_MAX_TILES)
+
+    workspace_id = get_geoserver_client().workspace_id(res_id)
+    seeded = {}
+    for layer_id, store_type in layer_list:
+        bbox = get_layer_bbox(workspace_id, layer_id, store_type)
+        if bbox is None:
+            logger.warning(f"Not seeding layer {layer_id}: no bounding box")
+            continue
+        zoom_stop = get_seed_zoom_stop(bbox, max_zoom_stop, remaining, gridset)
+        if zoom_stop is None:
+            logger.info(f"Tile seed budget for resource {res_id} spent; not seeding layer: {layer_id}")
+            continue
+        tile_layer_name = get_tile_layer_name(workspace_id, layer_id)
+        if not seed_tile_layer(tile_layer_name, zoom_stop):
+            logger.warning(f"Unable to seed tile layer: {tile_layer_name}")
+            continue
+        remaining -= count_tiles(bbox, zoom_stop, gridset)
+        seeded[layer_id] = zoom_stop
+
+    logger.info(f"Queued tile seeds for resource {res_id}: {seeded}")
+    return {
+        'success': True,
+        'message': f'Queued tile seeds for {len(seeded)} layers of resource: {res_id}',
+        'content': seeded
+    }
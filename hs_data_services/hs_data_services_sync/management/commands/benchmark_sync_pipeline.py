@@ -0,0 +1,127 @@
+import io
+import time
+from contextlib import redirect_stdout
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from hs_data_services_sync import pipeline, utilities
+from hs_data_services_sync.benchmarks import (
+    BenchmarkEnvironment, get_copied_bytes, get_peak_rss_mb, get_percentile, time_call
+)
+from hs_data_services_sync.bulk import DEFAULT_PARALLEL_WORKERS
+
+
+SCENARIOS = ("plan", "copy", "sync", "resync", "bulk", "teardown")
+
+
+class Command(BaseCommand):
+    help = "Benchmark the sync pipeline against local fake HydroShare and GeoServer servers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resources', type=int, default=20, help="Number of synthetic resources")
+        parser.add_argument('--files', type=int, default=20, help="Files per resource")
+        parser.add_argument('--raster-size', type=int, default=1024 * 1024, help="Bytes per GeoTIFF")
+        parser.add_argument('--feature-size', type=int, default=64 * 1024, help="Bytes per shapefile part")
+        parser.add_argument('--hydroshare-latency', type=float, default=20, help="Milliseconds added to HydroShare responses")
+        parser.add_argument('--geoserver-latency', type=float, default=10, help="Milliseconds added to GeoServer responses")
+        parser.add_argument('--workers', type=int, default=DEFAULT_PARALLEL_WORKERS, help="Workers for the bulk scenarios")
+        parser.add_argument(
+            '--layer-concurrency', type=int, default=None,
+            help="Layers registered concurrently within each resource (defaults to the LAYER_CONCURRENCY setting)"
+        )
+        parser.add_argument(
+            '--scenarios', nargs='*', choices=SCENARIOS, default=list(SCENARIOS),
+            help="plan: get_database_list; copy: copy_files_to_geoserver; sync/resync: cold and warm "
+                 "update_data_services; bulk/teardown: the update and unregister management commands"
+        )
+
+    def handle(self, *args, **options):
+        environment = BenchmarkEnvironment(
+            num_resources=options['resources'],
+            files_per_resource=options['files'],
+            raster_size=options['raster_size'],
+            feature_size=options['feature_size'],
+            hydroshare_latency=options['hydroshare_latency'] / 1000,
+            geoserver_latency=options['geoserver_latency'] / 1000,
+        )
+        self.layer_concurrency = options['layer_concurrency']
+        self.workers = options['workers']
+
+        print(
+            f"{options['resources']} resources x {options['files']} files, latency "
+            f"HydroShare {options['hydroshare_latency']:g} ms / GeoServer {options['geoserver_latency']:g} ms"
+        )
+        print(
+            f"{'scenario':<10} {'ops':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} "
+            f"{'ops/s':>9} {'MB/s':>8} {'HS calls':>9} {'GS calls':>9} {'peak RSS':>9}"
+        )
+        with environment.running():
+            for scenario in SCENARIOS:
+                if scenario not in options['scenarios']:
+                    continue
+                if scenario in ("plan", "copy", "sync", "bulk"):
+                    environment.reset()
+                environment.state.reset_calls()
+                result = getattr(self, f"run_{scenario}")(environment)
+                self.print_result(scenario, environment, **result)
+
+    def print_result(self, scenario, environment, elapsed, ops, durations=None, copied_bytes=0):
+        def ms(percentile):
+            value = get_percentile(durations or [], percentile)
+            return f"{value * 1000:>9.1f}" if value is not None else f"{'-':>9}"
+
+        print(
+            f"{scenario:<10} {ops:>6} {ms(50)} {ms(90)} {ms(99)} {ms(100)} "
+            f"{ops / elapsed if elapsed else 0:>9.2f} {copied_bytes / 1048576 / elapsed if elapsed else 0:>8.1f} "
+            f"{environment.get_calls('hydroshare'):>9} {environment.get_calls('geoserver'):>9} "
+            f"{get_peak_rss_mb():>7.0f}MB"
+        )
+
+    def run_resources(self, environment, action):
+        durations = []
+        copied_bytes = get_copied_bytes()
+        start = time.perf_counter()
+        for res_id in environment.res_ids:
+            _, duration = time_call(action, res_id)
+            durations.extend(duration)
+        return {
+            "elapsed": time.perf_counter() - start, "ops": len(durations), "durations": durations,
+            "copied_bytes": get_copied_bytes() - copied_bytes
+        }
+
+    def run_plan(self, environment):
+        return self.run_resources(environment, utilities.get_database_list)
+
+    def run_copy(self, environment):
+        def copy_resource(res_id):
+            database_list = utilities.get_database_list(res_id)
+            for db in database_list['geoserver']['register']:
+                utilities.copy_files_to_geoserver(res_id, db)
+
+        return self.run_resources(environment, copy_resource)
+
+    def run_sync(self, environment):
+        return self.run_resources(
+            environment, lambda res_id: pipeline.run_update_data_services(res_id, self.layer_concurrency)
+        )
+
+    def run_resync(self, environment):
+        return self.run_sync(environment)
+
+    def run_command(self, environment, *args, **kwargs):
+        copied_bytes = get_copied_bytes()
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            call_command(*args, **kwargs)
+        return {
+            "elapsed": time.perf_counter() - start, "ops": len(environment.res_ids),
+            "copied_bytes": get_copied_bytes() - copied_bytes
+        }
+
+    def run_bulk(self, environment):
+        kwargs = {"workers": self.workers}
+        if self.layer_concurrency is not None:
+            kwargs["layer_concurrency"] = self.layer_concurrency
+        return self.run_command(environment, "update_data_services", **kwargs)
+
+    def run_teardown(self, environment):
+        return self.run_command(environment, "unregister_resource_in_geoserver")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from hs_data_services_sync.benchmarks import get_synthetic_file_list, time_call
+from hs_data_services_sync.reconcile import plan_layers
+
+
+class Command(BaseCommand):
+    help = "Benchmark GeoServer layer planning over synthetic resource file lists"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='*', type=int, default=[10, 1000, 100000], help="Files per resource")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per size; the best run is reported")
+
+    def handle(self, *args, **options):
+        print(f"{'files':>10} {'register':>10} {'unchanged':>10} {'unregister':>10} {'best (ms)':>12} {'files/s':>12}")
+        for size in options['sizes']:
+            file_list, geoserver_list = get_synthetic_file_list("benchmark", size)
+            plan, durations = time_call(plan_layers, file_list, geoserver_list, repeat=options['repeat'])
+            best = min(durations)
+            print(
+                f"{len(file_list):>10} {len(plan.register):>10} {len(plan.unchanged):>10} {len(plan.unregister):>10} "
+                f"{best * 1000:>12.2f} {len(file_list) / best if best else 0:>12.0f}"
+            )
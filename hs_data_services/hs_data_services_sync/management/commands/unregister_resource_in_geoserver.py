@@ -1,5 +1,8 @@
+import threading
 from django.core.management.base import BaseCommand
 from hs_data_services_sync import utilities
+from hs_data_services_sync.bulk import Checkpoint, DEFAULT_PARALLEL_WORKERS, print_summary, run_bulk
+from hs_data_services_sync.periodic import get_workspace_resource_ids
 
 
 class Command(BaseCommand):
@@ -7,22 +10,69 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('resource_ids', nargs='*', type=str)
+        parser.add_argument(
+            '--parallel', action='store_true',
+            help=f"Tear down resources concurrently ({DEFAULT_PARALLEL_WORKERS} workers unless --workers is set)"
+        )
+        parser.add_argument('--workers', type=int, default=None, help="Number of resources to tear down concurrently")
+        parser.add_argument(
+            '--checkpoint', type=str, default=None,
+            help="File recording finished resources; an interrupted run resumes from it"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="List the workspaces and files that would be removed, with sizes, without removing them"
+        )
+        parser.add_argument(
+            '--geoserver-workspaces', action='store_true',
+            help="Tear down every workspace in the GeoServer namespace instead of every public resource"
+        )
 
     def handle(self, *args, **options):
         resource_ids = options['resource_ids']
+        workers = options['workers'] or (DEFAULT_PARALLEL_WORKERS if options['parallel'] else 1)
+        dry_run = options['dry_run']
+        action = "Listing" if dry_run else "Unregistering"
+
         if len(resource_ids) > 0:
-            for resource_id in resource_ids:
-                print(f"Unregistering resource: {resource_id}")
-                result = utilities.unregister_geoserver_databases(resource_id)
-                print(result)
+            num_resources = len(resource_ids)
+            print(f"{action} {num_resources} resources with {workers} worker(s)")
+        elif options['geoserver_workspaces']:
+            resource_ids = sorted(get_workspace_resource_ids())
+            num_resources = len(resource_ids)
+            print(f"{action} {num_resources} GeoServer workspaces with {workers} worker(s)")
         else:
-            resources = utilities.get_list_of_public_geo_resources()
-            num_resources = len(resources)
-            print(f"Unregistering {num_resources} public resources")
-            counter = 1
-            for res_id in resources:
-                print(f"{counter}/{num_resources} - Unregistering: {res_id}")
-                result = utilities.unregister_geoserver_databases(res_id)
-                print(result)
-                counter += 1
+            resource_ids = utilities.iter_public_geo_resources()
+            num_resources = None
+            print(f"{action} public resources with {workers} worker(s)")
+
+        totals = {"workspaces": 0, "files": 0, "bytes": 0}
+        totals_lock = threading.Lock()
+
+        def teardown(res_id):
+            response = utilities.teardown_resource(res_id, dry_run=dry_run)
+            content = response.get("content") or {}
+            with totals_lock:
+                if response["success"]:
+                    totals["workspaces"] += 1 if content.get("workspace_exists") else 0
+                    totals["files"] += content.get("files", 0)
+                    totals["bytes"] += content.get("bytes", 0)
+            if dry_run:
+                print(f"{res_id}: {response['message']}")
+            return response
+
+        summary = run_bulk(
+            resource_ids,
+            teardown,
+            workers=workers,
+            # a dry run removes nothing, so it must not mark resources as finished
+            checkpoint=Checkpoint(None if dry_run else options['checkpoint']),
+            total=num_resources,
+            label="Unregistering resource" if not dry_run else "Listing resource",
+        )
+        print_summary(summary)
+        print(
+            f"{'Would remove' if dry_run else 'Removed'} {totals['workspaces']} workspaces and "
+            f"{totals['files']} files ({totals['bytes'] / 1048576:.1f} MB)"
+        )
         print("Done unregistering resources")
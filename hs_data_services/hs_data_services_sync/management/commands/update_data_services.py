@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from hs_data_services_sync import tasks
-from hs_data_services_sync.utilities import get_list_of_public_geo_resources
+from hs_data_services_sync.bulk import Checkpoint, DEFAULT_PARALLEL_WORKERS, print_summary, run_bulk
+from hs_data_services_sync.utilities import iter_public_geo_resources
 
 
 class Command(BaseCommand):
@@ -8,22 +9,57 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('resource_ids', nargs='*', type=str)
+        parser.add_argument(
+            '--parallel', action='store_true',
+            help=f"Update resources concurrently ({DEFAULT_PARALLEL_WORKERS} workers unless --workers is set)"
+        )
+        parser.add_argument('--workers', type=int, default=None, help="Number of resources to update concurrently")
+        parser.add_argument(
+            '--checkpoint', type=str, default=None,
+            help="File recording finished resources; an interrupted run resumes from it"
+        )
+        parser.add_argument(
+            '--layer-concurrency', type=int, default=None,
+            help="Layers registered concurrently within each resource (defaults to the LAYER_CONCURRENCY setting)"
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help="Queue the updates on the bulk Celery queue instead of running them in this process"
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Re-register every layer in a staging workspace and switch it live once validated (blue/green)"
+        )
 
     def handle(self, *args, **options):
         resource_ids = options['resource_ids']
+        workers = options['workers'] or (DEFAULT_PARALLEL_WORKERS if options['parallel'] else 1)
+
         if len(resource_ids) > 0:
-            for resource_id in resource_ids:
-                print(f"Updating services for resource: {resource_id}")
-                result = tasks.update_data_services_task(resource_id)
-                print(result)
+            num_resources = len(resource_ids)
+            print(f"Updating resources for {num_resources} resources with {workers} worker(s)")
         else:
-            resources = get_list_of_public_geo_resources()
-            num_resources = len(resources)
-            print(f"Updating resources for {num_resources} resources")
-            counter = 1
-            for res_id in resources:
-                print(f"{counter}/{num_resources} - Updating services for resource: {res_id}")
-                result = tasks.update_data_services_task(res_id)
-                print(result)
-                counter += 1
+            # resources are updated as discoverapi pages arrive
+            resource_ids = iter_public_geo_resources()
+            num_resources = None
+            print(f"Updating all public geospatial resources with {workers} worker(s)")
+
+        if options['enqueue']:
+            num_queued = 0
+            for res_id in resource_ids:
+                tasks.schedule_bulk_update(res_id, options['rebuild'])
+                num_queued += 1
+            print(f"Queued updates for {num_queued} resources on the bulk queue")
+            return
+
+        layer_concurrency = options['layer_concurrency']
+        summary = run_bulk(
+            resource_ids,
+            lambda res_id: tasks.sync_resource(res_id, layer_concurrency, rebuild=options['rebuild']),
+            workers=workers,
+            checkpoint=Checkpoint(options['checkpoint']),
+            total=num_resources,
+            label="Updating services for resource",
+        )
+        print_summary(summary)
         print("Done updating data services")
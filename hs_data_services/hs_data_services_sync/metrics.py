@@ -0,0 +1,180 @@
+import logging
+import os
+from urllib.parse import urlparse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, start_http_server
+)
+from prometheus_client import multiprocess
+from hs_data_services import settings
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_WORKER_METRICS_PORT = 9540
+MULTIPROCESS_DIR_VARIABLES = ("PROMETHEUS_MULTIPROC_DIR", "prometheus_multiproc_dir")
+ENDPOINT_SEGMENTS = {
+    "geoserver", "rest", "hsapi", "workspaces", "datastores", "coveragestores", "coverages", "featuretypes",
+    "styles", "layers", "wms", "gwc", "seed", "masstruncate", "resource", "file_list", "discoverapi",
+    "data", "contents",
+}
+ENDPOINT_ID = "{id}"
+ENDPOINT_EXTENSIONS = (".json", ".xml", ".sld", ".vrt")
+
+
+STAGE_SECONDS = Histogram(
+    "hs_data_services_sync_stage_seconds",
+    "Time spent in each sync stage; stages may nest",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+)
+RESOURCES_SYNCED = Counter(
+    "hs_data_services_sync_resources_total",
+    "Resource syncs by outcome",
+    ["result"],
+)
+LAYERS_PROCESSED = Counter(
+    "hs_data_services_sync_layers_total",
+    "Layer copies and registrations by layer type and outcome",
+    ["layer_type", "operation", "result"],
+)
+FILES_COPIED = Counter(
+    "hs_data_services_sync_files_total",
+    "Files handled by GeoServer file copies, by whether they were copied or unchanged",
+    ["result"],
+)
+BYTES_COPIED = Counter(
+    "hs_data_services_sync_copied_bytes_total",
+    "Bytes written into the GeoServer data directory",
+)
+HTTP_REQUESTS = Counter(
+    "hs_data_services_http_requests_total",
+    "HTTP requests to HydroShare and GeoServer by endpoint and status",
+    ["service", "method", "endpoint", "status"],
+)
+HTTP_SECONDS = Histogram(
+    "hs_data_services_http_request_seconds",
+    "Time until HydroShare and GeoServer response headers arrive, by endpoint",
+    ["service", "method", "endpoint"],
+)
+
+
+def get_multiprocess_dir():
+    for variable in MULTIPROCESS_DIR_VARIABLES:
+        if os.environ.get(variable):
+            return os.environ[variable]
+    return None
+
+
+def get_registry():
+    """
+    Gets the registry to export; in multiprocess mode it aggregates every worker process.
+    """
+
+    if get_multiprocess_dir() is None:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def export():
+    """
+    Gets the current metrics in the Prometheus text format, with its content type.
+    """
+
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
+
+
+def start_worker_server():
+    """
+    Serves /metrics for a Celery worker on the METRICS_PORT sync setting.
+
+    Called once in the main worker process; in multiprocess mode it exports
+    the metrics of all pool processes. The METRICS_PORT environment variable
+    overrides the setting, so several workers can share a host.
+    """
+
+    port = os.environ.get("METRICS_PORT") or settings.DATA_SERVICES.get("sync", {}).get(
+        'METRICS_PORT', DEFAULT_WORKER_METRICS_PORT
+    )
+    if not port:
+        return
+    logger.info(f"Serving worker metrics on port {port}")
+    start_http_server(int(port), registry=get_registry())
+
+
+def mark_process_dead(pid):
+    if get_multiprocess_dir() is not None:
+        multiprocess.mark_process_dead(pid)
+
+
+def timed(stage):
+    """
+    Records the duration of a function or block as a sync stage.
+
+    Usable as a decorator, @metrics.timed("copy_files"), or as a context
+    manager, with metrics.timed("file_list"): ...
+    """
+
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def count_layer(db, operation, result):
+    """
+    Counts a layer copy or registration from its result dict.
+    """
+
+    outcome = "success" if result and result.get("success") is not False else "failure"
+    LAYERS_PROCESSED.labels(db.get("layer_type") or "unknown", operation, outcome).inc()
+
+
+def count_copy(copy_info):
+    FILES_COPIED.labels("copied").inc(copy_info["copied"])
+    FILES_COPIED.labels("unchanged").inc(copy_info["skipped"])
+    BYTES_COPIED.inc(copy_info["bytes"])
+
+
+def get_endpoint(url):
+    """
+    Reduces a request URL to a low-cardinality endpoint label.
+
+    Workspace, store, layer, resource and file names are replaced by {id},
+    e.g. /geoserver/rest/workspaces/{id}/coveragestores/{id}/external.geotiff.
+    """
+
+    segments = []
+    for segment in urlparse(url).path.strip("/").split("/"):
+        if segment in ENDPOINT_SEGMENTS or segment.startswith("external."):
+            segments.append(segment)
+            continue
+        extension = os.path.splitext(segment)[1]
+        if extension in ENDPOINT_EXTENSIONS:
+            name, _ = os.path.splitext(segment)
+            if name in ENDPOINT_SEGMENTS:
+                segments.append(segment)
+                continue
+            if segments and segments[-1] == ENDPOINT_ID:
+                segments.pop()
+            segments.append(f"{ENDPOINT_ID}{extension}")
+        elif not segments or segments[-1] != ENDPOINT_ID:
+            segments.append(ENDPOINT_ID)
+    return "/" + "/".join(segments)
+
+
+def response_hook(service):
+    """
+    Builds a requests response hook that records call counts and latency for a service.
+    """
+
+    def record_response(response, *args, **kwargs):
+        try:
+            method = response.request.method
+            endpoint = get_endpoint(response.request.url)
+            HTTP_REQUESTS.labels(service, method, endpoint, str(response.status_code)).inc()
+            HTTP_SECONDS.labels(service, method, endpoint).observe(response.elapsed.total_seconds())
+        except Exception as e:
+            logger.debug(f"Unable to record metrics for {service} response: {e}")
+        return response
+
+    return record_response
+
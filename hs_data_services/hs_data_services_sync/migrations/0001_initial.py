@@ -0,0 +1,80 @@
+# Generated by Django 3.0.1 on 2026-10-18 11:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Workspace',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_id', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('active', models.BooleanField(default=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Store',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=1024)),
+                ('store_type', models.CharField(choices=[('datastores', 'Data store'), ('coveragestores', 'Coverage store')], max_length=32)),
+                ('file_type', models.CharField(blank=True, max_length=32)),
+                ('hs_path', models.CharField(blank=True, max_length=2048)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('workspace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stores', to='hs_data_services_sync.workspace')),
+            ],
+            options={
+                'unique_together': {('workspace', 'name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Layer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=1024)),
+                ('layer_type', models.CharField(blank=True, choices=[('GeographicRaster', 'Geographic raster'), ('GeographicFeature', 'Geographic feature')], max_length=32)),
+                ('native_name', models.CharField(blank=True, max_length=1024)),
+                ('min_x', models.FloatField(blank=True, null=True)),
+                ('min_y', models.FloatField(blank=True, null=True)),
+                ('max_x', models.FloatField(blank=True, null=True)),
+                ('max_y', models.FloatField(blank=True, null=True)),
+                ('crs', models.TextField(blank=True)),
+                ('wms_url', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='layers', to='hs_data_services_sync.store')),
+                ('workspace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='layers', to='hs_data_services_sync.workspace')),
+            ],
+            options={
+                'unique_together': {('workspace', 'name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CopiedFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hs_path', models.CharField(max_length=2048)),
+                ('size', models.BigIntegerField(blank=True, null=True)),
+                ('modified_time', models.CharField(blank=True, max_length=64)),
+                ('checksum', models.CharField(blank=True, max_length=128)),
+                ('copied', models.DateTimeField(auto_now=True)),
+                ('store', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='files', to='hs_data_services_sync.store')),
+                ('workspace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='hs_data_services_sync.workspace')),
+            ],
+            options={
+                'unique_together': {('workspace', 'hs_path')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.0.1 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hs_data_services_sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('position', models.DateTimeField(blank=True, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
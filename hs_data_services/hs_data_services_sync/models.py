@@ -1,3 +1,108 @@
 from django.db import models
 
-# Create your models here.
+
+class Workspace(models.Model):
+    """
+    GeoServer workspace state for a HydroShare resource.
+
+    A row with active=False records that the resource is known to have no
+    GeoServer workspace, so planning does not need to ask GeoServer.
+    """
+
+    resource_id = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    active = models.BooleanField(default=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Store(models.Model):
+    """
+    GeoServer data store or coverage store backed by a copied HydroShare file.
+    """
+
+    STORE_TYPES = (
+        ("datastores", "Data store"),
+        ("coveragestores", "Coverage store"),
+    )
+
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, related_name="stores")
+    name = models.CharField(max_length=1024)
+    store_type = models.CharField(max_length=32, choices=STORE_TYPES)
+    file_type = models.CharField(max_length=32, blank=True)
+    hs_path = models.CharField(max_length=2048, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("workspace", "name")
+
+    def __str__(self):
+        return f"{self.workspace.name}:{self.name}"
+
+
+class Layer(models.Model):
+    """
+    GeoServer layer published from a store.
+    """
+
+    LAYER_TYPES = (
+        ("GeographicRaster", "Geographic raster"),
+        ("GeographicFeature", "Geographic feature"),
+    )
+
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, related_name="layers")
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="layers")
+    name = models.CharField(max_length=1024)
+    layer_type = models.CharField(max_length=32, choices=LAYER_TYPES, blank=True)
+    native_name = models.CharField(max_length=1024, blank=True)
+    min_x = models.FloatField(null=True, blank=True)
+    min_y = models.FloatField(null=True, blank=True)
+    max_x = models.FloatField(null=True, blank=True)
+    max_y = models.FloatField(null=True, blank=True)
+    crs = models.TextField(blank=True)
+    wms_url = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("workspace", "name")
+
+    def __str__(self):
+        return f"{self.workspace.name}:{self.name}"
+
+
+class CopiedFile(models.Model):
+    """
+    HydroShare file copied into the GeoServer data directory, with its source fingerprint.
+    """
+
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, related_name="files")
+    store = models.ForeignKey(Store, on_delete=models.SET_NULL, null=True, blank=True, related_name="files")
+    hs_path = models.CharField(max_length=2048)
+    size = models.BigIntegerField(null=True, blank=True)
+    modified_time = models.CharField(max_length=64, blank=True)
+    checksum = models.CharField(max_length=128, blank=True)
+    copied = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("workspace", "hs_path")
+
+    def __str__(self):
+        return self.hs_path
+
+
+class SyncCursor(models.Model):
+    """
+    Position reached by a periodic job, e.g. the newest HydroShare modification time already synced.
+    """
+
+    name = models.CharField(max_length=64, unique=True)
+    position = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
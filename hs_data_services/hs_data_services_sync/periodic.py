@@ -0,0 +1,180 @@
+import logging
+from datetime import timedelta, timezone
+from django.utils import timezone as django_timezone
+from django.utils.dateparse import parse_datetime
+from hs_data_services import settings
+from hs_data_services_sync import utilities
+from hs_data_services_sync.clients import get_geoserver_client
+from hs_data_services_sync.models import SyncCursor
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_RECONCILE_OVERLAP = 600
+DEFAULT_SWEEP_MAX_SYNCS = 100
+MODIFIED_CURSOR = "discover_modified"
+
+
+def get_sync_settings():
+    return settings.DATA_SERVICES.get("sync", {})
+
+
+def parse_modified(value):
+    """
+    Parses a discoverapi modification time, or returns None if it is missing or unreadable.
+    """
+
+    if not value:
+        return None
+    try:
+        modified = parse_datetime(str(value))
+    except ValueError:
+        return None
+    if modified is not None and modified.tzinfo is None:
+        modified = modified.replace(tzinfo=timezone.utc)
+    return modified
+
+
+def get_modified_resources(since=None):
+    """
+    Gets the ids of public geospatial resources modified after since, and the newest modification time seen.
+
+    discoverapi is paged newest first and paging stops at the first resource
+    not modified after since; with since=None every resource is returned.
+    Resources without a readable modification time are always included.
+    """
+
+    rest_path = utilities.get_public_geo_resources_path(sort="modified", asc="-1")
+    res_ids = []
+    seen = set()
+    newest = None
+    page_number = 1
+    while True:
+        response_json, resources = utilities.get_discover_page(rest_path, page_number)
+        reached_since = False
+        for resource in resources:
+            modified = parse_modified(resource.get("modified"))
+            if modified is not None:
+                if since is not None and modified <= since:
+                    reached_since = True
+                    break
+                if newest is None or modified > newest:
+                    newest = modified
+            # pages shift while resources are modified, so a resource may be listed twice
+            if resource["short_id"] not in seen:
+                seen.add(resource["short_id"])
+                res_ids.append(resource["short_id"])
+        if reached_since or not resources or page_number >= response_json.get('pagecount', 0):
+            break
+        page_number += 1
+    return res_ids, newest
+
+
+def get_reconcile_start():
+    """
+    Gets the time the first reconciliation syncs from: RECONCILE_START, or now.
+    """
+
+    start = get_sync_settings().get('RECONCILE_START')
+    if start is None:
+        return django_timezone.now()
+    position = parse_modified(start)
+    if position is None:
+        raise ValueError(f"Invalid RECONCILE_START: {start}")
+    return position
+
+
+def reconcile_modified_resources(schedule):
+    """
+    Schedules a sync for every public geospatial resource modified since the last run.
+
+    The high-water mark is the newest modification time seen, stored as a
+    SyncCursor. Each run looks back RECONCILE_OVERLAP seconds before it, so
+    resources indexed late by HydroShare are not missed; syncing an unchanged
+    resource is cheap. The first run only sets the high-water mark, to
+    RECONCILE_START or the current time, and schedules nothing; resources
+    modified before it are synced with the update_data_services command.
+    """
+
+    overlap = get_sync_settings().get('RECONCILE_OVERLAP', DEFAULT_RECONCILE_OVERLAP)
+    cursor, _ = SyncCursor.objects.get_or_create(name=MODIFIED_CURSOR)
+    if cursor.position is None:
+        cursor.position = get_reconcile_start()
+        cursor.save()
+        logger.info(f"Started reconciling public geospatial resources modified after: {cursor.position}")
+        return {
+            'success': True,
+            'message': 'Set the high-water mark of the first reconciliation; scheduled no syncs',
+            'content': {
+                'resources': [],
+                'position': cursor.position.isoformat()
+            }
+        }
+    since = cursor.position - timedelta(seconds=overlap)
+
+    logger.info(f"Reconciling public geospatial resources modified since: {since}")
+    res_ids, newest = get_modified_resources(since)
+    for res_id in res_ids:
+        schedule(res_id)
+
+    if newest is not None and newest > cursor.position:
+        cursor.position = newest
+        cursor.save()
+
+    logger.info(f"Scheduled syncs for {len(res_ids)} modified resources; high-water mark: {cursor.position}")
+    return {
+        'success': True,
+        'message': f'Scheduled syncs for {len(res_ids)} modified resources',
+        'content': {
+            'resources': res_ids,
+            'position': cursor.position.isoformat()
+        }
+    }
+
+
+def get_workspace_resource_ids():
+    """
+    Gets the ids of resources that have a workspace in GeoServer.
+    """
+
+    geoserver_client = get_geoserver_client()
+    prefix = f"{geoserver_client.namespace}-"
+    response = geoserver_client.get("/workspaces.json", headers={"content-type": "application/json"})
+    response.raise_for_status()
+    # GeoServer returns an empty string instead of an empty list when there are no workspaces
+    workspaces = response.json().get("workspaces") or {}
+    names = [workspace["name"] for workspace in workspaces.get("workspace") or []]
+    return {name[len(prefix):] for name in names if name.startswith(prefix)}
+
+
+def sweep_orphaned_workspaces(schedule, max_syncs=None):
+    """
+    Schedules a sync for GeoServer workspaces with no matching public geospatial resource.
+
+    The sync itself confirms the resource is gone or private before removing
+    its workspace. At most SWEEP_MAX_SYNCS are scheduled per sweep; the rest
+    are found again by the next one.
+    """
+
+    if max_syncs is None:
+        max_syncs = get_sync_settings().get('SWEEP_MAX_SYNCS', DEFAULT_SWEEP_MAX_SYNCS)
+
+    workspace_res_ids = get_workspace_resource_ids()
+    public_res_ids = set(utilities.iter_public_geo_resources())
+    orphans = sorted(workspace_res_ids - public_res_ids)
+
+    for res_id in orphans[:max_syncs]:
+        schedule(res_id)
+
+    logger.info(
+        f"Found {len(orphans)} GeoServer workspaces without a public geospatial resource "
+        f"out of {len(workspace_res_ids)}; scheduled syncs for {min(len(orphans), max_syncs)}"
+    )
+    return {
+        'success': True,
+        'message': f'Found {len(orphans)} orphaned GeoServer workspaces',
+        'content': {
+            'orphans': orphans,
+            'scheduled': orphans[:max_syncs]
+        }
+    }
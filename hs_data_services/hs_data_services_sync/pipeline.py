@@ -0,0 +1,194 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections
+from hs_data_services import settings
+from hs_data_services_sync import batch, metrics, utilities
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_LAYER_CONCURRENCY = 4
+
+
+def get_layer_concurrency():
+    return settings.DATA_SERVICES.get("geoserver", {}).get('LAYER_CONCURRENCY', DEFAULT_LAYER_CONCURRENCY)
+
+
+class LayerRunner:
+    """
+    Runs blocking sync steps on a bounded thread pool from the event loop.
+
+    The HTTP clients, transfer backends and registry are blocking, so each
+    step runs in a worker thread. Threads close their own database
+    connections after every step.
+    """
+
+    def __init__(self, concurrency):
+        self.executor = ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="sync-layer")
+
+    @staticmethod
+    def call(func, *args):
+        try:
+            return func(*args)
+        finally:
+            connections.close_all()
+
+    def run(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, self.call, func, *args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def copy_layer(resource_id, db):
+    """
+    Copies a layer's files to GeoServer without registering it.
+
+    Returns (file transfer info, None), like register_layer when a copy fails.
+    """
+
+    file_transfer_info = utilities.copy_files_to_geoserver(resource_id, db)
+    metrics.count_layer(db, "copy", file_transfer_info)
+    return file_transfer_info, None
+
+
+async def run_layers(runner, step, resource_id, dbs, concurrency, failures):
+    """
+    Runs a layer step, e.g. register_layer, for each layer with at most concurrency layers in flight.
+
+    Like the sequential pipeline, no more layers are started once a layer's
+    files fail to copy; copy failures are appended to failures. Returns
+    (file transfer info, layer info) per layer, or None for layers not started.
+    """
+
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def run_layer(db):
+        async with semaphore:
+            if failures:
+                return None
+            result = await runner.run(step, resource_id, db)
+            if result[0]['success'] is False:
+                failures.append(result[0])
+            return result
+
+    return await asyncio.gather(*[run_layer(db) for db in dbs])
+
+
+async def register_layers_in_batch(runner, resource_id, dbs, concurrency, failures):
+    """
+    Copies layers' files concurrently, then registers the copied layers in one batch.
+
+    Copying stops as in run_layers; layers copied before a failure are still
+    registered. Layers that fail to register are unregistered.
+    """
+
+    copy_results = await run_layers(runner, copy_layer, resource_id, dbs, concurrency, failures)
+    copied = [db for db, result in zip(dbs, copy_results) if result is not None and result[0]['success'] is not False]
+    if not copied:
+        return
+
+    db_results = await runner.run(batch.register_geoserver_dbs, resource_id, copied, concurrency)
+    for db, db_info in zip(copied, db_results):
+        metrics.count_layer(db, "register", db_info)
+    await asyncio.gather(*[
+        runner.run(utilities.unregister_geoserver_db, resource_id, db)
+        for db, db_info in zip(copied, db_results) if db_info['success'] is False
+    ])
+
+
+async def update_data_services_async(resource_id, concurrency=None):
+    """
+    Update data services registration for a HydroShare resource, running layers concurrently.
+
+    Stale layers are unregistered concurrently, then changed layers are
+    updated in place and new layers' files copied and registered with at
+    most concurrency layers in flight. With BATCH_REGISTRATION the copied
+    layers are registered together through batch.register_geoserver_dbs;
+    otherwise each layer's copy/register chain runs on its own. As in the
+    sequential pipeline, once a layer's files fail to copy no more layers
+    are started, new layers are not registered if a changed layer failed,
+    and the update is reported as failed without removing an empty workspace.
+    """
+
+    if concurrency is None:
+        concurrency = get_layer_concurrency()
+
+    logger.info(f"Updating data services for resource: {resource_id} ({concurrency} concurrent layers)")
+    response = {
+        'success': False,
+        'message': None,
+        'content': None
+    }
+    runner = LayerRunner(concurrency)
+
+    try:
+        database_list = await runner.run(utilities.get_database_list, resource_id)
+
+        if database_list['access'] == 'public':
+            response['content'] = {'changed_layers': utilities.get_changed_layer_names(database_list)}
+            if database_list['geoserver']['create_workspace']:
+                await runner.run(utilities.register_geoserver_workspace, resource_id)
+
+            await asyncio.gather(*[
+                runner.run(utilities.unregister_geoserver_db, resource_id, db)
+                for db in database_list['geoserver']['unregister']
+            ])
+
+            failures = []
+            await run_layers(
+                runner, utilities.update_layer, resource_id, database_list['geoserver']['update'], concurrency, failures
+            )
+            if not failures:
+                if batch.is_enabled():
+                    await register_layers_in_batch(
+                        runner, resource_id, database_list['geoserver']['register'], concurrency, failures
+                    )
+                else:
+                    await run_layers(
+                        runner, utilities.register_layer, resource_id, database_list['geoserver']['register'],
+                        concurrency, failures
+                    )
+
+            if failures:
+                response['message'] = failures[0]['message']
+            else:
+                await runner.run(utilities.finish_update_data_services, resource_id, response)
+
+        else:
+            logging.info("Resource is private. Unregistering GeoServer databases...")
+            await runner.run(utilities.unregister_geoserver_databases, resource_id)
+            await runner.run(utilities.remove_files_for_entire_resource, resource_id)
+
+            response['success'] = True
+            response['message'] = f'Successfully unregistered GeoServer data services for resource: {resource_id}'
+
+    finally:
+        runner.shutdown()
+
+    logger.info(f"Completed attempt to update data services for resource: {resource_id}")
+    return response
+
+
+def run_update_data_services(resource_id, concurrency=None):
+    """
+    Runs the data services update for a resource from synchronous code.
+
+    With a layer concurrency of 1 and batch registration disabled, the
+    sequential per-layer pipeline is used.
+    """
+
+    if concurrency is None:
+        concurrency = get_layer_concurrency()
+    try:
+        with metrics.timed("update"):
+            if concurrency <= 1 and not batch.is_enabled():
+                response = utilities.update_data_services(resource_id)
+            else:
+                response = asyncio.run(update_data_services_async(resource_id, concurrency))
+    except Exception:
+        metrics.RESOURCES_SYNCED.labels("error").inc()
+        raise
+    metrics.RESOURCES_SYNCED.labels("success" if response.get("success") else "failure").inc()
+    return response
@@ -0,0 +1,94 @@
+import logging
+import math
+from hs_data_services import settings
+
+try:
+    import numpy as np
+    import rasterio
+    from rasterio.windows import Window
+except ImportError:
+    np = None
+    rasterio = None
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_STATISTICS_MAX_PIXELS = 4096 * 4096
+DEFAULT_STATISTICS_WINDOW_PIXELS = 1048576
+
+
+def is_available():
+    return rasterio is not None
+
+
+def to_float(value):
+    """
+    Converts a statistics value to a float, or None if it is missing or not a finite number.
+    """
+
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def normalize_statistics(statistics):
+    """
+    Gets min, max and nodata values as floats so they compare numerically.
+    """
+
+    return {key: to_float(statistics.get(key)) for key in ("min", "max", "ndv")}
+
+
+def get_band_range(data):
+    """
+    Gets the min and max of a masked band array, ignoring nodata and NaN cells.
+    """
+
+    data = np.ma.masked_invalid(data, copy=False)
+    if not data.count():
+        return None, None
+    return float(data.min()), float(data.max())
+
+
+def compute_raster_statistics(file_path, max_pixels=None, window_pixels=None):
+    """
+    Computes min, max and nodata values for the first band of a raster file.
+
+    Rasters up to max_pixels cells are read in row windows of about
+    window_pixels cells, so the full array is never held in memory. Larger
+    rasters are read once at a decimated resolution, which uses the file's
+    overviews where it has them.
+    """
+
+    if not is_available():
+        raise RuntimeError("rasterio is required to compute raster statistics")
+
+    statistics_settings = settings.DATA_SERVICES.get("geoserver", {})
+    if max_pixels is None:
+        max_pixels = statistics_settings.get('STATISTICS_MAX_PIXELS', DEFAULT_STATISTICS_MAX_PIXELS)
+    if window_pixels is None:
+        window_pixels = statistics_settings.get('STATISTICS_WINDOW_PIXELS', DEFAULT_STATISTICS_WINDOW_PIXELS)
+
+    with rasterio.open(file_path) as src:
+        width, height = src.width, src.height
+        layer_min = None
+        layer_max = None
+
+        if width * height > max_pixels:
+            factor = math.ceil(math.sqrt(width * height / max_pixels))
+            out_shape = (math.ceil(height / factor), math.ceil(width / factor))
+            logger.info(f"Sampling {file_path} at 1/{factor} resolution for statistics")
+            layer_min, layer_max = get_band_range(src.read(1, out_shape=out_shape, masked=True))
+        else:
+            rows = max(window_pixels // max(width, 1), 1)
+            for row in range(0, height, rows):
+                window = Window(0, row, width, min(rows, height - row))
+                window_min, window_max = get_band_range(src.read(1, window=window, masked=True))
+                if window_min is None:
+                    continue
+                layer_min = window_min if layer_min is None else min(layer_min, window_min)
+                layer_max = window_max if layer_max is None else max(layer_max, window_max)
+
+        return {"min": layer_min, "max": layer_max, "ndv": to_float(src.nodata)}
@@ -0,0 +1,159 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from hs_data_services_sync import transfer
+
+logger = logging.getLogger(__name__)
+
+
+SHAPEFILE_SIDECAR_EXTENSIONS = (".shx", ".dbf", ".prj")
+
+
+@dataclass
+class SyncPlan:
+    """
+    GeoServer changes needed to bring a resource's workspace in line with its files.
+
+    register, unregister, update and unchanged hold the layer dicts consumed by
+    copy_files_to_geoserver, register_geoserver_db, unregister_geoserver_db and
+    update_geoserver_db.
+    """
+
+    create_workspace: bool = False
+    register: List[dict] = field(default_factory=list)
+    unregister: List[dict] = field(default_factory=list)
+    update: List[dict] = field(default_factory=list)
+    unchanged: List[dict] = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            "create_workspace": self.create_workspace,
+            "register": self.register,
+            "unregister": self.unregister,
+            "update": self.update,
+            "unchanged": self.unchanged,
+        }
+
+
+def get_layer(result, files_by_url):
+    """
+    Builds the layer dict for a HydroShare file_list entry, or None if it is not a GeoServer layer.
+    """
+
+    logical_file_type = result.get("logical_file_type")
+    content_type = result.get("content_type")
+    url = result["url"]
+    layer_ext = url.split("/")[-1].split(".")[-1]
+
+    if logical_file_type == "GeoRasterLogicalFile" and content_type == "image/tiff" and layer_ext == "tif":
+        layer_type = "GeographicRaster"
+    elif logical_file_type == "GeoFeatureLogicalFile" and content_type == "application/x-qgis" and layer_ext == "shp":
+        layer_type = "GeographicFeature"
+    else:
+        return None
+
+    url_parts = url.split("/")
+    layer_name = '.'.join('/'.join(url_parts[7:]).split('.')[:-1])
+    layer_path = "/".join(url_parts[4:])
+    file_name = '.'.join(result['file_name'].split('.')[:-1])
+    fingerprints = {
+        layer_path: transfer.get_file_fingerprint(result)
+    }
+
+    if layer_type == "GeographicRaster":
+        return {
+            "layer_name": layer_name,
+            "layer_type": layer_type,
+            "file_name": file_name,
+            "file_type": "geotiff",
+            "hs_path": layer_path,
+            "store_type": "coveragestores",
+            "layer_group": "coverages",
+            "verification": "coverage",
+            "fingerprints": fingerprints,
+        }
+
+    # get the associated .shx, .dbf, and .prj files
+    associated_files = []
+    for ext in SHAPEFILE_SIDECAR_EXTENSIONS:
+        expected_url = url.replace(".shp", ext)
+        associated_file = files_by_url.get(expected_url)
+        logger.debug(f"Checking for associated file: {expected_url}")
+        if associated_file is not None:
+            associated_path = "/".join(expected_url.split("/")[4:])
+            associated_files.append(associated_path)
+            fingerprints[associated_path] = transfer.get_file_fingerprint(associated_file)
+
+    return {
+        "layer_name": layer_name,
+        "layer_type": layer_type,
+        "file_name": file_name,
+        "file_type": "shp",
+        "hs_path": layer_path,
+        "store_type": "datastores",
+        "layer_group": "featuretypes",
+        "verification": "featureType",
+        "associated_files": associated_files,
+        "fingerprints": fingerprints,
+    }
+
+
+def is_layer_changed(layer: dict, copied_fingerprints: Dict[str, dict]) -> bool:
+    """
+    Checks whether a registered layer's files changed since they were copied.
+
+    Layers with no copy on record are assumed unchanged, since nothing is
+    known about the files GeoServer is serving.
+    """
+
+    recorded = [copied_fingerprints.get(hs_path) for hs_path in layer["fingerprints"]]
+    if not any(recorded):
+        return False
+    return not all(
+        transfer.fingerprint_matches(entry, fingerprint)
+        for entry, fingerprint in zip(recorded, layer["fingerprints"].values())
+    )
+
+
+def plan_layers(file_list: List[dict], geoserver_list: List[Tuple[str, str]],
+                copied_fingerprints: Optional[Dict[str, dict]] = None) -> SyncPlan:
+    """
+    Reconciles a resource's file_list against the layers registered in its workspace.
+
+    Files and registered layers are indexed by URL and layer name, so
+    planning is linear in the number of files. Registered layers whose files
+    differ from copied_fingerprints, keyed by HydroShare path, are planned
+    for an in-place update.
+    """
+
+    plan = SyncPlan()
+    files_by_url: Dict[str, dict] = {result["url"]: result for result in file_list}
+    registered: Dict[str, str] = {name: store_type for name, store_type in geoserver_list}
+    planned = set()
+
+    for result in file_list:
+        layer: Optional[dict] = get_layer(result, files_by_url)
+        if layer is None:
+            continue
+        geoserver_name = layer["layer_name"].replace("/", " ")
+        planned.add(geoserver_name)
+        if geoserver_name in registered:
+            if copied_fingerprints and is_layer_changed(layer, copied_fingerprints):
+                plan.update.append(layer)
+            else:
+                plan.unchanged.append(layer)
+        else:
+            plan.register.append(layer)
+
+    for name, store_type in registered.items():
+        if name not in planned:
+            plan.unregister.append(
+                {
+                    "layer_name": name,
+                    "store_type": store_type
+                }
+            )
+
+    plan.create_workspace = not geoserver_list and bool(plan.register)
+
+    return plan
@@ -0,0 +1,283 @@
+import functools
+import logging
+import threading
+import urllib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.utils import timezone
+from hs_data_services import settings
+from hs_data_services_sync.clients import get_geoserver_client
+from hs_data_services_sync.models import CopiedFile, Layer, Store, Workspace
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_TTL = 86400
+EXPIRED = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+_write_lock = threading.RLock()
+
+
+def atomic_write(func):
+    """
+    Runs a registry write in a transaction, one thread at a time per process.
+
+    Layers are registered from several threads at once, and SQLite cannot
+    upgrade concurrent transactions to writers without failing.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _write_lock, transaction.atomic():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def is_enabled():
+    """
+    Whether planning may trust the local registry instead of asking GeoServer.
+    """
+
+    return settings.DATA_SERVICES.get("geoserver", {}).get('USE_REGISTRY', True)
+
+
+def get_registered_layers(res_id):
+    """
+    Gets (layer name, store type) pairs for a resource from the registry.
+
+    Returns None when the registry has no record for the resource, or the
+    record has not been confirmed against GeoServer for REGISTRY_TTL seconds,
+    in which case GeoServer must be asked.
+    """
+
+    ttl = settings.DATA_SERVICES.get("geoserver", {}).get('REGISTRY_TTL', DEFAULT_REGISTRY_TTL)
+    workspace = Workspace.objects.filter(resource_id=res_id).first()
+    if workspace is None:
+        return None
+    if ttl is not None and workspace.updated < timezone.now() - timedelta(seconds=ttl):
+        logger.info(f"Registry record of resource {res_id} has expired; asking GeoServer")
+        return None
+    if not workspace.active:
+        return []
+    return list(workspace.stores.values_list("name", "store_type"))
+
+
+def expire_resource(res_id):
+    """
+    Marks a resource's record as unconfirmed, e.g. after GeoServer contradicted it, so it is checked again.
+    """
+
+    # update() leaves the auto_now timestamp alone
+    Workspace.objects.filter(resource_id=res_id).update(updated=EXPIRED)
+
+
+@atomic_write
+def record_workspace(res_id, workspace_id):
+    workspace, _ = Workspace.objects.update_or_create(
+        resource_id=res_id,
+        defaults={"name": workspace_id, "active": True}
+    )
+    return workspace
+
+
+@atomic_write
+def record_geoserver_list(res_id, workspace_id, geoserver_list):
+    """
+    Seeds the registry from a GeoServer workspace listing.
+    """
+
+    workspace, _ = Workspace.objects.update_or_create(
+        resource_id=res_id,
+        defaults={"name": workspace_id, "active": bool(geoserver_list)}
+    )
+    workspace.stores.exclude(name__in=[name for name, _ in geoserver_list]).delete()
+    for name, store_type in geoserver_list:
+        store, _ = Store.objects.get_or_create(
+            workspace=workspace, name=name,
+            defaults={"store_type": store_type}
+        )
+        Layer.objects.get_or_create(workspace=workspace, name=name, defaults={"store": store})
+    return workspace
+
+
+@atomic_write
+def record_layer(res_id, workspace_id, db, bbox=None, wms_url=""):
+    """
+    Records a successfully registered layer, its store and its copied files.
+    """
+
+    name = db["layer_name"].replace("/", " ")
+    workspace = record_workspace(res_id, workspace_id)
+    store, _ = Store.objects.update_or_create(
+        workspace=workspace, name=name,
+        defaults={
+            "store_type": db["store_type"],
+            "file_type": db.get("file_type", ""),
+            "hs_path": db.get("hs_path", ""),
+        }
+    )
+    bbox = bbox or {}
+    crs = bbox.get("crs", "")
+    if isinstance(crs, dict):
+        crs = crs.get("$", "")
+    Layer.objects.update_or_create(
+        workspace=workspace, name=name,
+        defaults={
+            "store": store,
+            "layer_type": db.get("layer_type", ""),
+            "native_name": db.get("file_name", ""),
+            "min_x": bbox.get("minx"),
+            "min_y": bbox.get("miny"),
+            "max_x": bbox.get("maxx"),
+            "max_y": bbox.get("maxy"),
+            "crs": crs or "",
+            "wms_url": wms_url,
+        }
+    )
+    for hs_path, fingerprint in db.get("fingerprints", {}).items():
+        CopiedFile.objects.update_or_create(
+            workspace=workspace, hs_path=hs_path,
+            defaults={
+                "store": store,
+                "size": fingerprint.get("size"),
+                "modified_time": fingerprint.get("modified_time") or "",
+                "checksum": fingerprint.get("checksum") or "",
+            }
+        )
+    return store
+
+
+def get_copied_fingerprints(res_id):
+    """
+    Gets the source fingerprints of a resource's copied files, keyed by HydroShare path.
+    """
+
+    return {
+        hs_path: {"size": size, "modified_time": modified_time or None, "checksum": checksum or None}
+        for hs_path, size, modified_time, checksum in CopiedFile.objects.filter(
+            workspace__resource_id=res_id
+        ).values_list("hs_path", "size", "modified_time", "checksum")
+    }
+
+
+@atomic_write
+def restore_copied_fingerprints(res_id, hs_paths, fingerprints):
+    """
+    Puts back the recorded fingerprints of copied files, e.g. after recording copies that were never put in place.
+
+    Files in hs_paths without an entry in fingerprints, as returned by
+    get_copied_fingerprints, are forgotten.
+    """
+
+    for hs_path in hs_paths:
+        copied_files = CopiedFile.objects.filter(workspace__resource_id=res_id, hs_path=hs_path)
+        fingerprint = fingerprints.get(hs_path)
+        if fingerprint is None:
+            copied_files.delete()
+        else:
+            copied_files.update(
+                size=fingerprint.get("size"),
+                modified_time=fingerprint.get("modified_time") or "",
+                checksum=fingerprint.get("checksum") or "",
+            )
+
+
+def get_layer_files(res_id, layer_name):
+    """
+    Gets the HydroShare paths of the files copied for a registered layer.
+    """
+
+    return list(
+        CopiedFile.objects.filter(
+            workspace__resource_id=res_id, store__name=layer_name.replace("/", " ")
+        ).values_list("hs_path", flat=True)
+    )
+
+
+@atomic_write
+def forget_layer(res_id, layer_name):
+    name = layer_name.replace("/", " ")
+    CopiedFile.objects.filter(workspace__resource_id=res_id, store__name=name).delete()
+    Store.objects.filter(workspace__resource_id=res_id, name=name).delete()
+
+
+@atomic_write
+def forget_resource(res_id, workspace_id):
+    """
+    Records that a resource has no GeoServer workspace.
+    """
+
+    workspace, _ = Workspace.objects.update_or_create(
+        resource_id=res_id,
+        defaults={"name": workspace_id, "active": False}
+    )
+    workspace.stores.all().delete()
+    workspace.files.all().delete()
+    return workspace
+
+
+def get_service_urls(workspace_id, layer_name, store_type):
+    """
+    Gets the WFS or WCS data access URL of a layer.
+    """
+
+    geoserver_client = get_geoserver_client()
+    layer_id = urllib.parse.quote(layer_name)
+    if store_type == "datastores":
+        return {
+            "wfs_url": f"{geoserver_client.service_url(workspace_id, 'wfs')}?service=WFS&version=1.1.0&request=GetFeature"
+                       f"&typeName={workspace_id}:{layer_id}&outputFormat=application/json"
+        }
+    return {
+        "wcs_url": f"{geoserver_client.service_url(workspace_id, 'wcs')}?service=WCS&version=2.0.1&request=GetCoverage"
+                   f"&coverageId={workspace_id}__{layer_id}&format=image/geotiff"
+    }
+
+
+def get_resource_services(res_ids):
+    """
+    Gets the registration state, layers and service URLs of resources from the registry.
+
+    Resources are reported as "registered", "unregistered" (no GeoServer
+    workspace) or "unknown" (never synced), in the order given.
+    """
+
+    workspaces = {workspace.resource_id: workspace for workspace in Workspace.objects.filter(resource_id__in=res_ids)}
+    layers = defaultdict(list)
+    for layer in Layer.objects.filter(workspace__in=workspaces.values()).select_related("store").order_by("name"):
+        layers[layer.workspace_id].append(layer)
+
+    services = []
+    for res_id in res_ids:
+        workspace = workspaces.get(res_id)
+        if workspace is None:
+            services.append({"resource_id": res_id, "status": "unknown", "workspace": None, "updated": None, "layers": []})
+            continue
+
+        layer_list = []
+        for layer in layers[workspace.id] if workspace.active else []:
+            store_type = layer.store.store_type
+            bbox = None
+            if None not in (layer.min_x, layer.min_y, layer.max_x, layer.max_y):
+                bbox = {"minx": layer.min_x, "miny": layer.min_y, "maxx": layer.max_x, "maxy": layer.max_y, "crs": layer.crs or None}
+            layer_info = {
+                "layer_name": layer.name,
+                "layer_type": layer.layer_type or ("GeographicRaster" if store_type == "coveragestores" else "GeographicFeature"),
+                "store_type": store_type,
+                "hs_path": layer.store.hs_path or None,
+                "bbox": bbox,
+                "wms_url": layer.wms_url or None,
+                "updated": layer.updated.isoformat(),
+            }
+            layer_info.update(get_service_urls(workspace.name, layer.name, store_type))
+            layer_list.append(layer_info)
+
+        services.append({
+            "resource_id": res_id,
+            "status": "registered" if workspace.active else "unregistered",
+            "workspace": workspace.name if workspace.active else None,
+            "updated": workspace.updated.isoformat(),
+            "layers": layer_list,
+        })
+
+    return services
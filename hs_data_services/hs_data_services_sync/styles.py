@@ -0,0 +1,146 @@
+import json
+import logging
+import time
+import redis
+from hs_data_services import settings
+from hs_data_services_sync import coordination
+from hs_data_services_sync.clients import ProcessLocal
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_STYLE_CACHE_SIZE = 5000
+DEFAULT_STYLE_CACHE_KEY = f"{coordination.KEY_PREFIX}:style_cache"
+
+
+def get_cache_key(db):
+    """
+    Gets the style cache key for a raster layer from its source file fingerprint.
+
+    Returns None if HydroShare reported no fingerprint for the file, in which
+    case the layer's statistics are not cached.
+    """
+
+    fingerprint = db.get("fingerprints", {}).get(db["hs_path"])
+    if not fingerprint:
+        return None
+    return json.dumps([db["hs_path"], fingerprint], sort_keys=True)
+
+
+class StyleCache:
+    """
+    LRU cache of raster statistics keyed by source file fingerprint, kept in Redis.
+
+    Alongside the statistics it records which cache key each GeoServer style
+    was last published from, so an unchanged raster's existing style is reused
+    rather than posted again. Entries are hashes updated one key at a time and
+    shared by every worker process; each hash has a sorted set of last use
+    times from which the least recently used entries beyond max_entries are
+    dropped. If Redis is unreachable the cache is treated as empty.
+    """
+
+    def __init__(self, key_prefix=DEFAULT_STYLE_CACHE_KEY, max_entries=DEFAULT_STYLE_CACHE_SIZE):
+        self.statistics_key = f"{key_prefix}:statistics"
+        self.published_key = f"{key_prefix}:published"
+        self.max_entries = max_entries
+
+    @classmethod
+    def from_settings(cls):
+        geoserver_settings = settings.DATA_SERVICES.get("geoserver", {})
+        return cls(
+            geoserver_settings.get('STYLE_CACHE_KEY', DEFAULT_STYLE_CACHE_KEY),
+            geoserver_settings.get('STYLE_CACHE_SIZE', DEFAULT_STYLE_CACHE_SIZE)
+        )
+
+    def put(self, hash_key, field, value):
+        """
+        Sets one entry of a hash, marks it most recently used and drops the least recently used beyond max_entries.
+        """
+
+        lru_key = f"{hash_key}:lru"
+        connection = coordination.get_redis()
+        pipeline = connection.pipeline()
+        pipeline.hset(hash_key, field, value)
+        pipeline.zadd(lru_key, {field: time.time()})
+        pipeline.zcard(lru_key)
+        size = pipeline.execute()[-1]
+        if size > self.max_entries:
+            stale = connection.zrange(lru_key, 0, size - self.max_entries - 1)
+            if stale:
+                pipeline = connection.pipeline()
+                pipeline.hdel(hash_key, *stale)
+                pipeline.zrem(lru_key, *stale)
+                pipeline.execute()
+
+    def get(self, key):
+        if key is None:
+            return None
+        try:
+            statistics = coordination.get_redis().hget(self.statistics_key, key)
+            if statistics is None:
+                return None
+            coordination.get_redis().zadd(f"{self.statistics_key}:lru", {key: time.time()}, xx=True)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Unable to read style cache: {e}")
+            return None
+        return json.loads(statistics)
+
+    def set(self, key, statistics):
+        if key is None:
+            return
+        try:
+            self.put(self.statistics_key, key, json.dumps(statistics))
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Unable to update style cache: {e}")
+
+    def is_published(self, style_id, key):
+        if key is None:
+            return False
+        try:
+            published = coordination.get_redis().hget(self.published_key, style_id)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Unable to read style cache: {e}")
+            return False
+        return published is not None and published.decode("utf-8") == key
+
+    def set_published(self, style_id, key):
+        try:
+            if key is None:
+                pipeline = coordination.get_redis().pipeline()
+                pipeline.hdel(self.published_key, style_id)
+                pipeline.zrem(f"{self.published_key}:lru", style_id)
+                pipeline.execute()
+            else:
+                self.put(self.published_key, style_id, key)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Unable to update style cache: {e}")
+
+    def clear(self):
+        try:
+            coordination.get_redis().delete(
+                self.statistics_key, f"{self.statistics_key}:lru", self.published_key, f"{self.published_key}:lru"
+            )
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Unable to clear style cache: {e}")
+
+    def close(self):
+        pass
+
+
+_style_cache = ProcessLocal(StyleCache.from_settings)
+
+
+def get_style_cache():
+    """
+    Returns the style cache shared by this worker process.
+    """
+
+    return _style_cache.get()
+
+
+def reset_style_cache():
+    """
+    Drops the shared style cache so the next call picks up current settings.
+    """
+
+    _style_cache.reset()
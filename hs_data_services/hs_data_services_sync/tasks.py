@@ -1,16 +1,143 @@
 from celery import task
 from celery.utils.log import get_task_logger
-from hs_data_services_sync import utilities
+from hs_data_services_sync import bluegreen, coordination, gwc, periodic, pipeline, utilities
 
 logger = get_task_logger(__name__)
 
 
+def schedule_update(resource_id):
+    """
+    Enqueues a sync after the resource's quiet window, unless one is already pending.
+    """
+
+    if coordination.request_sync(resource_id):
+        quiet_window = coordination.get_sync_settings().get('QUIET_WINDOW', coordination.DEFAULT_QUIET_WINDOW)
+        update_data_services_task.apply_async((resource_id,), countdown=quiet_window)
+        return True
+    return False
+
+
+def schedule_bulk_update(resource_id, rebuild=False):
+    """
+    Enqueues a sync on the bulk queue, where it cannot hold up syncs triggered by edits.
+    """
+
+    bulk_update_data_services_task.delay(resource_id, rebuild)
+
+
+def schedule_workspace_removal(workspace_id):
+    delete_geoserver_workspace_task.delay(workspace_id)
+
+
+def schedule_tile_seed(resource_id, layer_names):
+    seed_tile_cache_task.delay(resource_id, layer_names)
+
+
+def sync_resource(resource_id, layer_concurrency=None, rebuild=False, cleanup=None):
+    """
+    Updates data services unless another worker is already syncing the resource.
+
+    Layers are registered concurrently unless layer_concurrency (or the
+    LAYER_CONCURRENCY setting) is 1. With rebuild, the resource's workspace
+    is rebuilt blue/green and the retired workspace is passed to cleanup.
+    After a successful sync that registered or updated layers, their tile
+    caches are seeded in the background, if GWC_TILE_LAYERS is set.
+    """
+
+    with coordination.resource_lock(resource_id) as acquired:
+        if not acquired:
+            return {
+                'success': False,
+                'locked': True,
+                'message': f'Data services update already running for resource: {resource_id}',
+                'content': None
+            }
+        if rebuild:
+            response = bluegreen.rebuild_data_services(resource_id, layer_concurrency, cleanup)
+        else:
+            response = pipeline.run_update_data_services(resource_id, layer_concurrency)
+
+    changed_layers = (response.get('content') or {}).get('changed_layers')
+    if response['success'] and changed_layers and gwc.is_enabled():
+        schedule_tile_seed(resource_id, changed_layers)
+    return response
+
+
 @task(name='update_data_services_task')
 def update_data_services_task(resource_id):
     """
     Update data services.
     """
 
-    response = utilities.update_data_services(resource_id)
+    remaining = coordination.get_remaining_quiet_time(resource_id)
+    if remaining > 0:
+        logger.info(f"Resource {resource_id} changed recently; postponing sync by {remaining:.0f}s")
+        update_data_services_task.apply_async((resource_id,), countdown=remaining)
+        return True
+
+    coordination.clear_pending(resource_id)
+    response = sync_resource(resource_id)
+
+    if response.get('locked'):
+        logger.info(response['message'])
+        retry_delay = coordination.get_sync_settings().get('LOCK_RETRY_DELAY', coordination.DEFAULT_LOCK_RETRY_DELAY)
+        if coordination.request_sync(resource_id, quiet_window=retry_delay):
+            update_data_services_task.apply_async((resource_id,), countdown=retry_delay)
 
     return True
+
+
+@task(name='bulk_update_data_services_task')
+def bulk_update_data_services_task(resource_id, rebuild=False):
+    """
+    Update data services as part of a bulk re-sync.
+
+    Resources already being synced by another worker are skipped. With
+    rebuild, the workspace is rebuilt blue/green and the old one removed by
+    a separate task.
+    """
+
+    response = sync_resource(resource_id, rebuild=rebuild, cleanup=schedule_workspace_removal)
+    if response.get('locked'):
+        logger.info(response['message'])
+
+    return response.get('success', False)
+
+
+@task(name='reconcile_modified_resources_task')
+def reconcile_modified_resources_task():
+    """
+    Queue bulk syncs for resources modified in HydroShare since the last run.
+    """
+
+    return periodic.reconcile_modified_resources(schedule_bulk_update)['success']
+
+
+@task(name='sweep_orphaned_workspaces_task')
+def sweep_orphaned_workspaces_task():
+    """
+    Queue bulk syncs for GeoServer workspaces with no matching public resource.
+    """
+
+    return periodic.sweep_orphaned_workspaces(schedule_bulk_update)['success']
+
+
+@task(name='delete_geoserver_workspace_task')
+def delete_geoserver_workspace_task(workspace_id):
+    """
+    Remove a GeoServer workspace retired by a blue/green rebuild.
+    """
+
+    response = bluegreen.delete_workspace(workspace_id)
+    return response.status_code in (200, 404)
+
+
+@task(name='seed_tile_cache_task')
+def seed_tile_cache_task(resource_id, layer_names):
+    """
+    Queue GeoWebCache seeds of the low zoom levels of a resource's newly registered or updated layers.
+    """
+
+    layer_ids = {layer_name.replace("/", " ") for layer_name in layer_names}
+    layer_list = [layer for layer in utilities.get_registered_layer_list(resource_id) if layer[0] in layer_ids]
+    return gwc.seed_resource_tiles(resource_id, layer_list)['success']
@@ -1,3 +1,879 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from unittest import mock
+import fakeredis
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from lxml import etree
+from rest_framework.test import APIRequestFactory
+from hs_data_services import settings
+from hs_data_services_sync import (
+    batch, bluegreen, bulk, coordination, file_lists, gwc, periodic, pipeline, raster_stats, registry, transfer, utilities
+)
+from hs_data_services_sync.benchmarks import BenchmarkEnvironment, get_synthetic_file_list
+from hs_data_services_sync.clients import reset_clients
+from hs_data_services_sync.models import SyncCursor
+from hs_data_services_sync.reconcile import is_layer_changed, plan_layers
 
-# Create your tests here.
+
+RESOURCE_ID = "abc123"
+
+
+def make_file(path, logical_file_type="", content_type="", checksum=None, size=100):
+    """
+    Builds a HydroShare file_list entry for a file in RESOURCE_ID's contents directory.
+    """
+
+    return {
+        "url": f"http://hydroshare.org/resource/{RESOURCE_ID}/data/contents/{path}",
+        "file_name": path.split("/")[-1],
+        "logical_file_type": logical_file_type,
+        "content_type": content_type,
+        "size": size,
+        "modified_time": "2024-01-01T00:00:00Z",
+        "checksum": checksum or f"checksum-{path}",
+    }
+
+
+def make_raster(path, **kwargs):
+    return make_file(path, "GeoRasterLogicalFile", "image/tiff", **kwargs)
+
+
+def make_shapefile(base_path, **kwargs):
+    return [make_file(f"{base_path}.shp", "GeoFeatureLogicalFile", "application/x-qgis", **kwargs)] + [
+        make_file(f"{base_path}{extension}", "GeoFeatureLogicalFile") for extension in (".shx", ".dbf", ".prj")
+    ]
+
+
+def hs_path(path):
+    return f"{RESOURCE_ID}/data/contents/{path}"
+
+
+def override_data_services(test_case, data_services):
+    """
+    Replaces the DATA_SERVICES setting for the rest of a test.
+    """
+
+    patcher = mock.patch.object(settings, "DATA_SERVICES", data_services)
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+
+
+def make_temp_dir(test_case):
+    path = tempfile.mkdtemp(prefix="hs_data_services_test_")
+    test_case.addCleanup(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+def plan_layers_by_scan(file_list, geoserver_list):
+    """
+    Plans layers the way get_database_list did before reconcile.plan_layers, scanning the lists for every file.
+    """
+
+    plan = {"create_workspace": not geoserver_list, "register": [], "unregister": []}
+    registered_list = []
+    for result in file_list:
+        layer_name = '.'.join('/'.join(result['url'].split('/')[7:]).split('.')[:-1])
+        layer_path = "/".join(result["url"].split("/")[4:])
+        file_name = '.'.join(result['file_name'].split('.')[:-1])
+        layer_ext = result["url"].split("/")[-1].split(".")[-1]
+        if result["logical_file_type"] == "GeoRasterLogicalFile" and result["content_type"] == "image/tiff" and layer_ext == "tif":
+            registered_list.append(layer_name.replace("/", " "))
+            if layer_name.replace("/", " ") not in [i[0] for i in geoserver_list]:
+                plan["register"].append({
+                    "layer_name": layer_name, "layer_type": "GeographicRaster", "file_name": file_name,
+                    "file_type": "geotiff", "hs_path": layer_path, "store_type": "coveragestores",
+                    "layer_group": "coverages", "verification": "coverage"
+                })
+        if result["logical_file_type"] == "GeoFeatureLogicalFile" and result["content_type"] == "application/x-qgis" and layer_ext == "shp":
+            registered_list.append(layer_name.replace("/", " "))
+            if layer_name.replace("/", " ") not in [i[0] for i in geoserver_list]:
+                associated_files = []
+                for ext in [".shx", ".dbf", ".prj"]:
+                    expected_url = result["url"].replace(".shp", ext)
+                    if expected_url in [i["url"] for i in file_list]:
+                        associated_files.append("/".join(expected_url.split("/")[4:]))
+                plan["register"].append({
+                    "layer_name": layer_name, "layer_type": "GeographicFeature", "file_name": file_name,
+                    "file_type": "shp", "hs_path": layer_path, "store_type": "datastores",
+                    "layer_group": "featuretypes", "verification": "featureType",
+                    "associated_files": associated_files
+                })
+    for layer in geoserver_list:
+        if layer[0] not in registered_list:
+            plan["unregister"].append({"layer_name": layer[0], "store_type": layer[1]})
+    if not plan["register"]:
+        plan["create_workspace"] = False
+    return plan
+
+
+class PlanLayersTestCase(SimpleTestCase):
+
+    def test_plans_match_the_scanning_planner(self):
+        for registered_fraction in (0, 0.5, 1):
+            file_list, geoserver_list = get_synthetic_file_list(RESOURCE_ID, 60, registered_fraction=registered_fraction)
+            for layer_list in (geoserver_list, [], geoserver_list[:-1]):
+                plan = plan_layers(file_list, layer_list)
+                expected = plan_layers_by_scan(file_list, layer_list)
+
+                self.assertEqual(plan.create_workspace, expected["create_workspace"])
+                self.assertEqual(
+                    [{key: value for key, value in db.items() if key != "fingerprints"} for db in plan.register],
+                    expected["register"]
+                )
+                self.assertEqual(plan.unregister, expected["unregister"])
+                self.assertEqual(
+                    len(plan.register) + len(plan.unchanged),
+                    len([db for db in file_list if db["file_name"].endswith((".tif", ".shp"))])
+                )
+
+    def test_new_layers_are_registered_in_a_new_workspace(self):
+        file_list = [make_raster("dem.tif"), make_file("readme.txt")] + make_shapefile("roads/roads")
+        plan = plan_layers(file_list, [])
+
+        self.assertTrue(plan.create_workspace)
+        self.assertEqual([layer["layer_name"] for layer in plan.register], ["dem", "roads/roads"])
+        self.assertEqual(plan.unregister, [])
+        shapefile = plan.register[1]
+        self.assertEqual(shapefile["hs_path"], hs_path("roads/roads.shp"))
+        self.assertEqual(shapefile["file_name"], "roads")
+        self.assertEqual(shapefile["store_type"], "datastores")
+        self.assertEqual(
+            shapefile["associated_files"], [hs_path("roads/roads.shx"), hs_path("roads/roads.dbf"), hs_path("roads/roads.prj")]
+        )
+        self.assertEqual(len(shapefile["fingerprints"]), 4)
+
+    def test_registered_layers_are_kept_or_unregistered(self):
+        geoserver_list = [("dem", "coveragestores"), ("aspect", "coveragestores")]
+        plan = plan_layers([make_raster("dem.tif"), make_raster("slope.tif")], geoserver_list)
+
+        self.assertFalse(plan.create_workspace)
+        self.assertEqual([layer["layer_name"] for layer in plan.register], ["slope"])
+        self.assertEqual([layer["layer_name"] for layer in plan.unchanged], ["dem"])
+        self.assertEqual(plan.unregister, [{"layer_name": "aspect", "store_type": "coveragestores"}])
+
+    def test_layer_names_match_geoserver_names(self):
+        plan = plan_layers([make_raster("rasters/dem.tif")], [("rasters dem", "coveragestores")])
+
+        self.assertEqual([layer["layer_name"] for layer in plan.unchanged], ["rasters/dem"])
+        self.assertEqual(plan.unregister, [])
+
+
+class LayerChangesTestCase(SimpleTestCase):
+
+    def test_registered_layers_with_changed_files_are_updated(self):
+        file_list = [make_raster("dem.tif"), make_raster("slope.tif", checksum="new")]
+        copied_fingerprints = {
+            hs_path("dem.tif"): {"size": 100, "checksum": "checksum-dem.tif"},
+            hs_path("slope.tif"): {"size": 100, "checksum": "old"},
+        }
+        geoserver_list = [("dem", "coveragestores"), ("slope", "coveragestores")]
+        plan = plan_layers(file_list, geoserver_list, copied_fingerprints)
+
+        self.assertEqual(plan.register, [])
+        self.assertEqual([layer["layer_name"] for layer in plan.unchanged], ["dem"])
+        self.assertEqual([layer["layer_name"] for layer in plan.update], ["slope"])
+
+    def test_changed_sidecar_updates_shapefile(self):
+        layer = plan_layers(make_shapefile("roads"), []).register[0]
+        copied_fingerprints = {path: dict(fingerprint) for path, fingerprint in layer["fingerprints"].items()}
+        self.assertFalse(is_layer_changed(layer, copied_fingerprints))
+
+        copied_fingerprints[hs_path("roads.dbf")]["checksum"] = "old"
+        self.assertTrue(is_layer_changed(layer, copied_fingerprints))
+
+    def test_new_sidecar_updates_shapefile(self):
+        layer = plan_layers(make_shapefile("roads"), []).register[0]
+        copied_fingerprints = {path: dict(fingerprint) for path, fingerprint in layer["fingerprints"].items()}
+        del copied_fingerprints[hs_path("roads.prj")]
+
+        self.assertTrue(is_layer_changed(layer, copied_fingerprints))
+
+    def test_layer_without_copy_record_is_unchanged(self):
+        layer = plan_layers([make_raster("dem.tif")], []).register[0]
+
+        self.assertFalse(is_layer_changed(layer, {}))
+        self.assertFalse(is_layer_changed(layer, {hs_path("other.tif"): {"checksum": "x"}}))
+
+
+class FingerprintMatchesTestCase(SimpleTestCase):
+
+    def test_checksums_decide_when_both_are_known(self):
+        entry = {"checksum": "a", "size": 1, "modified_time": "t"}
+
+        self.assertTrue(transfer.fingerprint_matches(entry, {"checksum": "a", "size": 2}))
+        self.assertFalse(transfer.fingerprint_matches(entry, {"checksum": "b", "size": 1, "modified_time": "t"}))
+
+    def test_size_and_modified_time_are_used_without_checksums(self):
+        entry = {"size": 1, "modified_time": "t"}
+
+        self.assertTrue(transfer.fingerprint_matches(entry, {"size": 1, "modified_time": "t"}))
+        self.assertFalse(transfer.fingerprint_matches(entry, {"size": 2, "modified_time": "t"}))
+        self.assertFalse(transfer.fingerprint_matches(entry, {"size": 1, "modified_time": "u"}))
+
+    def test_incomplete_fingerprints_never_match(self):
+        self.assertFalse(transfer.fingerprint_matches(None, {"checksum": "a"}))
+        self.assertFalse(transfer.fingerprint_matches({"checksum": "a"}, {}))
+        self.assertFalse(transfer.fingerprint_matches({"size": 1}, {"size": 1}))
+
+
+class IncrementalCopyTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.source_root = make_temp_dir(self)
+        self.geoserver_directory = make_temp_dir(self)
+        override_data_services(self, {"geoserver": {"TRANSFER_BACKEND": "copy", "TRANSFER_SOURCE_ROOT": self.source_root}})
+        self.write_source("dem.tif", b"raster")
+
+    def write_source(self, path, content):
+        file_path = os.path.join(self.source_root, hs_path(path))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(content)
+
+    def copy(self, checksum):
+        return transfer.copy_files(
+            RESOURCE_ID, [hs_path("dem.tif")], self.geoserver_directory, {hs_path("dem.tif"): {"checksum": checksum}}
+        )
+
+    def read_copy(self):
+        with open(os.path.join(self.geoserver_directory, hs_path("dem.tif")), "rb") as f:
+            return f.read()
+
+    def test_unchanged_files_are_skipped(self):
+        self.assertEqual(self.copy("a"), {"copied": 1, "skipped": 0, "bytes": 6})
+
+        with mock.patch.object(transfer.LocalCopyBackend, "fetch") as fetch:
+            self.assertEqual(self.copy("a"), {"copied": 0, "skipped": 1, "bytes": 0})
+        fetch.assert_not_called()
+
+    def test_changed_files_are_copied_again(self):
+        self.copy("a")
+        self.write_source("dem.tif", b"new raster")
+
+        self.assertEqual(self.copy("b"), {"copied": 1, "skipped": 0, "bytes": 10})
+        self.assertEqual(self.read_copy(), b"new raster")
+        self.assertEqual(transfer.Manifest(self.geoserver_directory, RESOURCE_ID).load()[hs_path("dem.tif")]["checksum"], "b")
+
+    def test_missing_copies_are_replaced(self):
+        self.copy("a")
+        os.remove(os.path.join(self.geoserver_directory, hs_path("dem.tif")))
+
+        self.assertEqual(self.copy("a")["copied"], 1)
+        self.assertEqual(self.read_copy(), b"raster")
+
+
+class CoordinationTestCase(SimpleTestCase):
+
+    def setUp(self):
+        override_data_services(self, {**settings.DATA_SERVICES, "sync": {"QUIET_WINDOW": 30, "MAX_DELAY": 100}})
+        patcher = mock.patch.object(coordination, "get_redis", return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(coordination, "time")
+        self.time = patcher.start().time
+        self.addCleanup(patcher.stop)
+        self.time.return_value = 1000
+
+    def test_requests_are_coalesced_until_cleared(self):
+        self.assertTrue(coordination.request_sync(RESOURCE_ID))
+        self.assertFalse(coordination.request_sync(RESOURCE_ID))
+
+        coordination.clear_pending(RESOURCE_ID)
+        self.assertEqual(coordination.get_remaining_quiet_time(RESOURCE_ID), 0)
+        self.assertTrue(coordination.request_sync(RESOURCE_ID))
+
+    def test_requests_push_the_quiet_window_back(self):
+        coordination.request_sync(RESOURCE_ID)
+        self.time.return_value = 1020
+        coordination.request_sync(RESOURCE_ID)
+
+        self.assertEqual(coordination.get_remaining_quiet_time(RESOURCE_ID), 30)
+
+    def test_quiet_window_is_capped_at_max_delay(self):
+        for now in range(1000, 1100, 20):
+            self.time.return_value = now
+            coordination.request_sync(RESOURCE_ID)
+
+        self.assertEqual(coordination.get_remaining_quiet_time(RESOURCE_ID), 20)
+
+    def test_resource_lock_is_exclusive(self):
+        with coordination.resource_lock(RESOURCE_ID) as acquired:
+            self.assertTrue(acquired)
+            with coordination.resource_lock(RESOURCE_ID) as acquired_again:
+                self.assertFalse(acquired_again)
+
+        with coordination.resource_lock(RESOURCE_ID) as acquired:
+            self.assertTrue(acquired)
+
+
+class BulkTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.checkpoint = bulk.Checkpoint(os.path.join(make_temp_dir(self), "checkpoint.jsonl"))
+        self.output = []
+
+    def run_bulk(self, action, resource_ids=("r1", "r2", "r3", "r4")):
+        return bulk.run_bulk(
+            iter(resource_ids), action, workers=2, checkpoint=self.checkpoint, out=self.output.append
+        )
+
+    @staticmethod
+    def sync(res_id):
+        if res_id == "r3":
+            raise ValueError("unreachable")
+        return {"success": res_id != "r2", "message": f"synced {res_id}"}
+
+    def test_results_are_summarised_and_recorded(self):
+        summary = self.run_bulk(self.sync)
+
+        self.assertEqual(sorted(result["resource_id"] for result in summary["succeeded"]), ["r1", "r4"])
+        failed = {result["resource_id"]: result["message"] for result in summary["failed"]}
+        self.assertEqual(failed, {"r2": "synced r2", "r3": "ValueError: unreachable"})
+        self.assertEqual(self.checkpoint.completed(), {"r1", "r4"})
+
+    def test_resumed_runs_retry_only_unfinished_resources(self):
+        self.run_bulk(self.sync)
+        with open(self.checkpoint.path, "a") as f:
+            f.write("not json\n")
+        synced = []
+
+        summary = self.run_bulk(lambda res_id: synced.append(res_id) or {"success": True}, ("r1", "r2", "r3", "r4", "r5"))
+
+        self.assertEqual(sorted(synced), ["r2", "r3", "r5"])
+        self.assertEqual(summary["skipped"], ["r1", "r4"])
+        self.assertEqual(self.checkpoint.completed(), {"r1", "r2", "r3", "r4", "r5"})
+        self.assertIn(f"Resuming from checkpoint {self.checkpoint.path}: skipping 2 completed resources", self.output)
+
+
+def make_discover_page(*resources):
+    return {"pagecount": 3}, [
+        {"short_id": short_id, "modified": modified} for short_id, modified in resources
+    ]
+
+
+class ModifiedResourcesTestCase(TestCase):
+
+    def setUp(self):
+        self.pages = {
+            1: make_discover_page(("r5", "2024-01-05T00:00:00Z"), ("r4", "2024-01-04T00:00:00Z")),
+            2: make_discover_page(("r4", "2024-01-04T00:00:00Z"), ("r3", None), ("r2", "2024-01-02T00:00:00Z")),
+            3: make_discover_page(("r1", "2024-01-01T00:00:00Z")),
+        }
+        patcher = mock.patch(
+            "hs_data_services_sync.utilities.get_discover_page",
+            side_effect=lambda rest_path, page_number: self.pages[page_number]
+        )
+        self.get_discover_page = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_paging_stops_at_the_high_water_mark(self):
+        res_ids, newest = periodic.get_modified_resources(datetime(2024, 1, 3, tzinfo=timezone.utc))
+
+        self.assertEqual(res_ids, ["r5", "r4", "r3"])
+        self.assertEqual(newest, datetime(2024, 1, 5, tzinfo=timezone.utc))
+        self.assertEqual(self.get_discover_page.call_count, 2)
+
+    def test_every_resource_is_returned_without_a_high_water_mark(self):
+        res_ids, _ = periodic.get_modified_resources()
+
+        self.assertEqual(res_ids, ["r5", "r4", "r3", "r2", "r1"])
+        self.assertEqual(self.get_discover_page.call_count, 3)
+
+    def test_reconcile_advances_the_cursor_with_overlap(self):
+        SyncCursor.objects.create(name=periodic.MODIFIED_CURSOR, position=datetime(2024, 1, 4, 0, 5, tzinfo=timezone.utc))
+        scheduled = []
+        with mock.patch.object(settings, "DATA_SERVICES", {"sync": {"RECONCILE_OVERLAP": 600}}):
+            response = periodic.reconcile_modified_resources(scheduled.append)
+
+        # the overlap reaches back past r4's modification time
+        self.assertEqual(scheduled, ["r5", "r4", "r3"])
+        self.assertEqual(
+            SyncCursor.objects.get(name=periodic.MODIFIED_CURSOR).position, datetime(2024, 1, 5, tzinfo=timezone.utc)
+        )
+        self.assertEqual(response["content"]["resources"], ["r5", "r4", "r3"])
+
+    def test_first_reconciliation_only_sets_the_high_water_mark(self):
+        scheduled = []
+        start = datetime(2024, 1, 3, 12, tzinfo=timezone.utc)
+        with mock.patch("django.utils.timezone.now", return_value=start):
+            response = periodic.reconcile_modified_resources(scheduled.append)
+
+        self.assertEqual(scheduled, [])
+        self.get_discover_page.assert_not_called()
+        self.assertEqual(SyncCursor.objects.get(name=periodic.MODIFIED_CURSOR).position, start)
+        self.assertEqual(response["content"]["resources"], [])
+
+        periodic.reconcile_modified_resources(scheduled.append)
+        self.assertEqual(scheduled, ["r5", "r4", "r3"])
+
+    def test_first_reconciliation_starts_at_the_configured_time(self):
+        scheduled = []
+        with mock.patch.object(settings, "DATA_SERVICES", {"sync": {"RECONCILE_START": "2024-01-04T00:05:00Z", "RECONCILE_OVERLAP": 600}}):
+            periodic.reconcile_modified_resources(scheduled.append)
+            periodic.reconcile_modified_resources(scheduled.append)
+
+        self.assertEqual(scheduled, ["r5", "r4", "r3"])
+
+
+class TileCountTestCase(SimpleTestCase):
+    world = {"minx": -180.0, "miny": -90.0, "maxx": 180.0, "maxy": 90.0}
+    point = {"minx": -111.5, "miny": 40.5, "maxx": -111.5, "maxy": 40.5}
+
+    def test_world_tiles(self):
+        self.assertEqual(gwc.count_tiles(self.world, 2, "EPSG:900913"), 1 + 4 + 16)
+        self.assertEqual(gwc.count_tiles(self.world, 2, "EPSG:4326"), 2 + 8 + 32)
+
+    def test_small_extent_needs_one_tile_per_zoom_level(self):
+        self.assertEqual(gwc.count_tiles(self.point, 10, "EPSG:900913"), 11)
+
+    def test_seed_zoom_stop_fits_the_budget(self):
+        self.assertEqual(gwc.get_seed_zoom_stop(self.world, 8, 21, "EPSG:900913"), 2)
+        self.assertEqual(gwc.get_seed_zoom_stop(self.world, 8, 20, "EPSG:900913"), 1)
+        self.assertEqual(gwc.get_seed_zoom_stop(self.point, 8, 1000, "EPSG:900913"), 8)
+        self.assertIsNone(gwc.get_seed_zoom_stop(self.world, 8, 0, "EPSG:900913"))
+
+
+class TileLayerSettingsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        override_data_services(self, {"geoserver": {"GWC_GRIDSET": "EPSG:4326", "GWC_FORMAT": "image/jpeg"}})
+
+    def test_missing_gridset_and_format_are_added(self):
+        tile_layer = etree.fromstring(
+            "<GeoServerLayer><mimeFormats><string>image/png</string></mimeFormats>"
+            "<gridSubsets><gridSubset><gridSetName>EPSG:900913</gridSetName></gridSubset></gridSubsets></GeoServerLayer>"
+        )
+        tile_layer = etree.fromstring(gwc.add_missing_settings(tile_layer))
+
+        self.assertEqual(tile_layer.xpath("mimeFormats/string/text()"), ["image/png", "image/jpeg"])
+        self.assertEqual(tile_layer.xpath("gridSubsets/gridSubset/gridSetName/text()"), ["EPSG:900913", "EPSG:4326"])
+
+    def test_configured_tile_layer_is_left_alone(self):
+        tile_layer = etree.fromstring(gwc.build_tile_layer("HS-abc123:dem"))
+
+        self.assertIsNone(gwc.add_missing_settings(tile_layer))
+
+
+class GetServicesTestCase(TestCase):
+
+    def setUp(self):
+        override_data_services(self, {"geoserver": {"URL": "http://geoserver.test/geoserver/rest", "NAMESPACE": "HS"}})
+        reset_clients()
+        self.addCleanup(reset_clients)
+
+        registry.record_layer(RESOURCE_ID, f"HS-{RESOURCE_ID}", {
+            "layer_name": "dem",
+            "layer_type": "GeographicRaster",
+            "file_name": "dem",
+            "file_type": "geotiff",
+            "hs_path": hs_path("dem.tif"),
+            "store_type": "coveragestores",
+        }, bbox={"minx": 0, "miny": 0, "maxx": 1, "maxy": 1, "crs": "EPSG:4326"})
+
+    def get(self, resource_ids=f"{RESOURCE_ID},unknown", **headers):
+        # imported here because views imports the Celery tasks
+        from hs_data_services_sync.views import GetServices
+
+        request = APIRequestFactory().get("/his/services/verify/", {"resource_id": resource_ids}, **headers)
+        return GetServices.as_view()(request)
+
+    def test_resource_ids_are_required(self):
+        self.assertEqual(self.get(resource_ids="").status_code, 400)
+
+    def test_services_are_reported_from_the_registry(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ETag", response)
+        services = response.data["content"]
+        self.assertEqual([service["status"] for service in services], ["registered", "unknown"])
+        self.assertEqual(services[0]["layers"][0]["layer_name"], "dem")
+        self.assertIn("wcs_url", services[0]["layers"][0])
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.get()["ETag"]
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=f'W/{etag}, "other"').status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_etag_changes_with_the_registry(self):
+        etag = self.get()["ETag"]
+        registry.forget_layer(RESOURCE_ID, "dem")
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class ConcurrentUpdateTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.database_list = {
+            "access": "public",
+            "geoserver": {
+                "create_workspace": False,
+                "register": [{"layer_name": f"layer_{index}"} for index in range(3)],
+                "unregister": [],
+                "update": [],
+                "unchanged": [],
+            },
+        }
+        for name, kwargs in {
+            "get_database_list": {"return_value": self.database_list},
+            "finish_update_data_services": {},
+        }.items():
+            patcher = mock.patch.object(utilities, name, **kwargs)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(pipeline.batch, "is_enabled", return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def fail_layer(layer_name):
+        def run_layer(resource_id, db):
+            if db["layer_name"] == layer_name:
+                return {"success": False, "message": f"Unable to copy {layer_name}"}, None
+            return {"success": True}, {"success": True}
+        return run_layer
+
+    def test_copy_failure_stops_remaining_layers(self):
+        with mock.patch.object(utilities, "register_layer", side_effect=self.fail_layer("layer_1")) as register_layer:
+            response = asyncio.run(pipeline.update_data_services_async(RESOURCE_ID, concurrency=1))
+
+        self.assertFalse(response["success"])
+        self.assertEqual(response["message"], "Unable to copy layer_1")
+        self.assertEqual([call.args[1]["layer_name"] for call in register_layer.call_args_list], ["layer_0", "layer_1"])
+        self.finish_update_data_services.assert_not_called()
+
+    def test_failed_update_skips_new_layers(self):
+        self.database_list["geoserver"]["update"] = [{"layer_name": "changed"}]
+
+        with mock.patch.object(utilities, "update_layer", side_effect=self.fail_layer("changed")), \
+                mock.patch.object(utilities, "register_layer", side_effect=self.fail_layer(None)) as register_layer:
+            response = pipeline.run_update_data_services(RESOURCE_ID, concurrency=2)
+
+        self.assertFalse(response["success"])
+        register_layer.assert_not_called()
+        self.finish_update_data_services.assert_not_called()
+
+
+class FakeServersTestCase(TransactionTestCase):
+    """
+    Syncs a small synthetic resource against the benchmark's fake HydroShare and GeoServer, with Redis faked in memory.
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(coordination, "get_redis", return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.environment = BenchmarkEnvironment(num_resources=1, files_per_resource=4, raster_size=1024, feature_size=256)
+        running = self.environment.running()
+        running.__enter__()
+        self.addCleanup(running.__exit__, None, None, None)
+        self.res_id = self.environment.res_ids[0]
+        self.workspace_id = f"HS-{self.res_id}"
+
+    def get_file(self, file_name):
+        return next(
+            file_info for file_info in self.environment.state.resources[self.res_id] if file_info["file_name"] == file_name
+        )
+
+    def add_raster(self, path):
+        file_info = dict(self.get_file("raster_0.tif"))
+        file_info.update({
+            "file_name": path.split("/")[-1],
+            "url": f"{file_info['url'].split('/data/contents/')[0]}/data/contents/{path}",
+            "checksum": f"checksum-{path}",
+        })
+        self.environment.state.resources[self.res_id].append(file_info)
+
+    def change_file(self, file_name):
+        file_info = self.get_file(file_name)
+        file_info["size"] += 1
+        file_info["checksum"] = f"{file_info['checksum']}-changed"
+
+    def get_plan(self):
+        plan = utilities.get_database_list(self.res_id)["geoserver"]
+        return {key: sorted(db["layer_name"] for db in plan[key]) for key in ("register", "unregister", "update", "unchanged")}
+
+    def get_stores(self, workspace_id=None):
+        workspace = self.environment.state.workspaces.get(workspace_id or self.workspace_id)
+        return sorted(workspace["stores"]) if workspace is not None else None
+
+
+class AtomicPathTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = make_temp_dir(self)
+        self.file_path = os.path.join(self.directory, "data", "raster.tif")
+
+    def test_file_is_renamed_into_place_with_the_default_mode(self):
+        with transfer.atomic_path(self.file_path) as temp_path:
+            self.assertFalse(os.path.exists(self.file_path))
+            with open(temp_path, "wb") as f:
+                f.write(b"raster")
+
+        self.assertEqual(os.listdir(os.path.dirname(self.file_path)), ["raster.tif"])
+        self.assertEqual(os.stat(self.file_path).st_mode & 0o777, 0o666 & ~transfer.UMASK)
+
+    def test_temporary_file_is_removed_on_error(self):
+        with self.assertRaises(ValueError):
+            with transfer.atomic_path(self.file_path) as temp_path:
+                with open(temp_path, "wb") as f:
+                    f.write(b"partial")
+                raise ValueError("interrupted")
+
+        self.assertEqual(os.listdir(os.path.dirname(self.file_path)), [])
+
+
+class HttpTransferTestCase(FakeServersTestCase):
+
+    def setUp(self):
+        super().setUp()
+        file_info = self.get_file("raster_0.tif")
+        self.size = file_info["size"]
+        self.hs_path = "/".join(file_info["url"].split("/")[4:])
+        self.file_path = os.path.join(self.environment.data_dir, self.hs_path)
+
+    def copy_file(self):
+        return transfer.copy_files(self.res_id, [self.hs_path], self.environment.data_dir)
+
+    def test_files_are_streamed_to_disk(self):
+        settings.DATA_SERVICES["geoserver"]["TRANSFER_CHUNK_SIZE"] = 100
+
+        self.assertEqual(self.copy_file(), {"copied": 1, "skipped": 0, "bytes": self.size})
+        self.assertEqual(os.path.getsize(self.file_path), self.size)
+        entry = transfer.Manifest(self.environment.data_dir, self.res_id).load()[self.hs_path]
+        self.assertEqual(entry["etag"], f'"{self.get_file("raster_0.tif")["checksum"]}"')
+
+    def test_unchanged_files_are_not_downloaded_again(self):
+        self.copy_file()
+
+        self.assertEqual(self.copy_file(), {"copied": 0, "skipped": 1, "bytes": 0})
+
+        self.change_file("raster_0.tif")
+        self.assertEqual(self.copy_file(), {"copied": 1, "skipped": 0, "bytes": self.size + 1})
+
+    def test_missing_files_are_downloaded_without_validators(self):
+        self.copy_file()
+        os.remove(self.file_path)
+
+        self.assertEqual(self.copy_file(), {"copied": 1, "skipped": 0, "bytes": self.size})
+
+
+class FileListCacheTestCase(FakeServersTestCase):
+
+    def get_file_list(self):
+        with mock.patch.object(file_lists, "save", wraps=file_lists.save) as save:
+            status_code, results = file_lists.get_file_list(self.res_id)
+        self.assertEqual(status_code, 200)
+        return results, save.called
+
+    def test_unchanged_file_lists_are_revalidated(self):
+        results, saved = self.get_file_list()
+        self.assertTrue(saved)
+        self.assertEqual(file_lists.load(self.res_id)[0]["results"], results)
+
+        cached_results, saved = self.get_file_list()
+        self.assertFalse(saved)
+        self.assertEqual(cached_results, results)
+
+    def test_changed_file_lists_are_downloaded_again(self):
+        self.get_file_list()
+        self.change_file("raster_0.tif")
+
+        results, saved = self.get_file_list()
+
+        self.assertTrue(saved)
+        self.assertIn(self.get_file("raster_0.tif"), results)
+
+    def test_failed_requests_forget_the_cached_file_list(self):
+        self.get_file_list()
+        del self.environment.state.resources[self.res_id]
+
+        self.assertEqual(file_lists.get_file_list(self.res_id), (404, None))
+        self.assertEqual(file_lists.load(self.res_id), [])
+
+
+class BatchRegistrationTestCase(FakeServersTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dbs = utilities.get_database_list(self.res_id)["geoserver"]["register"]
+        utilities.register_geoserver_workspace(self.res_id)
+        for db in self.dbs:
+            self.assertTrue(utilities.copy_files_to_geoserver(self.res_id, db)["success"])
+
+    def register_layers(self):
+        with mock.patch.object(utilities, "register_geoserver_db", wraps=utilities.register_geoserver_db) as register:
+            results = batch.register_geoserver_dbs(self.res_id, self.dbs)
+        self.assertEqual([result["success"] for result in results], [True] * len(self.dbs))
+        self.assertEqual(self.get_stores(), sorted(db["layer_name"].replace("/", " ") for db in self.dbs))
+        return [call.args[1]["layer_name"] for call in register.call_args_list]
+
+    def test_layers_are_registered_without_fallback(self):
+        self.assertEqual(self.register_layers(), [])
+
+    def test_unconfigured_layers_fall_back_to_per_layer_registration(self):
+        failing = self.dbs[0]["layer_name"]
+        configure = batch.configure_geoserver_db
+
+        with mock.patch.object(
+            batch, "configure_geoserver_db",
+            side_effect=lambda res_id, db: db["layer_name"] != failing and configure(res_id, db)
+        ):
+            self.assertEqual(self.register_layers(), [failing])
+
+    def test_every_layer_falls_back_without_capabilities(self):
+        with mock.patch.object(batch, "get_layer_bounding_boxes", return_value=None):
+            self.assertEqual(self.register_layers(), [db["layer_name"] for db in self.dbs])
+
+
+class TeardownTestCase(FakeServersTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(pipeline.run_update_data_services(self.res_id)["success"])
+        self.resource_dir = os.path.join(self.environment.data_dir, self.res_id)
+        self.checkpoint = os.path.join(make_temp_dir(self), "checkpoint.jsonl")
+
+    def teardown(self, *args):
+        with redirect_stdout(io.StringIO()) as output:
+            call_command("unregister_resource_in_geoserver", self.res_id, "--checkpoint", self.checkpoint, *args)
+        return output.getvalue()
+
+    def test_dry_run_removes_nothing(self):
+        output = self.teardown("--dry-run")
+
+        self.assertIn(f"{self.res_id}: Would remove workspace {self.workspace_id}", output)
+        self.assertIn("Would remove 1 workspaces", output)
+        self.assertIsNotNone(self.get_stores())
+        self.assertTrue(os.path.isdir(self.resource_dir))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_workspaces_and_files_are_removed_once(self):
+        output = self.teardown()
+
+        self.assertIn("Removed 1 workspaces", output)
+        self.assertIsNone(self.get_stores())
+        self.assertFalse(os.path.exists(self.resource_dir))
+
+        output = self.teardown()
+        self.assertIn("skipping 1 completed resources", output)
+        self.assertIn("Removed 0 workspaces and 0 files", output)
+
+
+class RebuildTestCase(FakeServersTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(pipeline.run_update_data_services(self.res_id)["success"])
+        self.layers = self.get_stores()
+
+    def fail_renames(self, *renames):
+        """
+        Makes renames from one workspace to another, given as (workspace id, new workspace id) pairs, fail.
+        """
+
+        rename_workspace = bluegreen.rename_workspace
+        for patcher in (
+            mock.patch.object(bluegreen, "SWITCH_RETRY_DELAY", 0),
+            mock.patch.object(
+                bluegreen, "rename_workspace",
+                side_effect=lambda workspace_id, new_workspace_id: (
+                    (workspace_id, new_workspace_id) not in renames and rename_workspace(workspace_id, new_workspace_id)
+                )
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_rebuild_switches_the_staging_workspace_live(self):
+        self.change_file("raster_0.tif")
+        retired = []
+
+        response = bluegreen.rebuild_data_services(self.res_id, cleanup=retired.append)
+
+        self.assertTrue(response["success"])
+        self.assertEqual(sorted(response["content"]["changed_layers"]), sorted(layer.replace(" ", "/") for layer in self.layers))
+        self.assertEqual(self.get_stores(), self.layers)
+        self.assertEqual(retired, [bluegreen.get_retired_workspace_id(self.res_id)])
+        self.assertIsNone(self.get_stores(bluegreen.get_staging_workspace_id(self.res_id)))
+        self.assertFalse(os.path.exists(bluegreen.get_staging_directory(self.res_id)))
+        self.assertEqual(self.get_plan()["update"], [])
+
+    def test_failed_switch_restores_the_live_workspace(self):
+        self.change_file("raster_0.tif")
+
+        self.fail_renames((bluegreen.get_staging_workspace_id(self.res_id), self.workspace_id))
+        response = bluegreen.rebuild_data_services(self.res_id)
+
+        self.assertFalse(response["success"])
+        self.assertTrue(response["message"].startswith("Unable to switch"))
+        self.assertEqual(self.get_stores(), self.layers)
+        self.assertIsNone(self.get_stores(bluegreen.get_staging_workspace_id(self.res_id)))
+        self.assertEqual(self.get_plan()["update"], ["rasters/0/raster_0"])
+
+    def test_failed_restore_keeps_both_workspaces(self):
+        self.change_file("raster_0.tif")
+        staging_id = bluegreen.get_staging_workspace_id(self.res_id)
+        retired_id = bluegreen.get_retired_workspace_id(self.res_id)
+
+        self.fail_renames((staging_id, self.workspace_id), (retired_id, self.workspace_id))
+        response = bluegreen.rebuild_data_services(self.res_id)
+
+        self.assertFalse(response["success"])
+        self.assertIn("or restore it", response["message"])
+        self.assertIsNone(self.get_stores())
+        self.assertEqual(self.get_stores(staging_id), self.layers)
+        self.assertEqual(self.get_stores(retired_id), self.layers)
+        self.assertIsNone(registry.get_registered_layers(self.res_id))
+
+    def test_aborted_rebuild_keeps_changed_layers_planned_for_update(self):
+        self.change_file("raster_0.tif")
+        self.assertEqual(self.get_plan()["update"], ["rasters/0/raster_0"])
+
+        with mock.patch.object(bluegreen, "get_invalid_layers", return_value=["rasters/0/raster_0"]):
+            response = bluegreen.rebuild_data_services(self.res_id)
+
+        self.assertFalse(response["success"])
+        self.assertEqual(self.get_stores(), self.layers)
+        self.assertIsNone(self.get_stores(bluegreen.get_staging_workspace_id(self.res_id)))
+        self.assertEqual(self.get_plan()["update"], ["rasters/0/raster_0"])
+
+    def test_new_layers_that_fail_are_skipped(self):
+        self.add_raster("rasters/dem.v2.tif")
+        self.change_file("raster_0.tif")
+
+        response = bluegreen.rebuild_data_services(self.res_id)
+
+        self.assertTrue(response["success"])
+        self.assertEqual(response["content"]["skipped_layers"], ["rasters/dem.v2"])
+        self.assertNotIn("rasters/dem.v2", response["content"]["changed_layers"])
+        self.assertEqual(self.get_stores(), self.layers)
+        plan = self.get_plan()
+        self.assertEqual(plan["register"], ["rasters/dem.v2"])
+        self.assertEqual(plan["update"], [])
+
+    def test_staged_rasters_are_styled_from_their_staged_files(self):
+        self.change_file("raster_0.tif")
+        statistics = {"min": 0, "max": 1, "ndv": None}
+
+        with mock.patch.object(utilities, "get_raster_statistics", side_effect=Exception("no .vrt")), \
+                mock.patch.object(raster_stats, "is_available", return_value=True), \
+                mock.patch.object(raster_stats, "compute_raster_statistics", return_value=statistics) as compute:
+            self.assertTrue(bluegreen.rebuild_data_services(self.res_id)["success"])
+
+        staged_path = os.path.join(
+            bluegreen.get_staging_directory(self.res_id), self.res_id, "data/contents/rasters/0/raster_0.tif"
+        )
+        self.assertIn(mock.call(staged_path), compute.call_args_list)
@@ -0,0 +1,110 @@
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+import redis
+from hs_data_services import settings
+from hs_data_services_sync import coordination, metrics
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_WRITE_LEASE = 600
+DEFAULT_POLL_INTERVAL = 0.05
+WRITERS_KEY = f"{coordination.KEY_PREFIX}:geoserver:writers"
+RATE_KEY = f"{coordination.KEY_PREFIX}:geoserver:rate"
+
+
+class WriteLimiter:
+    """
+    Caps the rate and concurrency of GeoServer-mutating requests across all workers.
+
+    Writers hold a slot in a Redis sorted set while their request runs, and
+    each request is counted against a one-second window. Slots expire after
+    lease seconds, so a crashed worker cannot hold one forever. If Redis is
+    unreachable requests are not limited.
+    """
+
+    def __init__(self, max_per_second=None, max_concurrent=None, lease=DEFAULT_WRITE_LEASE,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        self.max_per_second = max_per_second
+        self.max_concurrent = max_concurrent
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+    @classmethod
+    def from_settings(cls):
+        geoserver_settings = settings.DATA_SERVICES.get("geoserver", {})
+        return cls(
+            max_per_second=geoserver_settings.get('MAX_WRITES_PER_SECOND'),
+            max_concurrent=geoserver_settings.get('MAX_CONCURRENT_WRITES'),
+            lease=geoserver_settings.get('READ_TIMEOUT', DEFAULT_WRITE_LEASE) * 2,
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.max_per_second or self.max_concurrent)
+
+    def acquire_slot(self):
+        """
+        Waits for a writer slot and returns its token.
+        """
+
+        token = uuid.uuid4().hex
+        connection = coordination.get_redis()
+        while True:
+            now = time.time()
+            pipeline = connection.pipeline()
+            pipeline.zremrangebyscore(WRITERS_KEY, 0, now - self.lease)
+            pipeline.zadd(WRITERS_KEY, {token: now})
+            pipeline.zrank(WRITERS_KEY, token)
+            pipeline.expire(WRITERS_KEY, int(self.lease))
+            _, _, rank, _ = pipeline.execute()
+            if rank < self.max_concurrent:
+                return token
+            connection.zrem(WRITERS_KEY, token)
+            time.sleep(self.poll_interval)
+
+    def release_slot(self, token):
+        try:
+            coordination.get_redis().zrem(WRITERS_KEY, token)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Unable to release GeoServer write slot: {e}")
+
+    def wait_for_rate(self):
+        """
+        Waits until the current one-second window has room for another write.
+        """
+
+        connection = coordination.get_redis()
+        while True:
+            window = int(time.time())
+            pipeline = connection.pipeline()
+            pipeline.incr(f"{RATE_KEY}:{window}")
+            pipeline.expire(f"{RATE_KEY}:{window}", 2)
+            count, _ = pipeline.execute()
+            if count <= self.max_per_second:
+                return
+            time.sleep(max(window + 1 - time.time(), 0))
+
+    @contextmanager
+    def slot(self):
+        """
+        Holds a GeoServer write slot for the duration of a request.
+        """
+
+        token = None
+        try:
+            with metrics.timed("geoserver_write_wait"):
+                if self.max_concurrent:
+                    token = self.acquire_slot()
+                if self.max_per_second:
+                    self.wait_for_rate()
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Unable to throttle GeoServer write, continuing without a limit: {e}")
+
+        try:
+            yield
+        finally:
+            if token is not None:
+                self.release_slot(token)
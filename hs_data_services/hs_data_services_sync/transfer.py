@@ -0,0 +1,422 @@
+import errno
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from hs_data_services import settings
+from hs_data_services_sync.clients import get_hydroshare_client
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TRANSFER_WORKERS = 4
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_IN_FLIGHT_BYTES = 2 * 1024 * 1024 * 1024
+MANIFEST_NAME = ".hs_data_services_manifest.json"
+FINGERPRINT_FIELDS = ("size", "modified_time", "checksum")
+DEFAULT_TRANSFER_BACKEND = "http"
+# Linux ioctl that clones a file's extents (reflink) on btrfs, xfs and similar filesystems
+FICLONE = 0x40049409
+
+
+def get_umask():
+    # the umask can only be read by setting it; do so once, before any worker threads start
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+UMASK = get_umask()
+
+
+class ByteBudget:
+    """
+    Caps the number of bytes a worker process transfers at once.
+
+    A transfer larger than the whole budget is admitted on its own, so it
+    waits for the budget to drain instead of blocking forever.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            while self.in_flight > 0 and self.in_flight + size > self.limit:
+                self.condition.wait()
+            self.in_flight += size
+
+    def release(self, size):
+        with self.condition:
+            self.in_flight -= size
+            self.condition.notify_all()
+
+
+_budget = None
+_budget_pid = None
+_budget_lock = threading.Lock()
+
+
+def get_transfer_budget():
+    """
+    Returns the in-flight byte budget shared by this worker process.
+    """
+
+    global _budget, _budget_pid
+
+    pid = os.getpid()
+    if _budget is None or _budget_pid != pid:
+        with _budget_lock:
+            if _budget is None or _budget_pid != pid:
+                _budget = ByteBudget(
+                    settings.DATA_SERVICES.get("geoserver", {}).get(
+                        'TRANSFER_MAX_IN_FLIGHT_BYTES', DEFAULT_MAX_IN_FLIGHT_BYTES
+                    )
+                )
+                _budget_pid = pid
+    return _budget
+
+
+@contextmanager
+def atomic_path(file_path):
+    """
+    Yields a temporary path next to file_path that is renamed into place on success.
+
+    The file is given the mode open() would have created it with, since
+    GeoServer runs as a different user; hardlinks keep their source's mode.
+    """
+
+    dir_path = os.path.dirname(file_path)
+    logger.info(f"Checking for directory: {dir_path}")
+    os.makedirs(dir_path, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=dir_path, prefix=f".{os.path.basename(file_path)}.", suffix=".part")
+    os.close(fd)
+    try:
+        yield temp_path
+        if os.stat(temp_path).st_nlink == 1:
+            os.chmod(temp_path, 0o666 & ~UMASK)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_atomically(file_path, chunks):
+    """
+    Writes chunks to a temporary file next to file_path, then renames it into place.
+    """
+
+    written = 0
+    with atomic_path(file_path) as temp_path:
+        with open(temp_path, 'wb') as f:
+            for chunk in chunks:
+                if chunk:
+                    f.write(chunk)
+                    written += len(chunk)
+    return written
+
+
+def get_file_fingerprint(file_info):
+    """
+    Gets the source fingerprint of a HydroShare file_list entry.
+    """
+
+    return {field: file_info.get(field) for field in FINGERPRINT_FIELDS if file_info.get(field) is not None}
+
+
+def fingerprint_matches(entry, fingerprint):
+    """
+    Checks whether a manifest entry was copied from a source with the given fingerprint.
+    """
+
+    if not entry or not fingerprint:
+        return False
+    if fingerprint.get("checksum") and entry.get("checksum"):
+        return fingerprint["checksum"] == entry["checksum"]
+    if fingerprint.get("size") is None or fingerprint.get("modified_time") is None:
+        return False
+    return fingerprint["size"] == entry.get("size") and fingerprint["modified_time"] == entry.get("modified_time")
+
+
+class Manifest:
+    """
+    Record of the files copied into the GeoServer data directory for one resource.
+
+    Entries are keyed by HydroShare path and hold the source fingerprint from
+    the file_list and the ETag/Last-Modified headers of the last download.
+    The manifest lives inside the resource directory, so it is removed along
+    with the resource's files.
+    """
+
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, geoserver_directory, res_id):
+        self.path = os.path.join(geoserver_directory, res_id, MANIFEST_NAME)
+        with Manifest._locks_lock:
+            self.lock = Manifest._locks.setdefault(self.path, threading.Lock())
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning(f"Ignoring unreadable manifest: {self.path}")
+            return {}
+
+    def update(self, entries=None, removed=()):
+        with self.lock:
+            manifest = self.load()
+            manifest.update(entries or {})
+            for hs_path in removed:
+                manifest.pop(hs_path, None)
+            write_atomically(self.path, [json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8')])
+
+
+def download_file(hs_path, file_path, entry=None):
+    """
+    Streams a HydroShare resource file to file_path without buffering it in memory.
+
+    If entry holds validators from a previous download and the file is still
+    on disk, the request is made conditional. Returns (bytes written, new
+    manifest entry), or (0, None) if HydroShare reports the file unchanged.
+    """
+
+    geoserver_settings = settings.DATA_SERVICES.get("geoserver", {})
+    chunk_size = geoserver_settings.get('TRANSFER_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    budget = get_transfer_budget()
+    hydroshare_client = get_hydroshare_client()
+
+    headers = {}
+    if entry and os.path.exists(file_path):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    logger.info(f"Getting file from: {hydroshare_client.url}/resource/{hs_path}")
+    with hydroshare_client.get(f"/resource/{hs_path}", headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            logger.info(f"File unchanged since last copy: {hs_path}")
+            return 0, None
+        response.raise_for_status()
+        reserved = min(int(response.headers.get("content-length") or chunk_size), budget.limit)
+        budget.acquire(reserved)
+        try:
+            logger.info(f"Writing file to GeoServer: {file_path}")
+            written = write_atomically(file_path, response.iter_content(chunk_size=chunk_size))
+        finally:
+            budget.release(reserved)
+        new_entry = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+        }
+
+    return written, new_entry
+
+
+class HttpBackend:
+    """
+    Downloads files from HydroShare over HTTP.
+    """
+
+    name = "http"
+
+    def fetch(self, hs_path, file_path, entry=None):
+        return download_file(hs_path, file_path, entry)
+
+
+class LocalCopyBackend:
+    """
+    Copies files from a local mount of the HydroShare data volume.
+
+    TRANSFER_SOURCE_ROOT must contain the resource directories, so that
+    {TRANSFER_SOURCE_ROOT}/{hs_path} is the source file.
+    """
+
+    name = "copy"
+
+    def __init__(self, source_root):
+        if not source_root:
+            raise ValueError(f"TRANSFER_SOURCE_ROOT is required for the '{self.name}' transfer backend")
+        self.source_root = source_root
+
+    def fetch(self, hs_path, file_path, entry=None):
+        source_path = os.path.join(self.source_root, hs_path)
+        stat = os.stat(source_path)
+        new_entry = {
+            "source_size": stat.st_size,
+            "source_mtime": stat.st_mtime_ns,
+        }
+        if (
+            entry and os.path.exists(file_path) and
+            entry.get("source_size") == new_entry["source_size"] and
+            entry.get("source_mtime") == new_entry["source_mtime"]
+        ):
+            logger.info(f"File unchanged since last copy: {hs_path}")
+            return 0, None
+
+        budget = get_transfer_budget()
+        reserved = min(stat.st_size, budget.limit)
+        budget.acquire(reserved)
+        try:
+            logger.info(f"Placing file in GeoServer directory: {source_path} -> {file_path}")
+            with atomic_path(file_path) as temp_path:
+                self.place(source_path, temp_path)
+        finally:
+            budget.release(reserved)
+
+        return stat.st_size, new_entry
+
+    def place(self, source_path, temp_path):
+        shutil.copyfile(source_path, temp_path)
+
+
+class HardlinkBackend(LocalCopyBackend):
+    """
+    Hardlinks files from a local mount of the HydroShare data volume.
+
+    Falls back to a copy when the source is on a different filesystem.
+    """
+
+    name = "hardlink"
+
+    def place(self, source_path, temp_path):
+        os.remove(temp_path)
+        try:
+            os.link(source_path, temp_path)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            logger.info(f"Unable to hardlink {source_path} ({e}), copying instead")
+            shutil.copyfile(source_path, temp_path)
+
+
+class ReflinkBackend(LocalCopyBackend):
+    """
+    Clones files from a local mount of the HydroShare data volume.
+
+    Uses a reflink where the filesystem supports it, then copy_file_range
+    (an in-kernel copy), then a plain copy.
+    """
+
+    name = "reflink"
+
+    def place(self, source_path, temp_path):
+        with open(source_path, 'rb') as source, open(temp_path, 'wb') as destination:
+            try:
+                fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+                return
+            except OSError:
+                pass
+            if hasattr(os, "copy_file_range"):
+                try:
+                    remaining = os.fstat(source.fileno()).st_size
+                    while remaining > 0:
+                        copied = os.copy_file_range(source.fileno(), destination.fileno(), remaining)
+                        if copied == 0:
+                            break
+                        remaining -= copied
+                    if remaining == 0:
+                        return
+                except OSError:
+                    pass
+            source.seek(0)
+            destination.seek(0)
+            destination.truncate()
+            shutil.copyfileobj(source, destination)
+
+
+TRANSFER_BACKENDS = {
+    backend.name: backend for backend in (HttpBackend, LocalCopyBackend, HardlinkBackend, ReflinkBackend)
+}
+
+
+def get_transfer_backend():
+    """
+    Builds the transfer backend selected by the TRANSFER_BACKEND setting.
+    """
+
+    geoserver_settings = settings.DATA_SERVICES.get("geoserver", {})
+    backend_name = geoserver_settings.get('TRANSFER_BACKEND', DEFAULT_TRANSFER_BACKEND)
+    if backend_name not in TRANSFER_BACKENDS:
+        raise ValueError(f"Unknown transfer backend: {backend_name}")
+    if backend_name == HttpBackend.name:
+        return HttpBackend()
+    return TRANSFER_BACKENDS[backend_name](geoserver_settings.get('TRANSFER_SOURCE_ROOT'))
+
+
+def copy_files(res_id, hs_paths, geoserver_directory, fingerprints=None):
+    """
+    Copies HydroShare resource files into the GeoServer data directory concurrently.
+
+    Files are placed by the configured transfer backend. Files whose source
+    fingerprint matches the manifest, or that the backend reports unchanged,
+    are skipped. Returns a dict with the number of files
+    copied and skipped and the bytes written. The first failure is raised
+    after the remaining transfers finish.
+    """
+
+    workers = settings.DATA_SERVICES.get("geoserver", {}).get('TRANSFER_WORKERS', DEFAULT_TRANSFER_WORKERS)
+    fingerprints = fingerprints or {}
+    backend = get_transfer_backend()
+    manifest = Manifest(geoserver_directory, res_id)
+    entries = manifest.load()
+
+    def copy_file(hs_path):
+        file_path = os.path.join(geoserver_directory, hs_path)
+        entry = entries.get(hs_path)
+        fingerprint = fingerprints.get(hs_path, {})
+        if fingerprint_matches(entry, fingerprint) and os.path.exists(file_path):
+            logger.info(f"Skipping unchanged file: {hs_path}")
+            return hs_path, None, None
+        try:
+            written, new_entry = backend.fetch(hs_path, file_path, entry)
+        except Exception as e:
+            message = f"Error getting/writing file: {e}"
+            logger.error(message)
+            raise Exception(message)
+        if new_entry is None:
+            # the source is unchanged since the last copy
+            written, new_entry = None, dict(entry)
+        new_entry.update(fingerprint)
+        return hs_path, written, new_entry
+
+    results = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(min(workers, len(hs_paths)), 1)) as executor:
+        futures = [executor.submit(copy_file, hs_path) for hs_path in hs_paths]
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            errors.append(e)
+
+    manifest.update({hs_path: new_entry for hs_path, _, new_entry in results if new_entry is not None})
+    if errors:
+        raise errors[0]
+
+    copied = [written for _, written, _ in results if written is not None]
+    return {
+        "copied": len(copied),
+        "skipped": len(results) - len(copied),
+        "bytes": sum(copied),
+    }
+
+
+def forget_files(res_id, hs_paths, geoserver_directory):
+    """
+    Removes files from the resource's manifest.
+    """
+
+    Manifest(geoserver_directory, res_id).update(removed=hs_paths)
@@ -1,15 +1,20 @@
 import logging
-import requests
 import json
 import os
 import shutil
 import urllib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from hs_data_services import settings
+from hs_data_services_sync import cog, features, file_lists, gwc, metrics, raster_stats, reconcile, registry, styles, transfer
+from hs_data_services_sync.clients import get_geoserver_client, get_hydroshare_client
 from lxml import etree
 
 logger = logging.getLogger(__name__)
 
 
+DEFAULT_DISCOVER_WORKERS = 4
+
+
 def update_data_services(resource_id):
     """
     Update data services registration for a HydroShare resource.
@@ -27,28 +32,26 @@ def update_data_services(resource_id):
     )
 
     if database_list['access'] == 'public':
+        response['content'] = {'changed_layers': get_changed_layer_names(database_list)}
         if database_list['geoserver']['create_workspace']:
             register_geoserver_workspace(resource_id)
 
         for db in database_list['geoserver']['unregister']:
             unregister_geoserver_db(resource_id, db)
 
-        for db in database_list['geoserver']['register']:
-            # copy geoserver files from HS to GeoServer
-            file_transfer_info = copy_files_to_geoserver(resource_id, db)
+        for db in database_list['geoserver']['update']:
+            file_transfer_info, db_info = update_layer(resource_id, db)
             if file_transfer_info['success'] is False:
                 response['message'] = file_transfer_info['message']
                 return response
-            db_info = register_geoserver_db(resource_id, db)
-            if db_info['success'] is False:
-                unregister_geoserver_db(resource_id, db)
 
-        geoserver_list = get_geoserver_list(resource_id)
+        for db in database_list['geoserver']['register']:
+            file_transfer_info, db_info = register_layer(resource_id, db)
+            if file_transfer_info['success'] is False:
+                response['message'] = file_transfer_info['message']
+                return response
 
-        if not geoserver_list:
-            logging.info("No GeoServer layers found. Unregistering workspace...")
-            unregister_geoserver_databases(resource_id)
-            remove_files_for_entire_resource(resource_id)
+        finish_update_data_services(resource_id, response)
 
     else:
         logging.info("Resource is private. Unregistering GeoServer databases...")
@@ -62,6 +65,77 @@ def update_data_services(resource_id):
     return response
 
 
+def get_changed_layer_names(database_list):
+    """
+    Gets the names of the layers a sync registers or updates.
+    """
+
+    geoserver = database_list['geoserver']
+    return [db['layer_name'] for db in geoserver['register'] + geoserver['update']]
+
+
+def register_layer(resource_id, db):
+    """
+    Copies a layer's files to GeoServer and registers it, removing it again if registration fails.
+
+    Returns (file transfer info, registration info); registration info is
+    None if the copy failed.
+    """
+
+    # copy geoserver files from HS to GeoServer
+    file_transfer_info = copy_files_to_geoserver(resource_id, db)
+    metrics.count_layer(db, "copy", file_transfer_info)
+    if file_transfer_info['success'] is False:
+        return file_transfer_info, None
+    db_info = register_geoserver_db(resource_id, db)
+    metrics.count_layer(db, "register", db_info)
+    if db_info['success'] is False:
+        unregister_geoserver_db(resource_id, db)
+    return file_transfer_info, db_info
+
+
+def update_layer(resource_id, db):
+    """
+    Copies a changed layer's files to GeoServer and updates its store and layer in place.
+
+    If the in-place update fails the layer is registered again from scratch,
+    and removed if that fails too. Returns (file transfer info, update info);
+    update info is None if the copy failed.
+    """
+
+    file_transfer_info = copy_files_to_geoserver(resource_id, db)
+    metrics.count_layer(db, "copy", file_transfer_info)
+    if file_transfer_info['success'] is False:
+        return file_transfer_info, None
+    db_info = update_geoserver_db(resource_id, db)
+    metrics.count_layer(db, "update", db_info)
+    if db_info['success'] is False:
+        logger.info(f"Unable to update layer {db['layer_name']} in place, registering it again")
+        remove_geoserver_store(resource_id, db)
+        db_info = register_geoserver_db(resource_id, db)
+        metrics.count_layer(db, "register", db_info)
+        if db_info['success'] is False:
+            unregister_geoserver_db(resource_id, db)
+    return file_transfer_info, db_info
+
+
+def finish_update_data_services(resource_id, response):
+    """
+    Removes the workspace if no layers remain, then marks the update successful.
+    """
+
+    geoserver_list = get_registered_layer_list(resource_id)
+
+    if not geoserver_list:
+        logging.info("No GeoServer layers found. Unregistering workspace...")
+        unregister_geoserver_databases(resource_id)
+        remove_files_for_entire_resource(resource_id)
+
+    response['success'] = True
+    response['message'] = f'Successfully updated GeoServer data services for resource: {resource_id}'
+    return response
+
+
 def get_database_list(res_id):
     """
     Gets a list of HydroShare databases on which web services can be published.
@@ -73,101 +147,54 @@ def get_database_list(res_id):
         "geoserver": {
             "create_workspace": True,
             "register": [],
-            "unregister": []
+            "unregister": [],
+            "update": [],
+            "unchanged": []
         }
     }
 
-    hydroshare_url = settings.HYDROSHARE_URL
-    rest_url = f"{hydroshare_url}/resource/{res_id}/file_list/"
-    response = requests.get(rest_url)
+    status_code, file_list = file_lists.get_file_list(res_id)
 
-    if response.status_code != 200:
+    if status_code != 200:
         db_list["access"] = "private"
         return db_list
     else:
         db_list["access"] = "public"
 
-    file_list = json.loads(response.content.decode('utf-8'))["results"]
-
-    geoserver_list = get_geoserver_list(res_id)
-    if geoserver_list:
-        db_list["geoserver"]["create_workspace"] = False
-
-    registered_list = []
-
-    for result in file_list:
-        if (
-               result["logical_file_type"] == "GeoRasterLogicalFile" and 
-               result["content_type"] == "image/tiff" and 
-               settings.DATA_SERVICES.get("geoserver", {}).get('URL') is not None
-           ) or (
-               result["logical_file_type"] == "GeoFeatureLogicalFile" and 
-               result["content_type"] == "application/x-qgis" and
-               settings.DATA_SERVICES.get("geoserver", {}).get('URL') is not None
-           ):
-
-            layer_name = '.'.join('/'.join(result['url'].split('/')[7:]).split('.')[:-1])
-            layer_path = "/".join(result["url"].split("/")[4:])
-            file_name = '.'.join(result['file_name'].split('.')[:-1])
-            layer_ext = result["url"].split("/")[-1].split(".")[-1]
-            layer_type = result["content_type"]
-            if result["content_type"] == "image/tiff" and layer_ext == "tif":
-                registered_list.append(layer_name.replace("/", " "))
-                if layer_name.replace("/", " ") not in [i[0] for i in geoserver_list]:
-                    db_list["geoserver"]["register"].append(
-                        {
-                            "layer_name": layer_name,
-                            "layer_type": "GeographicRaster",
-                            "file_name": file_name,
-                            "file_type": "geotiff",
-                            "hs_path": layer_path,
-                            "store_type": "coveragestores",
-                            "layer_group": "coverages",
-                            "verification": "coverage"
-                        }
-                    )
-            if result["content_type"] == "application/x-qgis" and layer_ext == "shp":
-                registered_list.append(layer_name.replace("/", " "))
-                if layer_name.replace("/", " ") not in [i[0] for i in geoserver_list]:
-                    # get the associated .shx, .dbf, and .prj files
-                    extensions = [".shx", ".dbf", ".prj"]
-                    associated_files = []
-                    for ext in extensions:
-                        expected_url = result["url"].replace(".shp", ext)
-                        logger.info(f"Checking for associated file: {expected_url}")
-                        if expected_url in [i["url"] for i in file_list]:
-                            associated_files.append(
-                                "/".join(expected_url.split("/")[4:])
-                            )
-                    db_list["geoserver"]["register"].append(
-                        {
-                            "layer_name": layer_name,
-                            "layer_type": "GeographicFeature",
-                            "file_name": file_name,
-                            "file_type": "shp",
-                            "hs_path": layer_path,
-                            "store_type": "datastores",
-                            "layer_group": "featuretypes",
-                            "verification": "featureType",
-                            "associated_files": associated_files,
-                        }
-                    )
-
-    for layer in geoserver_list:
-        if layer[0] not in registered_list:
-            db_list["geoserver"]["unregister"].append(
-                {
-                    "layer_name": layer[0],
-                    "store_type": layer[1]
-                }
-            )
-
-    if not db_list["geoserver"]["register"]:
-        db_list["geoserver"]["create_workspace"] = False
+    if settings.DATA_SERVICES.get("geoserver", {}).get('URL') is None:
+        file_list = []
+
+    geoserver_list = get_registered_layer_list(res_id)
+    copied_fingerprints = registry.get_copied_fingerprints(res_id)
+    with metrics.timed("plan"):
+        plan = reconcile.plan_layers(file_list, geoserver_list, copied_fingerprints)
+    logger.info(
+        f"Planned GeoServer layers for resource {res_id}: {len(plan.register)} to register, "
+        f"{len(plan.unregister)} to unregister, {len(plan.update)} to update, {len(plan.unchanged)} unchanged"
+    )
+    db_list["geoserver"] = plan.to_dict()
 
     return db_list
 
 
+def get_registered_layer_list(res_id):
+    """
+    Gets the layers registered for a resource, from the local registry when it has a record.
+
+    Falls back to asking GeoServer, and seeds the registry with the answer.
+    """
+
+    if registry.is_enabled():
+        layer_list = registry.get_registered_layers(res_id)
+        if layer_list is not None:
+            return layer_list
+
+    layer_list = get_geoserver_list(res_id)
+    registry.record_geoserver_list(res_id, get_geoserver_client().workspace_id(res_id), layer_list)
+    return layer_list
+
+
+@metrics.timed("geoserver_list")
 def get_geoserver_list(res_id):
     """
     Gets a list of data stores and coverages from a GeoServer workspace.
@@ -176,25 +203,15 @@ def get_geoserver_list(res_id):
     logger.info(f"Getting geoserver list for resource: {res_id}")
     layer_list = []
 
-    geoserver_namespace = settings.DATA_SERVICES.get("geoserver", {}).get('NAMESPACE')
-    geoserver_url = settings.DATA_SERVICES.get("geoserver", {}).get('URL')
-    geoserver_user = settings.DATA_SERVICES.get("geoserver", {}).get('USER')
-    geoserver_pass = settings.DATA_SERVICES.get("geoserver", {}).get('PASSWORD')
-    geoserver_auth = requests.auth.HTTPBasicAuth(
-        geoserver_user, 
-        geoserver_pass
-    )
-
-    workspace_id = f"{geoserver_namespace}-{res_id}"
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(res_id)
 
     headers = {
         "content-type": "application/json"
     }
 
-    ds_rest_url = f"{geoserver_url}/workspaces/{workspace_id}/datastores.json"
-    cv_rest_url = f"{geoserver_url}/workspaces/{workspace_id}/coverages.json"
-    ds_response = requests.get(ds_rest_url, auth=geoserver_auth, headers=headers)
-    cv_response = requests.get(cv_rest_url, auth=geoserver_auth, headers=headers)
+    ds_response = geoserver_client.get(f"/workspaces/{workspace_id}/datastores.json", headers=headers)
+    cv_response = geoserver_client.get(f"/workspaces/{workspace_id}/coverages.json", headers=headers)
 
     if ds_response.status_code == 200:
         ds_response_content = json.loads(ds_response.content)
@@ -211,52 +228,43 @@ def get_geoserver_list(res_id):
     return layer_list
 
 
+@metrics.timed("register_workspace")
 def register_geoserver_workspace(res_id):
     """
     Add GeoServer workspace.
+
+    An existing workspace is kept as it is; GeoServer rejects the duplicate
+    with a 409 and layers are then added to it. The registry records the
+    workspace only once GeoServer has it.
     """
 
     logger.info(f"Registering GeoServer workspace for resource: {res_id}")
-    geoserver_namespace = settings.DATA_SERVICES.get("geoserver", {}).get('NAMESPACE')
-    geoserver_url = settings.DATA_SERVICES.get("geoserver", {}).get('URL')
-    geoserver_user = settings.DATA_SERVICES.get("geoserver", {}).get('USER')
-    geoserver_pass = settings.DATA_SERVICES.get("geoserver", {}).get('PASSWORD')
-    geoserver_auth = requests.auth.HTTPBasicAuth(
-        geoserver_user, 
-        geoserver_pass
-    )
-
-    workspace_id = f"{geoserver_namespace}-{res_id}"
-
-    unregister_geoserver_databases(res_id)
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(res_id)
 
     headers = {
         "content-type": "application/json"
     }
 
     data = json.dumps({"workspace": {"name": workspace_id}})
-    rest_url = f"{geoserver_url}/workspaces"
-    response = requests.post(rest_url, headers=headers, data=data, auth=geoserver_auth)
+    response = geoserver_client.post("/workspaces", headers=headers, data=data)
+    if response.status_code in (201, 409):
+        registry.record_workspace(res_id, workspace_id)
+    else:
+        logger.error(f"Error registering GeoServer workspace {workspace_id}: {response}")
 
     return workspace_id
 
 
+@metrics.timed("unregister_workspace")
 def unregister_geoserver_databases(res_id):
     """
     Removes a GeoServer network and associated databases.
     """
 
     logger.info(f"Unregistering GeoServer databases for resource: {res_id}")
-    geoserver_namespace = settings.DATA_SERVICES.get("geoserver", {}).get('NAMESPACE')
-    geoserver_url = settings.DATA_SERVICES.get("geoserver", {}).get('URL')
-    geoserver_user = settings.DATA_SERVICES.get("geoserver", {}).get('USER')
-    geoserver_pass = settings.DATA_SERVICES.get("geoserver", {}).get('PASSWORD')
-    geoserver_auth = requests.auth.HTTPBasicAuth(
-        geoserver_user, 
-        geoserver_pass
-    )
-
-    workspace_id = f"{geoserver_namespace}-{res_id}"
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(res_id)
 
     headers = {
         "content-type": "application/json"
@@ -266,13 +274,17 @@ def unregister_geoserver_databases(res_id):
         "update": "overwrite", "recurse": True
     }
 
-    rest_url = f"{geoserver_url}/workspaces/{workspace_id}"
-
-    if geoserver_url is not None:
-        response = requests.delete(rest_url, params=params, auth=geoserver_auth, headers=headers)
+    if geoserver_client.url is not None:
+        response = geoserver_client.delete(f"/workspaces/{workspace_id}", params=params, headers=headers)
     else:
         response = None
 
+    if response is None or response.status_code in (200, 404):
+        registry.forget_resource(res_id, workspace_id)
+    else:
+        logger.error(f"Error removing GeoServer workspace {workspace_id}: {response}")
+        registry.expire_resource(res_id)
+
     logger.info(f"Completed attempt at unregistering GeoServer databases for resource: {res_id}")
     return response
 
@@ -282,13 +294,17 @@ def get_geoserver_data_dir():
     return geoserver_directory
 
 
-def copy_files_to_geoserver(res_id, db):
+@metrics.timed("copy_files")
+def copy_files_to_geoserver(res_id, db, geoserver_directory=None):
     """
     Copy Geospatial file from HydroShare to GeoServer.
+
+    Files are copied into the GeoServer data directory unless
+    geoserver_directory names another one, e.g. a staging directory.
     """
 
     logger.info(f"Copying files to GeoServer for resource: {res_id}")
-    geoserver_directory = get_geoserver_data_dir()
+    geoserver_directory = geoserver_directory or get_geoserver_data_dir()
 
     layer_type = None
     layer_name = None
@@ -304,42 +320,29 @@ def copy_files_to_geoserver(res_id, db):
         "message": "Error: Unable to copy GeoServer files."
     }
 
-    def get_and_write_file(file_url, file_path):
-        try:
-            logger.info(f"Getting file from: {file_url}")
-            response = requests.get(file_url)
-            # create the directory if it doesn't exist
-            dir_path = os.path.dirname(file_path) + "/"
-            logger.info(f"Checking for directory: {dir_path}")
-            os.makedirs(os.path.dirname(dir_path), exist_ok=True)
-            with open(file_path, 'w+b') as f:
-                logger.info(f"Writing file to GeoServer: {file_path}")
-                f.write(response.content)
-        except Exception as e:
-            message = f"Error getting/writing file: {e}"
-            logger.error(message)
-            raise Exception(message)
-
     try:
-        hydroshare_url = "/".join(settings.HYDROSHARE_URL.split("/")[:-1])
-        file_url = f"{hydroshare_url}/resource/{db['hs_path']}"
-        file_path = os.path.join(geoserver_directory, db["hs_path"])
-        get_and_write_file(file_url, file_path)
         # Get not only the .shp file but also the .shx, .dbf, and .prj files
         # https://github.com/hydroshare/hydroshare/issues/5631
-        logger.info(f"Checking for associated files for resource: {res_id}")
-        if db.get("associated_files", None):
-            for file in db["associated_files"]:
-                logger.info(f"Copying associated file to GeoServer from: {file}")
-                file_url = f"{hydroshare_url}/resource/{file}"
-                file_path = os.path.join(geoserver_directory, file)
-                get_and_write_file(file_url, file_path)
-        logger.info(f"Successfully copied files to GeoServer for resource: {res_id}")
+        hs_paths = [db["hs_path"]] + db.get("associated_files", [])
+        logger.info(f"Copying {len(hs_paths)} files to GeoServer for resource: {res_id}")
+        copy_info = transfer.copy_files(res_id, hs_paths, geoserver_directory, db.get("fingerprints"))
+        metrics.count_copy(copy_info)
+        if db.get("layer_type") == "GeographicRaster" and cog.is_enabled():
+            # GeoServer registers the optimized file in place of the copy
+            copy_info["optimized"] = cog.optimize_raster(os.path.join(geoserver_directory, db["hs_path"]))
+        if db.get("layer_type") == "GeographicFeature" and features.get_optimization():
+            # GeoServer registers the GeoPackage or indexed shapefile built here
+            copy_info["optimized"] = features.prepare_shapefile(os.path.join(geoserver_directory, db["hs_path"]), db["file_name"])
+        logger.info(
+            f"Successfully copied files to GeoServer for resource: {res_id} "
+            f"({copy_info['copied']} copied, {copy_info['skipped']} unchanged, {copy_info['bytes']} bytes)"
+        )
         return {
             "success": True,
             "type": layer_type,
             "layer_name": layer_name,
-            "message": "Successfully copied GeoServer files."
+            "message": "Successfully copied GeoServer files.",
+            "content": copy_info
         }
     except Exception as e:
         message = f"Error copying files to geoserver: {e}"
@@ -378,6 +381,12 @@ def remove_copied_files_from_geoserver(res_id, db):
                 file_path = os.path.join(geoserver_directory, file)
                 logger.info(f"Removing associated file from GeoServer: {file_path}")
                 os.remove(file_path)
+        for file in features.get_derived_paths(db["hs_path"]):
+            file_path = os.path.join(geoserver_directory, file)
+            if os.path.exists(file_path):
+                logger.info(f"Removing prepared file from GeoServer: {file_path}")
+                os.remove(file_path)
+        transfer.forget_files(res_id, [db["hs_path"]] + db.get("associated_files", []), geoserver_directory)
     except Exception as e:
         message = f"Error removing files from geoserver: {e}"
         error_response["message"] = message
@@ -421,23 +430,96 @@ def remove_files_for_entire_resource(res_id):
     }
 
 
-def register_geoserver_db(res_id, db):
+def get_directory_size(dir_path):
+    """
+    Gets the number of files and total bytes under a directory; missing directories are empty.
+    """
+
+    num_files = 0
+    num_bytes = 0
+    for root, _, file_names in os.walk(dir_path):
+        for file_name in file_names:
+            try:
+                num_bytes += os.lstat(os.path.join(root, file_name)).st_size
+            except OSError:
+                continue
+            num_files += 1
+    return num_files, num_bytes
+
+
+def teardown_resource(res_id, dry_run=False):
+    """
+    Removes a resource's GeoServer workspace and its copied files.
+
+    With dry_run, nothing is removed and the response describes what would
+    be. content holds the workspace id, whether it existed (from the DELETE
+    response, or a lookup in dry runs), and the number and size of the
+    resource's files.
+    """
+
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(res_id)
+    dir_path = os.path.join(get_geoserver_data_dir() or "", res_id)
+    num_files, num_bytes = get_directory_size(dir_path)
+    content = {
+        "workspace": workspace_id,
+        "workspace_exists": None,
+        "files": num_files,
+        "bytes": num_bytes
+    }
+
+    if dry_run:
+        response = geoserver_client.get(f"/workspaces/{workspace_id}.json")
+        content["workspace_exists"] = response.status_code == 200
+        return {
+            "success": True,
+            "message": (
+                f"Would remove {'workspace ' + workspace_id if content['workspace_exists'] else 'no workspace'} "
+                f"and {num_files} files ({num_bytes / 1048576:.1f} MB)"
+            ),
+            "content": content
+        }
+
+    response = unregister_geoserver_databases(res_id)
+    if response is not None and response.status_code not in (200, 404):
+        return {
+            "success": False,
+            "message": f"Error: Unable to remove workspace {workspace_id}: {response.status_code}",
+            "content": content
+        }
+    content["workspace_exists"] = response is not None and response.status_code == 200
+
+    if os.path.isdir(dir_path):
+        file_response = remove_files_for_entire_resource(res_id)
+        if file_response["success"] is False:
+            file_response["content"] = content
+            return file_response
+
+    return {
+        "success": True,
+        "message": (
+            f"Removed {'workspace ' + workspace_id if content['workspace_exists'] else 'no workspace'} "
+            f"and {num_files} files ({num_bytes / 1048576:.1f} MB)"
+        ),
+        "content": content
+    }
+
+
+@metrics.timed("register_layer")
+def register_geoserver_db(res_id, db, workspace_id=None, geoserver_directory=None):
     """
     Attempts to register a GeoServer layer
+
+    The layer is registered in the resource's workspace unless workspace_id
+    names another one, e.g. a staging workspace, and reads its files from
+    the GeoServer data directory unless geoserver_directory names another.
     """
 
     logger.info(f"Registering GeoServer layer for resource: {res_id}")
-    geoserver_namespace = settings.DATA_SERVICES.get("geoserver", {}).get('NAMESPACE')
-    geoserver_url = settings.DATA_SERVICES.get("geoserver", {}).get('URL')
-    geoserver_user = settings.DATA_SERVICES.get("geoserver", {}).get('USER')
-    geoserver_pass = settings.DATA_SERVICES.get("geoserver", {}).get('PASSWORD')
-    geoserver_directory = get_geoserver_data_dir()
-    geoserver_auth = requests.auth.HTTPBasicAuth(
-        geoserver_user, 
-        geoserver_pass
-    )
+    geoserver_client = get_geoserver_client()
+    geoserver_directory = geoserver_directory or get_geoserver_data_dir()
 
-    workspace_id = f"{geoserver_namespace}-{res_id}"
+    workspace_id = workspace_id or geoserver_client.workspace_id(res_id)
 
     headers = {
         "content-type": "application/json"
@@ -449,16 +531,20 @@ def register_geoserver_db(res_id, db):
         logging.error(f"Invalid layer name: {db['layer_name']}")
         return error_response
 
-    rest_url = f"{geoserver_url}/workspaces/{workspace_id}/{db['store_type']}/{str(db['layer_name']).replace('/', ' ')}/external.{db['file_type']}"
-    data = f"file://{geoserver_directory}/{db['hs_path']}"
-    response = requests.put(rest_url, data=data, headers=headers, auth=geoserver_auth)
+    store_path, file_type = features.get_store_file(db, geoserver_directory)
+    rest_url = f"/workspaces/{workspace_id}/{db['store_type']}/{str(db['layer_name']).replace('/', ' ')}/external.{file_type}"
+    data = f"file://{geoserver_directory}/{store_path}"
+    response = geoserver_client.put(rest_url, data=data, headers=headers)
 
     if response.status_code != 201:
         logging.error(f"Error registering GeoServer layer at {rest_url}: {response}")
+        if response.status_code == 404:
+            # the workspace is gone from GeoServer; don't keep planning from the registry's record of it
+            registry.expire_resource(res_id)
         return error_response
 
-    rest_url = f"{geoserver_url}/workspaces/{workspace_id}/{db['store_type']}/{str(db['layer_name']).replace('/', ' ')}/{db['layer_group']}/{db['file_name']}.json"
-    response = requests.get(rest_url, headers=headers, auth=geoserver_auth)
+    rest_url = f"/workspaces/{workspace_id}/{db['store_type']}/{str(db['layer_name']).replace('/', ' ')}/{db['layer_group']}/{db['file_name']}.json"
+    response = geoserver_client.get(rest_url, headers=headers)
 
     try:
         if json.loads(response.content.decode('utf-8'))[db["verification"]]["enabled"] is False:
@@ -471,73 +557,112 @@ def register_geoserver_db(res_id, db):
     bbox = json.loads(response.content)[db["verification"]]["nativeBoundingBox"]
 
     data = response.content.decode('utf-8').replace('"name":"' + db["file_name"] + '"', '"name":"' + db["layer_name"].replace("/", " ") + '"')
-    response = requests.put(rest_url, headers=headers, auth=geoserver_auth, data=data)
+    response = geoserver_client.put(rest_url, headers=headers, data=data)
 
     if response.status_code != 200:
         logging.error(f"Error attempting to put layer data at {rest_url}: {response}")
         return error_response
 
-    if db["layer_type"] == "GeographicRaster":
-        try:
-            hydroshare_url = "/".join(settings.HYDROSHARE_URL.split("/")[:-1])
-            layer_vrt_url = f"{hydroshare_url}/resource/{'.'.join(db['hs_path'].split('.')[:-1])}.vrt"
-            response = requests.get(layer_vrt_url)
-            vrt = etree.fromstring(response.content.decode('utf-8'))
-            layer_max = None
-            layer_min = None
-            layer_ndv = None
-            for element in vrt.iterfind(".//MDI"):
-                if element.get("key") == "STATISTICS_MAXIMUM":
-                    layer_max = element.text
-                if element.get("key") == "STATISTICS_MINIMUM":
-                    layer_min = element.text
+    return finish_geoserver_db(res_id, db, bbox, workspace_id, geoserver_directory)
 
-            try:
-                layer_ndv = vrt.find(".//NoDataValue").text
-            except:
-                layer_ndv = None
 
-            if layer_max is not None and layer_min is not None and layer_min < layer_max and layer_ndv is not None:
+@metrics.timed("update_layer")
+def update_geoserver_db(res_id, db):
+    """
+    Points an existing GeoServer store at its updated files and refreshes the layer in place.
+
+    The store is uploaded again without configuring a new layer, which makes
+    GeoServer drop its cached reader, then the layer's bounding boxes are
+    recalculated. The layer stays published throughout.
+    """
+
+    logger.info(f"Updating GeoServer layer in place for resource: {res_id}")
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(res_id)
+    layer_id = db["layer_name"].replace("/", " ")
+
+    headers = {
+        "content-type": "application/json"
+    }
+    error_response = {"success": False, "type": db["layer_type"], "layer_name": db["layer_name"], "message": "Error: Unable to update GeoServer layer."}
+
+    store_url = f"/workspaces/{workspace_id}/{db['store_type']}/{layer_id}"
+    store_path, file_type = features.get_store_file(db, get_geoserver_data_dir())
+    data = f"file://{get_geoserver_data_dir()}/{store_path}"
+    response = geoserver_client.put(f"{store_url}/external.{file_type}", data=data, params={"configure": "none"}, headers=headers)
+    if response.status_code not in (200, 201):
+        logging.error(f"Error updating GeoServer store at {store_url}: {response}")
+        if response.status_code == 404:
+            registry.expire_resource(res_id)
+        return error_response
+
+    rest_url = f"{store_url}/{db['layer_group']}/{layer_id}.json"
+    data = json.dumps({db["verification"]: {"name": layer_id, "enabled": True}})
+    response = geoserver_client.put(rest_url, data=data, params={"recalculate": "nativebbox,latlonbbox"}, headers=headers)
+    if response.status_code != 200:
+        logging.error(f"Error recalculating GeoServer layer at {rest_url}: {response}")
+        return error_response
+
+    response = geoserver_client.get(rest_url, headers=headers)
+    try:
+        bbox = json.loads(response.content)[db["verification"]]["nativeBoundingBox"]
+    except Exception as e:
+        logging.error(f"Error reading bounding box for layer {db['layer_name']}: {e}")
+        return error_response
+
+    return finish_geoserver_db(res_id, db, bbox)
+
+
+def remove_geoserver_store(res_id, db):
+    """
+    Removes a layer's store from GeoServer, leaving its copied files in place.
+    """
+
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(res_id)
+    rest_url = f"/workspaces/{workspace_id}/{db['store_type']}/{db['layer_name'].replace('/', ' ')}"
+    return geoserver_client.delete(rest_url, params={"recurse": True}, headers={"content-type": "application/json"})
 
-                layer_style = get_layer_style(layer_max, layer_min, layer_ndv, db["layer_name"].replace("/", " "))
 
-                rest_url = f"{geoserver_url}/workspaces/{workspace_id}/styles"
-                headers = {"content-type": "application/vnd.ogc.sld+xml"}
-                response = requests.post(rest_url, data=layer_style, auth=geoserver_auth, headers=headers)
+def finish_geoserver_db(res_id, db, bbox, style_workspace_id=None, geoserver_directory=None):
+    """
+    Styles a newly registered or updated layer and records it in the registry.
 
-                if response.status_code == 201:
+    The style is set in style_workspace_id if given, from the layer's files
+    in geoserver_directory if given; the registry and WMS URL always refer
+    to the resource's workspace.
+    """
 
-                    rest_url = f"{geoserver_url}/layers/{workspace_id}:{db['layer_name'].replace('/', ' ')}"
-                    headers = {"content-type": "application/json"}
-                    body = '{"layer": {"defaultStyle": {"name": "' + db["layer_name"].replace("/", " ") + '", "href":"https:\/\/geoserver.hydroshare.org\/geoserver\/rest\/styles\/' + db["layer_name"].replace("/", " ") + '.json"}}}'
-                    response = requests.put(rest_url, data=body, auth=geoserver_auth, headers=headers)
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(res_id)
 
+    if db["layer_type"] == "GeographicRaster":
+        try:
+            register_geoserver_style(res_id, db, style_workspace_id, geoserver_directory)
         except Exception as e:
             pass
 
+    if gwc.is_enabled():
+        gwc.configure_tile_layer(style_workspace_id or workspace_id, db["layer_name"].replace("/", " "))
+
     logger.info(f"Successfully registered GeoServer layer: {db}")
     add_string = ""
     if bbox.get("crs", None):
         add_string = f"&srs={bbox['crs']}"
-    return {"success": True, "type": db["layer_type"], "layer_name": db["layer_name"], "message": f"{'/'.join((geoserver_url.split('/')[:-1]))}/{workspace_id}/wms?service=WMS&version=1.1.0&request=GetMap&layers={workspace_id}:{urllib.parse.quote(db['layer_name'].replace('/', ' '))}&bbox={bbox['minx']}%2C{bbox['miny']}%2C{bbox['maxx']}%2C{bbox['maxy']}&width=612&height=768&format=application/openlayers{add_string}"}
+    wms_url = f"{geoserver_client.service_url(workspace_id, 'wms')}?service=WMS&version=1.1.0&request=GetMap&layers={workspace_id}:{urllib.parse.quote(db['layer_name'].replace('/', ' '))}&bbox={bbox['minx']}%2C{bbox['miny']}%2C{bbox['maxx']}%2C{bbox['maxy']}&width=612&height=768&format=application/openlayers{add_string}"
+    registry.record_layer(res_id, workspace_id, db, bbox=bbox, wms_url=wms_url)
+    return {"success": True, "type": db["layer_type"], "layer_name": db["layer_name"], "message": wms_url}
 
 
+@metrics.timed("unregister_layer")
 def unregister_geoserver_db(res_id, db):
     """
     Removes a GeoServer layer
     """
 
     logger.info(f"Unregistering GeoServer layer: {db}")
-    geoserver_namespace = settings.DATA_SERVICES.get("geoserver", {}).get('NAMESPACE')
-    geoserver_url = settings.DATA_SERVICES.get("geoserver", {}).get('URL')
-    geoserver_user = settings.DATA_SERVICES.get("geoserver", {}).get('USER')
-    geoserver_pass = settings.DATA_SERVICES.get("geoserver", {}).get('PASSWORD')
-    geoserver_auth = requests.auth.HTTPBasicAuth(
-        geoserver_user, 
-        geoserver_pass
-    )
-
-    workspace_id = f"{geoserver_namespace}-{res_id}"
+    geoserver_client = get_geoserver_client()
+    workspace_id = geoserver_client.workspace_id(res_id)
 
     headers = {
         "content-type": "application/json"
@@ -547,13 +672,21 @@ def unregister_geoserver_db(res_id, db):
         "update": "overwrite", "recurse": True
     }
 
-    if geoserver_url is not None:
-        rest_url = f"{geoserver_url}/workspaces/{workspace_id}/{db['store_type']}/{str(db['layer_name']).replace('/', ' ')}"
-        response = requests.delete(rest_url, params=params, headers=headers, auth=geoserver_auth)
+    if geoserver_client.url is not None:
+        if gwc.is_enabled():
+            gwc.truncate_tile_layer(gwc.get_tile_layer_name(workspace_id, str(db['layer_name']).replace('/', ' ')))
+        rest_url = f"/workspaces/{workspace_id}/{db['store_type']}/{str(db['layer_name']).replace('/', ' ')}"
+        response = geoserver_client.delete(rest_url, params=params, headers=headers)
     else:
         response = None
 
+    if not db.get("hs_path"):
+        # stale layers are planned from the layer list alone; their files come from the registry
+        layer_files = registry.get_layer_files(res_id, db["layer_name"])
+        if layer_files:
+            db = dict(db, hs_path=layer_files[0], associated_files=layer_files[1:])
     remove_copied_files_from_geoserver(res_id, db)
+    registry.forget_layer(res_id, db["layer_name"])
 
     logger.info(f"Successfully unregistered GeoServer layer for resource: {res_id}")
 
@@ -562,11 +695,129 @@ def unregister_geoserver_db(res_id, db):
     return response
 
 
+def get_raster_statistics(db):
+    """
+    Gets the min, max and nodata values of a raster layer from its HydroShare .vrt file.
+    """
+
+    response = get_hydroshare_client().get(f"/resource/{'.'.join(db['hs_path'].split('.')[:-1])}.vrt")
+    vrt = etree.fromstring(response.content.decode('utf-8'))
+    layer_max = None
+    layer_min = None
+    layer_ndv = None
+    for element in vrt.iterfind(".//MDI"):
+        if element.get("key") == "STATISTICS_MAXIMUM":
+            layer_max = element.text
+        if element.get("key") == "STATISTICS_MINIMUM":
+            layer_min = element.text
+
+    try:
+        layer_ndv = vrt.find(".//NoDataValue").text
+    except:
+        layer_ndv = None
+
+    return raster_stats.normalize_statistics({"max": layer_max, "min": layer_min, "ndv": layer_ndv})
+
+
+@metrics.timed("raster_statistics")
+def get_layer_statistics(db, geoserver_directory=None):
+    """
+    Gets raster statistics from the layer's .vrt file, or computes them from the copied file.
+
+    The copied GeoTIFF, in geoserver_directory or else the GeoServer data
+    directory, is only read when the .vrt file cannot be fetched or has no
+    STATISTICS_MINIMUM/STATISTICS_MAXIMUM values.
+    """
+
+    try:
+        layer_stats = get_raster_statistics(db)
+    except Exception as e:
+        logger.warning(f"Unable to read .vrt statistics for layer {db['layer_name']}: {e}")
+        layer_stats = {"max": None, "min": None, "ndv": None}
+
+    if layer_stats["max"] is not None and layer_stats["min"] is not None:
+        return layer_stats
+
+    if not raster_stats.is_available():
+        logger.warning(f"No statistics for layer {db['layer_name']} and rasterio is not installed")
+        return layer_stats
+
+    file_path = f"{geoserver_directory or get_geoserver_data_dir()}/{db['hs_path']}"
+    logger.info(f"Computing raster statistics from: {file_path}")
+    local_stats = raster_stats.compute_raster_statistics(file_path)
+    if layer_stats["ndv"] is not None:
+        local_stats["ndv"] = layer_stats["ndv"]
+    return local_stats
+
+
+@metrics.timed("style")
+def register_geoserver_style(res_id, db, workspace_id=None, geoserver_directory=None):
+    """
+    Sets the default style of a raster layer.
+
+    Statistics are reused from the style cache while the raster's fingerprint
+    is unchanged, and the workspace style is only posted or replaced when it
+    is missing or was published from different statistics. Missing
+    statistics are computed from the copy in geoserver_directory, if given.
+    """
+
+    geoserver_client = get_geoserver_client()
+    workspace_id = workspace_id or geoserver_client.workspace_id(res_id)
+    layer_id = db["layer_name"].replace("/", " ")
+
+    style_cache = styles.get_style_cache()
+    cache_key = styles.get_cache_key(db)
+    layer_stats = style_cache.get(cache_key)
+    if layer_stats is None:
+        layer_stats = get_layer_statistics(db, geoserver_directory)
+        style_cache.set(cache_key, layer_stats)
+    else:
+        logger.info(f"Using cached raster statistics for layer: {db['layer_name']}")
+
+    layer_stats = raster_stats.normalize_statistics(layer_stats)
+    layer_max = layer_stats["max"]
+    layer_min = layer_stats["min"]
+    layer_ndv = layer_stats["ndv"]
+    if layer_max is None or layer_min is None or layer_min >= layer_max:
+        return False
+
+    style_id = f"{workspace_id}:{layer_id}"
+    response = geoserver_client.get(f"/workspaces/{workspace_id}/styles/{layer_id}.json")
+    if response.status_code != 200:
+        layer_style = get_layer_style(layer_max, layer_min, layer_ndv, layer_id)
+        rest_url = f"/workspaces/{workspace_id}/styles"
+        headers = {"content-type": "application/vnd.ogc.sld+xml"}
+        response = geoserver_client.post(rest_url, data=layer_style, headers=headers)
+        if response.status_code != 201:
+            logging.error(f"Error creating style for layer {db['layer_name']}: {response}")
+            return False
+    elif not style_cache.is_published(style_id, cache_key):
+        layer_style = get_layer_style(layer_max, layer_min, layer_ndv, layer_id)
+        rest_url = f"/workspaces/{workspace_id}/styles/{layer_id}"
+        headers = {"content-type": "application/vnd.ogc.sld+xml"}
+        response = geoserver_client.put(rest_url, data=layer_style, headers=headers)
+        if response.status_code != 200:
+            logging.error(f"Error updating style for layer {db['layer_name']}: {response}")
+            return False
+    else:
+        logger.info(f"Reusing existing style for layer: {db['layer_name']}")
+    style_cache.set_published(style_id, cache_key)
+
+    rest_url = f"/layers/{workspace_id}:{layer_id}"
+    headers = {"content-type": "application/json"}
+    body = '{"layer": {"defaultStyle": {"name": "' + layer_id + '", "href":"https:\/\/geoserver.hydroshare.org\/geoserver\/rest\/styles\/' + layer_id + '.json"}}}'
+    response = geoserver_client.put(rest_url, data=body, headers=headers)
+    return response.status_code == 200
+
+
 def get_layer_style(max_value, min_value, ndv_value, layer_id):
     """
     Sets default style for raster layers.
     """
-    if ndv_value < min_value:
+    if ndv_value is None:
+        low_ndv = ""
+        high_ndv = ""
+    elif ndv_value < min_value:
         low_ndv = f'<ColorMapEntry color="#000000" quantity="{ndv_value}" label="nodata" opacity="0.0" />'
         high_ndv = ""
     elif ndv_value > max_value:
@@ -605,9 +856,11 @@ def get_layer_style(max_value, min_value, ndv_value, layer_id):
     return layer_style
 
 
-def get_list_of_public_geo_resources():
-    logger.info("Getting list of public geospatial resources")
-    hydroshare_url = "/".join(settings.HYDROSHARE_URL.split("/")[:-1])
+def get_public_geo_resources_path(**query):
+    """
+    Gets the discoverapi path listing public geospatial resources, with optional extra query parameters.
+    """
+
     types = ["Geographic Feature (ESRI Shapefiles)", "Geographic Raster"]
     # replace spaces with + for the query string
     types = [t.replace(" ", "+") for t in types]
@@ -616,23 +869,70 @@ def get_list_of_public_geo_resources():
         "availability": ["public", "published"],
         "geofilter": "false"
     }
-    rest_url = f"{hydroshare_url}/discoverapi/?filter={json.dumps(params)}"
-    rest_url = rest_url.replace(" ", "")
-    print(f"Getting list of public geospatial resources from: {rest_url}")
-    response = requests.get(rest_url)
+    rest_path = f"/discoverapi/?filter={json.dumps(params)}"
+    rest_path = rest_path.replace(" ", "")
+    for key, value in query.items():
+        rest_path = f"{rest_path}&{key}={value}"
+    return rest_path
+
+
+def get_discover_page(rest_path, page_number=None):
+    """
+    Gets one discoverapi page as (response JSON, resource entries).
+    """
+
+    hydroshare_client = get_hydroshare_client()
+    if page_number is not None:
+        rest_path = f"{rest_path}&pnum={page_number}"
+    response = hydroshare_client.get(rest_path)
+    response.raise_for_status()
     response_json = response.json()
+    resources = json.loads(response_json.get('resources', '[]'))
+    return response_json, [resource for resource in resources if resource.get('short_id', None)]
+
+
+def get_public_geo_resources_page(rest_path, page_number=None):
+    """
+    Gets one discoverapi page of public geospatial resources.
+    """
+
+    response_json, resources = get_discover_page(rest_path, page_number)
+    return response_json, [resource["short_id"] for resource in resources]
+
+
+def iter_public_geo_resources(workers=None):
+    """
+    Yields the ids of public geospatial resources as discoverapi pages arrive.
+
+    The first page is fetched to learn the page count, then the remaining
+    pages are fetched concurrently on a bounded thread pool.
+    """
+
+    logger.info("Getting list of public geospatial resources")
+    if workers is None:
+        workers = settings.DATA_SERVICES.get("hydroshare", {}).get('DISCOVER_WORKERS', DEFAULT_DISCOVER_WORKERS)
+    rest_path = get_public_geo_resources_path()
+    logger.info(f"Getting list of public geospatial resources from: {rest_path}")
+    response_json, res_ids = get_public_geo_resources_page(rest_path)
     page_count = response_json.get('pagecount', 0)
     rescount = response_json.get('rescount', 0)
     perpage = response_json.get('perpage', 0)
-    res_ids = []
-    print(f"Iterating over {page_count} pages of {perpage} resources each, total resources: {rescount}")
-    for i in range(1, page_count + 1):
-        print(f"Getting page {i}")
-        response = requests.get(f"{rest_url}&pnum={i}")
-        response_json = response.json()
-        resources = json.loads(response_json.get('resources', []))
-        new_ids = [resource["short_id"] for resource in resources if resource.get('short_id', None)]
-        res_ids.extend(new_ids)
-    print(f"Found {len(res_ids)} public geospatial resources")
-    print(f"Should match {rescount}")
-    return res_ids
\ No newline at end of file
+    logger.info(f"Iterating over {page_count} pages of {perpage} resources each, total resources: {rescount}")
+    found = len(res_ids)
+    yield from res_ids
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {
+            executor.submit(get_public_geo_resources_page, rest_path, i): i for i in range(2, page_count + 1)
+        }
+        for future in as_completed(futures):
+            logger.info(f"Got page {futures[future]}")
+            _, res_ids = future.result()
+            found += len(res_ids)
+            yield from res_ids
+
+    logger.info(f"Found {found} public geospatial resources, should match {rescount}")
+
+
+def get_list_of_public_geo_resources():
+    return list(iter_public_geo_resources())
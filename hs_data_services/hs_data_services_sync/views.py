@@ -1,9 +1,16 @@
+import hashlib
 import json
+from django.http import HttpResponse
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import viewsets, status
 from rest_framework.permissions import BasePermission, IsAuthenticated, SAFE_METHODS
-from hs_data_services_sync import tasks
+from hs_data_services import settings
+from hs_data_services_sync import metrics, registry, tasks
+
+
+DEFAULT_VERIFY_MAX_RESOURCES = 100
+DEFAULT_VERIFY_MAX_AGE = 60
 
 
 class ReadOnly(BasePermission):
@@ -29,7 +36,8 @@ class UpdateServices(APIView):
             'content': {}
         }
 
-        tasks.update_data_services_task.delay(resource_id)
+        # bursts of requests for the same resource are coalesced into one sync
+        response['content']['queued'] = tasks.schedule_update(resource_id)
 
         return Response(response, status=status.HTTP_201_CREATED)
 
@@ -40,5 +48,53 @@ class GetServices(APIView):
 
     permission_classes = (IsAuthenticated|ReadOnly,)
 
-    def get():
-        return None
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the registered layers and WMS, WFS and WCS URLs of one or more HydroShare resources.
+
+        Resources are given as resource_id query parameters, repeated or comma separated. Results come
+        from the local registry rather than GeoServer, and carry an ETag for conditional requests.
+        """
+
+        verify_settings = settings.DATA_SERVICES.get("sync", {})
+        resource_ids = []
+        for value in request.query_params.getlist('resource_id'):
+            for resource_id in value.split(','):
+                resource_id = resource_id.strip()
+                if resource_id and resource_id not in resource_ids:
+                    resource_ids.append(resource_id)
+
+        max_resources = verify_settings.get('VERIFY_MAX_RESOURCES', DEFAULT_VERIFY_MAX_RESOURCES)
+        if not resource_ids or len(resource_ids) > max_resources:
+            response = {
+                'success': False,
+                'message': f'Provide between 1 and {max_resources} resource_id query parameters.',
+                'content': None
+            }
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
+
+        response = {
+            'success': True,
+            'message': f'Data services for {len(resource_ids)} resource(s)',
+            'content': registry.get_resource_services(resource_ids)
+        }
+
+        etag = '"' + hashlib.md5(json.dumps(response, sort_keys=True).encode('utf-8')).hexdigest() + '"'
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f"max-age={verify_settings.get('VERIFY_MAX_AGE', DEFAULT_VERIFY_MAX_AGE)}",
+        }
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if etag in [tag.strip().replace('W/', '', 1) for tag in if_none_match.split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response(response, status=status.HTTP_200_OK, headers=headers)
+
+
+def get_metrics(request):
+    """
+    Exports sync and HTTP metrics in the Prometheus text format.
+    """
+
+    content, content_type = metrics.export()
+    return HttpResponse(content, content_type=content_type)